@@ -0,0 +1,56 @@
+"""Aplicação Flask com os blueprints da API sobre um banco SQLite, para os benchmarks."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from src.models.user import db
+from src.database import database
+from src.json_provider import JSONProvider
+from src.compression import Compress
+from src.admission import admission
+from src.rate_limit import rate_limiter
+from src.tracing import tracer
+from src.profiler import profiler
+from src.payments import payment_queue
+from src.reports import report_jobs
+from src.bulk_import import import_jobs
+from src.kpis import kpis
+from src.routes.auth import auth_bp
+from src.routes.subscription import subscription_bp
+from src.routes.qrcode import qrcode_bp
+from src.routes.vendor import vendor_bp
+from src.routes.admin import admin_bp
+from src.routes.user import user_bp
+
+
+def make_app(database_uri='sqlite://', **config):
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'benchmark'
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['PAYMENT_GATEWAY'] = 'fake'
+    app.config.update(config)
+    app.json = JSONProvider(app)
+    Compress(app)
+    tracer.init_app(app)
+    rate_limiter.init_app(app)
+    admission.init_app(app)
+    profiler.init_app(app)
+
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(subscription_bp, url_prefix='/api/subscription')
+    app.register_blueprint(qrcode_bp, url_prefix='/api/qrcode')
+    app.register_blueprint(vendor_bp, url_prefix='/api/vendor')
+    app.register_blueprint(admin_bp, url_prefix='/api/admin')
+    app.register_blueprint(user_bp, url_prefix='/api/admin')
+
+    database.init_app(app, db)
+    payment_queue.init_app(app)
+    report_jobs.init_app(app)
+    import_jobs.init_app(app)
+    kpis.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return app
@@ -0,0 +1,71 @@
+"""Analytics de receita/churn/coortes com milhões de pagamentos sintéticos.
+
+Mede separadamente a conversão de linhas do banco em colunas (por bloco) e os
+cálculos vetorizados sobre as colunas já carregadas.
+
+Uso: python benchmarks/bench_analytics.py [linhas ...]
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import analytics
+
+MONTHS = 24
+
+
+def synthetic(rows, rng):
+    end = analytics.month_index(datetime(2025, 12, 1))
+    start = end - MONTHS + 1
+    users = rows // 8
+    payments = {
+        'amount': rng.choice([29.9, 49.9, 79.9], size=rows),
+        'method': rng.integers(0, 2, size=rows, dtype=np.int8),
+        'month': rng.integers(start, end + 1, size=rows),
+        'plan_id': rng.integers(1, 4, size=rows),
+        'user_id': rng.integers(1, users + 1, size=rows),
+    }
+    sub_start = rng.integers(start, end + 1, size=users)
+    sub_end = np.where(rng.random(users) < 0.3, sub_start + rng.integers(1, 12, size=users), analytics.NEVER)
+    subscriptions = {'start_month': sub_start, 'end_month': sub_end}
+    redemption_months = rng.integers(start, end + 1, size=rows * 3)
+    return payments, subscriptions, redemption_months, start, end
+
+
+def timed(label, fn, *args):
+    t = time.perf_counter()
+    result = fn(*args)
+    print(f"  {label:<28}{(time.perf_counter() - t) * 1e3:>10.1f} ms")
+    return result
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1_000_000, 3_000_000, 5_000_000]
+    rng = np.random.default_rng(42)
+
+    # Conversão de um bloco de linhas (como vem do banco) em colunas
+    base = datetime(2025, 1, 1)
+    chunk = [base + timedelta(minutes=i) for i in range(analytics.DEFAULT_CHUNK_SIZE)]
+    t = time.perf_counter()
+    analytics.to_months(chunk)
+    per_row = (time.perf_counter() - t) / len(chunk)
+    print(f"to_months: {per_row * 1e9:.0f} ns/linha")
+
+    for rows in sizes:
+        payments, subscriptions, redemption_months, start, end = synthetic(rows, rng)
+        print(f"{rows:,} pagamentos, {len(subscriptions['start_month']):,} assinaturas, "
+              f"{len(redemption_months):,} retiradas")
+        timed('mrr', analytics.mrr, payments, start, end)
+        timed('churn', analytics.churn, subscriptions, start, end)
+        timed('cohort_retention', analytics.cohort_retention, payments, start, end, 12)
+        timed('redemptions_per_subscriber', analytics.redemptions_per_subscriber,
+              redemption_months, subscriptions, start, end)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""Partida a frio: do processo iniciado até o primeiro 200, e a latência da primeira leva de requisições.
+
+Sobe o servidor num subprocesso (banco SQLite em arquivo com massa
+sintética, copiado a cada rodada) e compara o servidor de desenvolvimento
+do Flask com o gunicorn sem preload, com preload e com preload +
+aquecimento. Assim que /api/subscription/plans responde 200, um cliente
+pede o QR code do dia (primeira consulta e primeiro PNG do worker), depois
+uma leva de clientes ao mesmo tempo e uma segunda leva, já com os workers
+quentes.
+
+Uso: python benchmarks/bench_cold_start.py [--runs 3] [--workers 2] [--threads 4]
+"""
+import argparse
+import os
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIRECTORY = tempfile.mkdtemp()
+SEED_PATH = os.path.join(DIRECTORY, 'seed.db')
+os.environ['DB_BACKEND'] = 'sqlite'
+os.environ['SQLITE_PATH'] = SEED_PATH
+sys.path.insert(0, ROOT)
+
+from src.main import app
+from src.entitlements import entitlements
+from src.models.user import db, Subscription
+from src.seed import seed_database
+
+SCENARIOS = {
+    'flask run (dev)': lambda port, args: [
+        '-m', 'flask', '--app', 'src.main', 'run', '--port', str(port), '--no-reload'],
+    'gunicorn': lambda port, args: [
+        '-m', 'src.server', '--bind', f'127.0.0.1:{port}', '--workers', str(args.workers),
+        '--threads', str(args.threads), '--no-preload', '--no-warm-up'],
+    'gunicorn + preload': lambda port, args: [
+        '-m', 'src.server', '--bind', f'127.0.0.1:{port}', '--workers', str(args.workers),
+        '--threads', str(args.threads), '--no-warm-up'],
+    'gunicorn + preload + aquecimento': lambda port, args: [
+        '-m', 'src.server', '--bind', f'127.0.0.1:{port}', '--workers', str(args.workers),
+        '--threads', str(args.threads)],
+}
+
+
+def prepare(customers):
+    """Massa sintética e um cookie de sessão por cliente com assinatura ativa"""
+    with app.app_context():
+        seed_database(customers, 5, 1, seed=5, end_date=date.today() - timedelta(days=1))
+        user_ids = [row.user_id for row in Subscription.query.filter_by(status='ativo').all()
+                    if entitlements.get(row.user_id)]
+        # Fecha todas as conexões: o WAL volta para o arquivo antes das cópias
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+    serializer = app.session_interface.get_signing_serializer(app)
+    cookie_name = app.config['SESSION_COOKIE_NAME']
+    return [f"{cookie_name}={serializer.dumps({'user_id': user_id, 'user_role': 'cliente'})}" for user_id in user_ids]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def get(url, cookie=None):
+    request = urllib.request.Request(url, headers={'Cookie': cookie} if cookie else {})
+    t0 = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=30) as response:
+        response.read()
+        return response.status, (time.perf_counter() - t0) * 1000
+
+
+def wave(base, cookies):
+    """Uma requisição de /generate por cliente, todas ao mesmo tempo; devolve as latências em ms"""
+    latencies = []
+    barrier = threading.Barrier(len(cookies))
+
+    def worker(cookie):
+        barrier.wait()
+        try:
+            latencies.append(get(f'{base}/api/qrcode/generate', cookie)[1])
+        except urllib.error.HTTPError as exc:
+            print(f'  /generate respondeu {exc.code}')
+
+    pool = [threading.Thread(target=worker, args=(cookie,)) for cookie in cookies]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return sorted(latencies)
+
+
+def run_once(command, cookies):
+    path = os.path.join(DIRECTORY, 'run.db')
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    shutil.copy(SEED_PATH, path)
+    port = free_port()
+    env = dict(os.environ, SQLITE_PATH=path)
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable] + command(port), cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f'http://127.0.0.1:{port}'
+    try:
+        while True:
+            try:
+                if get(f'{base}/api/subscription/plans')[0] == 200:
+                    break
+            except OSError:
+                if process.poll() is not None:
+                    raise RuntimeError('o servidor saiu antes de responder')
+                time.sleep(0.01)
+        ready = (time.perf_counter() - started) * 1000
+        first = get(f'{base}/api/qrcode/generate', cookies[0])[1]
+        cold = wave(base, cookies[1:len(cookies) // 2])
+        warm = wave(base, cookies[len(cookies) // 2:])
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=30)
+    return ready, first, cold, warm
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Partida a frio do servidor até o primeiro 200')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=16, help='Requisições simultâneas por leva')
+    args = parser.parse_args()
+
+    cookies = prepare(max(args.clients * 4, 100))[:args.clients * 2]
+    print(f'{args.workers} workers x {args.threads} threads, {args.clients} clientes por leva, mediana de {args.runs} rodadas')
+    print(f'{"servidor":<34}{"1º 200":>10}{"1º QR":>12}{"1ª leva p50":>13}{"máx":>9}{"2ª leva p50":>13}{"máx":>9}')
+    for name, command in SCENARIOS.items():
+        results = [run_once(lambda port: command(port, args), cookies) for _ in range(args.runs)]
+        ready = statistics.median(r[0] for r in results)
+        first = statistics.median(r[1] for r in results)
+        cold_p50 = statistics.median(r[2][len(r[2]) // 2] for r in results)
+        cold_max = statistics.median(r[2][-1] for r in results)
+        warm_p50 = statistics.median(r[3][len(r[3]) // 2] for r in results)
+        warm_max = statistics.median(r[3][-1] for r in results)
+        print(f'{name:<34}{ready:>8.0f}ms{first:>10.0f}ms{cold_p50:>11.0f}ms{cold_max:>7.0f}ms'
+              f'{warm_p50:>11.0f}ms{warm_max:>7.0f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Custo de CPU x bytes economizados pela compressão gzip em cada nível.
+
+Uso: python benchmarks/bench_compression.py
+"""
+import gzip
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from src.compression import Compress
+from src.json_provider import JSONProvider
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_json_serialization import vendor_reports_payload, redemptions_payload
+
+ROUNDS = 10
+
+
+def main():
+    random.seed(1)
+    app = Flask(__name__)
+    app.json = JSONProvider(app)
+    with app.app_context():
+        payloads = {
+            'vendor_reports': app.json.dumps(vendor_reports_payload(False)).encode(),
+            'get_redemptions': app.json.dumps(redemptions_payload(False)).encode(),
+        }
+
+    print(f"{'payload':<18}{'nível':>6}{'bytes':>12}{'razão':>8}{'ms':>9}{'MB/s':>9}")
+    for name, body in payloads.items():
+        print(f"{name:<18}{'-':>6}{len(body):>12}{1:>8.2f}{0:>9.2f}{'-':>9}")
+        for level in (1, 3, 6, 9):
+            start = time.perf_counter()
+            for _ in range(ROUNDS):
+                compressed = gzip.compress(body, compresslevel=level, mtime=0)
+            elapsed = (time.perf_counter() - start) / ROUNDS
+            print(f"{name:<18}{level:>6}{len(compressed):>12}{len(body) / len(compressed):>8.2f}"
+                  f"{elapsed * 1e3:>9.2f}{len(body) / elapsed / 1e6:>9.1f}")
+
+    # Resposta em stream: mesmo corpo enviado em blocos de 8 KiB
+    body = payloads['vendor_reports']
+    stream_app = Flask(__name__)
+    Compress(stream_app)
+
+    @stream_app.route('/stream')
+    def stream():
+        return stream_app.response_class((body[i:i + 8192] for i in range(0, len(body), 8192)),
+                                         mimetype='application/json')
+
+    client = stream_app.test_client()
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        data = client.get('/stream', headers={'Accept-Encoding': 'gzip'}).get_data()
+    elapsed = (time.perf_counter() - start) / ROUNDS
+    print(f"\nstream 8KiB nível 3: {len(data)} bytes, {elapsed * 1e3:.2f} ms por resposta")
+
+
+if __name__ == '__main__':
+    main()
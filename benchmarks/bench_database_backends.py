@@ -0,0 +1,160 @@
+"""Backends do banco no mesmo workload: SQLite com WAL (ajustado), SQLite no modo padrão e MySQL.
+
+Várias threads de vendedores validam QR codes do dia ao mesmo tempo
+(POST /validate: lê o saldo e grava a retirada). Mede vazão, latência e
+erros (ex.: database is locked), e confere que nenhum código passou do
+saldo do plano, inclusive com todas as threads validando o mesmo código
+ao mesmo tempo.
+
+MySQL (ou outro banco) entra com --uri apontando para um banco vazio.
+
+Uso: python benchmarks/bench_database_backends.py [--threads 8] [--seconds 10] [--uri mysql+pymysql://...]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import func
+from _app import make_app
+from src.models.user import db, Plan, QRCode, Redemption, Subscription
+from src.seed import seed_database
+
+SCENARIOS = {
+    'sqlite-wal': {},
+    'sqlite-padrao': {'SQLITE_JOURNAL_MODE': 'DELETE', 'SQLITE_SYNCHRONOUS': 'FULL', 'SQLITE_MMAP_SIZE': 0},
+}
+
+
+def prepare(uri, config, customers):
+    """Massa sintética até ontem e um QR code de hoje para os clientes ativos; devolve código → saldo de matte"""
+    app = make_app(uri, RATE_LIMIT_ENABLED=False, LANES_ENABLED=False, PAYMENT_PIPELINE=False, **config)
+    tomorrow = datetime.combine(date.today() + timedelta(days=1), datetime.min.time())
+    with app.app_context():
+        seed_database(customers, 10, 1, seed=3, end_date=date.today() - timedelta(days=1))
+        active = (db.session.query(Subscription.user_id, Plan.matte_quantity)
+                  .join(Plan, Plan.id == Subscription.plan_id)
+                  .filter(Subscription.status == 'ativo').all())
+        quotas = {}
+        for user_id, matte in active:
+            code = str(uuid.uuid4())
+            db.session.add(QRCode(user_id=user_id, code=code, valid_until=tomorrow))
+            quotas[code] = matte
+        db.session.commit()
+    return app, quotas
+
+
+def vendor_client(app, vendor_id):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = vendor_id
+        sess['user_role'] = 'vendedor'
+    return client
+
+
+def throughput(app, codes, threads, seconds):
+    """Validações com códigos aleatórios por `seconds` segundos em `threads` threads"""
+    latencies = []
+    errors = []
+    deadline = time.perf_counter() + seconds
+
+    def worker(index):
+        client = vendor_client(app, 2 + index % 10)
+        rng = random.Random(index)
+        while time.perf_counter() < deadline:
+            body = {'code': rng.choice(codes), 'matte_quantity': 1, 'biscoito_quantity': 0}
+            t0 = time.perf_counter()
+            try:
+                response = client.post('/api/qrcode/validate', json=body)
+                status = response.status_code
+            except Exception as exc:
+                status = type(exc).__name__
+            latencies.append(time.perf_counter() - t0)
+            if status not in (201, 400):
+                errors.append(status)
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'ops': len(latencies) / elapsed,
+        'p50': latencies[len(latencies) // 2] * 1000,
+        'p99': latencies[int(len(latencies) * 0.99)] * 1000,
+        'errors': len(errors),
+        'error_kinds': sorted({str(e) for e in errors})
+    }
+
+
+def same_code_race(app, code, threads):
+    """Todas as threads validam o mesmo código no mesmo instante; devolve quantas foram aprovadas"""
+    barrier = threading.Barrier(threads)
+    approved = []
+
+    def worker(index):
+        client = vendor_client(app, 2 + index % 10)
+        barrier.wait()
+        response = client.post('/api/qrcode/validate', json={'code': code, 'matte_quantity': 1, 'biscoito_quantity': 0})
+        if response.status_code == 201:
+            approved.append(index)
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return len(approved)
+
+
+def over_redeemed(app, quotas):
+    with app.app_context():
+        totals = (db.session.query(QRCode.code, func.sum(Redemption.matte_quantity))
+                  .join(Redemption, Redemption.qr_code_id == QRCode.id)
+                  .filter(QRCode.code.in_(list(quotas)))
+                  .group_by(QRCode.code).all())
+    return sum(1 for code, total in totals if total > quotas[code])
+
+
+def run(name, uri, config, args):
+    app, quotas = prepare(uri, config, args.customers)
+    codes = list(quotas)
+    race_code = codes.pop()
+    result = throughput(app, codes, args.threads, args.seconds)
+    approved = same_code_race(app, race_code, args.threads)
+    result['race'] = f'{approved}/{quotas[race_code]}'
+    result['over'] = over_redeemed(app, quotas)
+    kinds = f' ({", ".join(result["error_kinds"])})' if result['error_kinds'] else ''
+    print(f'{name:<16}{result["ops"]:>9.0f}/s{result["p50"]:>9.1f}ms{result["p99"]:>9.1f}ms'
+          f'{result["errors"]:>8}{result["race"]:>12}{result["over"]:>10}{kinds}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite (WAL/padrão) x MySQL no workload do validate')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--customers', type=int, default=500)
+    parser.add_argument('--uri', action='append', default=[], help='Banco extra (vazio) para comparar, ex.: MySQL')
+    args = parser.parse_args()
+
+    print(f'{args.threads} threads, {args.seconds:.0f}s por cenário')
+    print(f'{"backend":<16}{"vazão":>11}{"p50":>11}{"p99":>11}{"erros":>8}{"corrida":>12}{"excedidos":>10}')
+    for name, config in SCENARIOS.items():
+        path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+        run(name, f'sqlite:///{path}', config, args)
+    for uri in args.uri:
+        run(uri.split(':', 1)[0], uri, {}, args)
+
+
+if __name__ == '__main__':
+    main()
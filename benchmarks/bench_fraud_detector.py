@@ -0,0 +1,49 @@
+"""Custo por leitura do detector de anomalias (observe), com o estado cheio.
+
+Uso: python benchmarks/bench_fraud_detector.py
+"""
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.fraud import RedemptionAnomalyDetector
+
+SCANS = 500000
+CODES = 200000
+VENDORS = 500
+
+
+def main():
+    random.seed(7)
+    detector = RedemptionAnomalyDetector()
+    start = datetime(2025, 1, 6, 7)
+    # Manhã movimentada: uma leitura a cada ~20 ms, vendedores com concentração
+    events = [
+        (random.randrange(CODES), int(random.paretovariate(1.5)) % VENDORS,
+         start + timedelta(milliseconds=20 * i))
+        for i in range(SCANS)
+    ]
+
+    latencies = []
+    alerts = 0
+    t0 = time.perf_counter()
+    for code, vendor, ts in events:
+        t = time.perf_counter_ns()
+        alerts += len(detector.observe(code, vendor, ts))
+        latencies.append(time.perf_counter_ns() - t)
+    total = time.perf_counter() - t0
+
+    latencies.sort()
+    print(f"{SCANS:,} leituras em {total:.2f} s, {alerts:,} alertas")
+    for p in (50, 95, 99, 99.9):
+        print(f"  p{p:<5} {latencies[int(len(latencies) * p / 100) - 1] / 1000:.2f} us")
+    print(f"  max    {latencies[-1] / 1000:.2f} us")
+    print(f"  estado: {len(detector._codes):,} códigos, {len(detector._vendors):,} vendedores")
+
+
+if __name__ == '__main__':
+    main()
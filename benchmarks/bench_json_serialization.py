@@ -0,0 +1,83 @@
+"""Serialização de payloads realistas: jsonify original vs provider da aplicação (json e orjson).
+
+Uso: python benchmarks/bench_json_serialization.py
+"""
+import os
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from src.json_provider import JSONProvider, orjson
+
+VENDORS = 300
+DAYS = 90
+REDEMPTIONS = 5000
+ROUNDS = 20
+
+
+def vendor_reports_payload(iso):
+    """Relatório de todos os vendedores (mesmo formato do vendor_reports)"""
+    start = datetime(2025, 1, 1)
+    fmt = (lambda d: d.isoformat()) if iso else (lambda d: d)
+    reports = []
+    for vendor_id in range(VENDORS):
+        daily = [{
+            'date': (start + timedelta(days=d)).date().isoformat(),
+            'matte': random.randint(0, 200),
+            'biscoito': random.randint(0, 200),
+            'redemptions': random.randint(0, 150)
+        } for d in range(DAYS)]
+        reports.append({
+            'vendor_id': vendor_id,
+            'vendor_name': f'vendedor_{vendor_id}',
+            'period': {'start_date': fmt(start.date()), 'end_date': fmt((start + timedelta(days=DAYS - 1)).date())},
+            'summary': {'total_redemptions': 1000, 'total_matte': 900, 'total_biscoito': 800},
+            'daily_breakdown': daily
+        })
+    return reports
+
+
+def redemptions_payload(iso):
+    """Histórico de retiradas de um dia movimentado (mesmo formato do get_redemptions)"""
+    now = datetime(2025, 1, 1, 7)
+    fmt = (lambda d: d.isoformat()) if iso else (lambda d: d)
+    return {
+        'date': fmt(now.date()),
+        'total_redemptions': REDEMPTIONS,
+        'total_matte': REDEMPTIONS,
+        'total_biscoito': REDEMPTIONS,
+        'redemptions': [{
+            'id': i,
+            'user': f'cliente_{i}',
+            'matte_quantity': 1,
+            'biscoito_quantity': 1,
+            'redeemed_at': fmt(now + timedelta(seconds=i * 3, microseconds=i))
+        } for i in range(REDEMPTIONS)]
+    }
+
+
+def main():
+    random.seed(1)
+    providers = [('legacy jsonify', DefaultJSONProvider, True), ('provider json', 'json', False)]
+    if orjson is not None:
+        providers.append(('provider orjson', 'orjson', False))
+
+    for payload_name, build in (('vendor_reports', vendor_reports_payload), ('get_redemptions', redemptions_payload)):
+        print(payload_name)
+        for name, backend, iso in providers:
+            app = Flask(__name__)
+            app.json = backend(app) if backend is DefaultJSONProvider else JSONProvider(app, backend=backend)
+            payload = build(iso)
+            with app.app_context():
+                size = len(app.json.response(payload).get_data())
+                elapsed = timeit.timeit(lambda: app.json.response(payload), number=ROUNDS)
+            print(f"  {name:<18}{size:>10} bytes{elapsed / ROUNDS * 1e3:>10.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
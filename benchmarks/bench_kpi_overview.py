@@ -0,0 +1,77 @@
+"""Painel do admin: contadores mantidos por delta x agregados calculados na hora.
+
+Para bases de tamanhos diferentes, mede o GET /api/admin/overview (lê
+algumas linhas da tabela de contadores), os agregados nas tabelas de
+origem que ele evita (os mesmos da conciliação) e o custo que o delta
+acrescenta a cada retirada gravada.
+
+Uso: python benchmarks/bench_kpi_overview.py [--customers 1000 10000] [--months 2] [iterações]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _app import make_app
+from src.kpis import kpis, redemption_deltas
+from src.models.user import db, Redemption, User
+from src.seed import seed_database
+
+
+def per_call(label, fn, n):
+    t = time.perf_counter()
+    for _ in range(n):
+        fn()
+    elapsed = (time.perf_counter() - t) / n
+    print(f'  {label:<44}{elapsed * 1e3:>10.3f} ms')
+    return elapsed
+
+
+def run(customers, months, n):
+    app = make_app(RATE_LIMIT_ENABLED=False, LANES_ENABLED=False, PAYMENT_PIPELINE=False, KPI_RECONCILE_INTERVAL=0)
+    with app.app_context():
+        counts = seed_database(customers, 20, months, seed=11)
+        admin_id = User.query.filter_by(role='admin').first().id
+        kpis.reconcile()
+    print(f'{customers} clientes, {counts.get("redemptions", 0)} retiradas, {counts.get("payments", 0)} pagamentos')
+
+    admin = app.test_client()
+    with admin.session_transaction() as sess:
+        sess['user_id'] = admin_id
+        sess['user_role'] = 'admin'
+    overview = per_call('GET /overview (contadores)', lambda: admin.get('/api/admin/overview'), n)
+
+    with app.app_context():
+        aggregates = per_call('agregados nas tabelas (conciliação)', kpis.reconcile, max(n // 10, 1))
+        redemption = Redemption.query.first()
+        sample = Redemption(qr_code_id=redemption.qr_code_id, vendor_id=redemption.vendor_id,
+                            matte_quantity=1, biscoito_quantity=1, redeemed_at=datetime.utcnow())
+
+        def commit_only():
+            db.session.commit()
+
+        def delta_and_commit():
+            kpis.add(redemption_deltas(sample))
+            db.session.commit()
+
+        base = per_call('commit sem delta', commit_only, n)
+        with_delta = per_call('delta da retirada + commit', delta_and_commit, n)
+    print(f'  {"overview x agregados":<44}{aggregates / overview:>10.0f}x mais rápido')
+    print(f'  {"custo do delta por retirada":<44}{(with_delta - base) * 1e3:>10.3f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Painel do admin: contadores x agregados sob demanda')
+    parser.add_argument('--customers', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--months', type=int, default=2)
+    parser.add_argument('iterations', type=int, nargs='?', default=200)
+    args = parser.parse_args()
+    for customers in args.customers:
+        run(customers, args.months, args.iterations)
+
+
+if __name__ == '__main__':
+    main()
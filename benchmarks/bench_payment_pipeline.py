@@ -0,0 +1,77 @@
+"""Assinatura: cobrança síncrona no request vs fila de pagamentos em segundo plano.
+
+O gateway de testes simula a latência do gateway real; com a fila, a resposta
+do subscribe não espera a cobrança e a vazão fica limitada pelo banco.
+
+Uso: python benchmarks/bench_payment_pipeline.py [assinaturas] [latência em segundos]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from werkzeug.security import generate_password_hash
+from _app import make_app
+from src.models.user import db, Plan, User, Subscription
+from src.payments import payment_queue
+
+
+def run(n, latency, pipeline):
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = make_app(f'sqlite:///{path}', PAYMENT_PIPELINE=pipeline,
+                   FAKE_GATEWAY_LATENCY=latency, FAKE_GATEWAY_FAILURE_RATE=0.05)
+    # O gateway é do processo; um novo por cenário para não reaproveitar resultados
+    payment_queue.gateway = None
+    payment_queue.init_app(app)
+
+    hashed = generate_password_hash('senha')
+    with app.app_context():
+        db.session.add(Plan(name='Mensal', price=49.9, matte_quantity=1, biscoito_quantity=1))
+        db.session.add_all(User(username=f'u{i}', email=f'u{i}@exemplo.com', password=hashed) for i in range(n))
+        db.session.commit()
+
+    clients = []
+    for i in range(n):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = i + 1
+            sess['role'] = 'cliente'
+        clients.append(client)
+
+    latencies = []
+    start = time.perf_counter()
+    for client in clients:
+        t0 = time.perf_counter()
+        response = client.post('/api/subscription/subscribe', json={'plan_id': 1, 'payment_method': 'pix'})
+        latencies.append(time.perf_counter() - t0)
+        assert response.status_code in (201, 202, 402), response.get_json()
+    submitted = time.perf_counter() - start
+    payment_queue.join()
+    settled = time.perf_counter() - start
+
+    with app.app_context():
+        active = Subscription.query.filter_by(status='ativo').count()
+    latencies.sort()
+    return {
+        'p50': latencies[len(latencies) // 2] * 1000,
+        'p99': latencies[int(len(latencies) * 0.99)] * 1000,
+        'submitted': submitted,
+        'settled': settled,
+        'active': active
+    }
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+    print(f'{n} assinaturas, gateway com {latency * 1000:.0f} ms de latência')
+    for label, pipeline in (('síncrono', False), ('fila', True)):
+        r = run(n, latency, pipeline)
+        print(f'{label:>9}: p50 {r["p50"]:7.1f} ms  p99 {r["p99"]:7.1f} ms  '
+              f'respostas em {r["submitted"]:.2f}s  liquidado em {r["settled"]:.2f}s  ativos {r["active"]}')
+
+
+if __name__ == '__main__':
+    main()
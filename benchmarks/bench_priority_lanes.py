@@ -0,0 +1,140 @@
+"""Teste de carga: clientes no balcão (gerar QR code) enquanto administradores puxam relatórios pesados.
+
+Sobe a aplicação em um servidor HTTP com threads e roda os dois tipos de
+cliente ao mesmo tempo, com e sem as faixas de prioridade. Cada relatório usa
+um período diferente, para não ser servido do cache.
+
+Uso: python benchmarks/bench_priority_lanes.py [segundos] [clientes de relatório] [clientes no balcão]
+"""
+import http.client
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import insert, text
+from werkzeug.serving import make_server
+from _app import make_app
+from src.entitlements import entitlements
+from src.models.user import db, User, Plan, QRCode, Subscription, Redemption
+
+VENDORS = 20
+CUSTOMERS = 50
+REDEMPTIONS = 100_000
+DAYS = 365
+
+
+def seed(app):
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    with app.app_context():
+        db.session.execute(text('PRAGMA journal_mode=WAL'))
+        db.session.add(Plan(id=1, name='Mensal', price=49.9, matte_quantity=1000, biscoito_quantity=1000))
+        db.session.execute(insert(User), [{'id': 1, 'username': 'admin', 'email': 'a', 'password': 'x', 'role': 'admin'}])
+        db.session.execute(insert(QRCode), [{'id': 1, 'user_id': 1}])
+        db.session.execute(insert(User), [
+            {'id': 2 + i, 'username': f'v{i}', 'email': f'v{i}', 'password': 'x', 'role': 'vendedor'}
+            for i in range(VENDORS)
+        ])
+        customers = range(2 + VENDORS, 2 + VENDORS + CUSTOMERS)
+        db.session.execute(insert(User), [
+            {'id': i, 'username': f'c{i}', 'email': f'c{i}', 'password': 'x', 'role': 'cliente'} for i in customers
+        ])
+        db.session.execute(insert(Subscription), [
+            {'user_id': i, 'plan_id': 1, 'status': 'ativo', 'start_date': now, 'end_date': now + timedelta(days=30)}
+            for i in customers
+        ])
+        db.session.execute(insert(Redemption), [{
+            'qr_code_id': 1,
+            'vendor_id': rng.randint(2, VENDORS + 1),
+            'matte_quantity': 1,
+            'biscoito_quantity': 1,
+            'redeemed_at': now - timedelta(seconds=rng.randrange(DAYS * 86400))
+        } for _ in range(REDEMPTIONS)])
+        db.session.commit()
+    return list(customers)
+
+
+def session_cookie(app, user_id, role):
+    serializer = app.session_interface.get_signing_serializer(app)
+    return 'session=' + serializer.dumps({'user_id': user_id, 'user_role': role})
+
+
+def client_loop(port, paths, cookie, stop, results, think=0.0):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    while not stop.is_set():
+        t = time.perf_counter()
+        conn.request('GET', next(paths), headers={'Cookie': cookie})
+        response = conn.getresponse()
+        response.read()
+        results.append((response.status, time.perf_counter() - t))
+        if think:
+            time.sleep(think)
+    conn.close()
+
+
+def report_paths(rng):
+    today = datetime.utcnow().date()
+    while True:
+        start = today - timedelta(days=rng.randrange(200, DAYS))
+        end = start + timedelta(days=rng.randrange(90, 180))
+        yield f'/api/vendor/reports?start_date={start}&end_date={end}'
+
+
+def scenario(label, lanes_enabled, seconds, bulk_clients, counter_clients):
+    workdir = tempfile.mkdtemp()
+    app = make_app(f'sqlite:///{workdir}/bench.db', LANES_ENABLED=lanes_enabled,
+                   REPORT_CACHE_DIR=os.path.join(workdir, 'cache'))
+    customers = seed(app)
+    entitlements.clear()
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    stop = threading.Event()
+    bulk, counter = [], []
+    threads = []
+    admin_cookie = session_cookie(app, 1, 'admin')
+    for i in range(bulk_clients):
+        paths = report_paths(random.Random(i))
+        threads.append(threading.Thread(target=client_loop, args=(server.port, paths, admin_cookie, stop, bulk, 0.05)))
+    for i in range(counter_clients):
+        user_id = customers[i % len(customers)]
+        paths = iter(lambda: '/api/qrcode/generate?format=none', None)
+        cookie = session_cookie(app, user_id, 'cliente')
+        threads.append(threading.Thread(target=client_loop, args=(server.port, paths, cookie, stop, counter, 0.1)))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    server.shutdown()
+    shutil.rmtree(workdir)
+
+    latencies = sorted(elapsed for status, elapsed in counter if status == 200)
+    ok_reports = sum(1 for status, _ in bulk if status == 200)
+    shed = sum(1 for status, _ in bulk if status == 503)
+    print(f'{label:>10}: balcão {len(latencies) / seconds:6.1f} req/s  '
+          f'p50 {latencies[len(latencies) // 2] * 1000:7.1f} ms  p99 {latencies[int(len(latencies) * 0.99)] * 1000:7.1f} ms  '
+          f'| relatórios ok {ok_reports}  recusados {shed}')
+
+
+def main():
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    bulk_clients = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    counter_clients = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    print(f'{seconds:.0f}s, {bulk_clients} clientes de relatório, {counter_clients} clientes no balcão')
+    scenario('sem faixas', False, seconds, bulk_clients, counter_clients)
+    scenario('com faixas', True, seconds, bulk_clients, counter_clients)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Custo do profiler por amostragem: hook desligado, amostra isolada e requisição perfilada.
+
+Mede o hook de cada requisição com o profiler desligado (o custo que fica em
+produção), o custo de uma amostra de pilhas e a latência do dashboard do
+vendedor sem profiler e com 100% das requisições perfiladas.
+
+Uso: python benchmarks/bench_profiler.py [iterações]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _app import make_app
+from src.profiler import profiler
+from src.seed import seed_database
+
+
+def per_call(label, fn, n):
+    t = time.perf_counter()
+    for _ in range(n):
+        fn()
+    print(f'  {label:<40}{(time.perf_counter() - t) / n * 1e6:>10.2f} µs')
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    app = make_app(RATE_LIMIT_ENABLED=False, LANES_ENABLED=False, PAYMENT_PIPELINE=False,
+                   PROFILER_DIR=tempfile.mkdtemp())
+    with app.app_context():
+        seed_database(500, 5, 1, seed=1, end_date=date.today() - timedelta(days=1))
+
+    print(f'{n} iterações')
+    with app.test_request_context('/api/vendor/dashboard'):
+        per_call('hook com o profiler desligado', profiler.before_request, n * 100)
+
+    scratch = tempfile.TemporaryFile()
+    main_thread = {threading.get_ident()}
+    per_call(f'amostra ({threading.active_count()} threads)',
+             lambda: profiler.read_stacks(scratch.fileno(), main_thread), n)
+
+    vendor = app.test_client()
+    with vendor.session_transaction() as sess:
+        sess['user_id'] = 2
+        sess['user_role'] = 'vendedor'
+    dashboard = lambda: vendor.get('/api/vendor/dashboard')
+    dashboard()
+    per_call('dashboard sem profiler', dashboard, n)
+
+    profiler.enable(['vendor.vendor_dashboard'], 1.0, 600)
+    per_call('dashboard perfilado (100%)', dashboard, n)
+    profiler.disable()
+    status = profiler.status()
+    print(f'  {"amostras / intervalo final":<40}{status["samples"]:>10} / {status["interval_ms"]} ms')
+    print(f'  {"tempo gasto amostrando":<40}{status["sampling_seconds"] * 1000:>10.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Tamanho do payload e tempo de renderização de cada formato de QR code.
+
+Uso: python benchmarks/bench_qrcode_formats.py
+"""
+import base64
+import io
+import json
+import os
+import sys
+import timeit
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import qrcode
+from src.routes.qrcode import qr_matrix, render_qr_png, render_qr_svg, pack_qr_matrix
+
+ROUNDS = 200
+
+
+def legacy_png(code):
+    """Renderização original do generate_qrcode (box_size=10, base64 no JSON)"""
+    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=4)
+    qr.add_data(code)
+    qr.make(fit=True)
+    img = qr.make_image(fill_color="black", back_color="white")
+    buffered = io.BytesIO()
+    img.save(buffered)
+    return f"data:image/png;base64,{base64.b64encode(buffered.getvalue()).decode()}"
+
+
+def main():
+    codes = [str(uuid.uuid4()) for _ in range(ROUNDS)]
+    for code in codes:
+        qr_matrix(code)
+
+    cases = [
+        ('legacy png/base64 (json)', lambda c: legacy_png(c)),
+        ('png/base64 (json)', lambda c: 'data:image/png;base64,' + base64.b64encode(render_qr_png(c)).decode()),
+        ('png raw (box 10)', lambda c: render_qr_png(c)),
+        ('png raw (box 4)', lambda c: render_qr_png(c, 4)),
+        ('svg', lambda c: render_qr_svg(c)),
+        ('matrix (json)', lambda c: json.dumps(pack_qr_matrix(c))),
+        ('none (json)', lambda c: json.dumps({'code': c, 'matte_remaining': 1, 'biscoito_remaining': 1})),
+    ]
+
+    print(f"{'formato':<28}{'bytes':>10}{'us/render':>12}")
+    for name, fn in cases:
+        size = len(fn(codes[0]))
+        it = iter(codes * 2)
+        elapsed = timeit.timeit(lambda: fn(next(it)), number=ROUNDS)
+        print(f"{name:<28}{size:>10}{elapsed / ROUNDS * 1e6:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Custo do limite de taxa: verificação em requisições permitidas e recusa de rajadas.
+
+Mede o hook isolado (dentro de um contexto de requisição), a requisição
+completa recusada com 429 e, para comparação, um login permitido (hash de
+senha + banco), que é o que a recusa evita.
+
+Uso: python benchmarks/bench_rate_limit.py [iterações]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from werkzeug.security import generate_password_hash
+from _app import make_app
+from src.models.user import db, User
+from src.rate_limit import MemoryBucketStore, RateLimitPolicy, rate_limiter
+
+
+def per_call(label, fn, n):
+    t = time.perf_counter()
+    for _ in range(n):
+        fn()
+    print(f'  {label:<40}{(time.perf_counter() - t) / n * 1e6:>10.2f} µs')
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    # Limite alto no balde do benchmark para medir só o caminho permitido
+    app = make_app(RATE_LIMITS={'qrcode.validate_qrcode': (RateLimitPolicy('vendor', 10**9, 1, 10**9),)})
+    with app.app_context():
+        db.session.add(User(username='cliente', email='c@exemplo.com', password=generate_password_hash('senha')))
+        db.session.commit()
+
+    print(f'{n} iterações')
+    body = {'code': 'x', 'matte_quantity': 1, 'biscoito_quantity': 0}
+    with app.test_request_context('/api/qrcode/validate', method='POST', json=body):
+        from flask import session
+        session['user_id'] = 7
+        session['user_role'] = 'vendedor'
+        per_call('permitida (1 balde, vendedor)', lambda: rate_limiter.before_request(), n)
+    with app.test_request_context('/api/auth/login', method='POST', json={'username': 'cliente', 'password': 'x'}):
+        rate_limiter.store = MemoryBucketStore()
+        per_call('login (IP + username, até recusar)', lambda: rate_limiter.before_request(), n)
+
+    client = app.test_client()
+    rate_limiter.store = MemoryBucketStore()
+    login = {'username': 'cliente', 'password': 'senha'}
+    t = time.perf_counter()
+    client.post('/api/auth/login', json=login)
+    print(f'  {"login permitido (requisição completa)":<40}{(time.perf_counter() - t) * 1e6:>10.0f} µs')
+    for _ in range(20):
+        client.post('/api/auth/login', json=login)
+    per_call('login recusado (requisição completa)', lambda: client.post('/api/auth/login', json=login), n // 10)
+
+    # Memória constante: milhões de IPs diferentes ficam limitados ao tamanho do LRU
+    store = MemoryBucketStore(maxsize=100000)
+    t = time.perf_counter()
+    for i in range(500000):
+        store.take(('auth.login', 'ip', i), 1 / 3, 20, t)
+    print(f'  {"500k chaves distintas":<40}{len(store):>10} baldes guardados')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Compara o serve() original (os.path.exists + send_from_directory) com o manifesto em memória.
+
+Uso: python benchmarks/bench_static_serving.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, send_from_directory
+from src.static_assets import StaticManifest
+
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src', 'static')
+REQUESTS = 2000
+
+
+def legacy_app():
+    app = Flask(__name__, static_folder=STATIC_FOLDER)
+
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        if path != "" and os.path.exists(os.path.join(STATIC_FOLDER, path)):
+            return send_from_directory(STATIC_FOLDER, path)
+        return send_from_directory(STATIC_FOLDER, 'index.html')
+
+    return app
+
+
+def manifest_app():
+    app = Flask(__name__, static_folder=STATIC_FOLDER)
+    manifest = StaticManifest(STATIC_FOLDER)
+
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        return manifest.response(manifest.lookup(path))
+
+    return app
+
+
+def run(app, path, headers=None):
+    client = app.test_client()
+    response = client.get(path, headers=headers or {})
+    size = len(response.get_data())
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        client.get(path, headers=headers or {}).close()
+    elapsed = time.perf_counter() - start
+    return elapsed / REQUESTS * 1e6, size, response.status_code
+
+
+def main():
+    legacy = legacy_app()
+    current = manifest_app()
+    etag = current.test_client().get('/').headers['ETag']
+
+    cases = [
+        ('legacy  /dashboard (spa)', legacy, '/dashboard', None),
+        ('legacy  /register.html', legacy, '/register.html', None),
+        ('manifest /dashboard', current, '/dashboard', None),
+        ('manifest /dashboard gzip', current, '/dashboard', {'Accept-Encoding': 'gzip'}),
+        ('manifest /register.html gzip', current, '/register.html', {'Accept-Encoding': 'gzip'}),
+        ('manifest /dashboard 304', current, '/dashboard', {'If-None-Match': etag}),
+    ]
+
+    print(f"{'caso':<32}{'status':>7}{'bytes':>8}{'us/req':>10}")
+    for name, app, path, headers in cases:
+        us, size, status = run(app, path, headers)
+        print(f"{name:<32}{status:>7}{size:>8}{us:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Custo do tracing: desligado (o que fica em produção) e com todas as requisições amostradas.
+
+Mede `span()` fora de uma requisição amostrada, o hook da requisição com
+amostragem 0 e o POST /validate completo sem tracing e com 100% amostrado
+(spans exportados para um arquivo temporário).
+
+Uso: python benchmarks/bench_tracing.py [iterações]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import microbench
+from src.tracing import span, tracer
+
+
+def per_call(label, fn, n):
+    t = time.perf_counter()
+    for _ in range(n):
+        fn()
+    print(f'  {label:<40}{(time.perf_counter() - t) / n * 1e6:>10.2f} µs')
+
+
+def noop_span():
+    with span('fase'):
+        pass
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    directory = tempfile.mkdtemp()
+    make_app = microbench.make_app
+    microbench.make_app = lambda **config: make_app(TRACING_FILE=os.path.join(directory, 'spans.jsonl'), **config)
+    app, customer, vendor, fixture = microbench.build_fixture()
+
+    print(f'{n} iterações')
+    per_call('span() sem requisição amostrada', noop_span, n * 100)
+    with app.test_request_context('/api/qrcode/validate', method='POST'):
+        per_call('hook com amostragem 0', tracer.before_request, n * 100)
+
+    # Pedido acima do saldo: percorre todas as fases de leitura sem gravar nada
+    body = {'code': fixture['code'], 'matte_quantity': 99, 'biscoito_quantity': 0}
+    validate = lambda: vendor.post('/api/qrcode/validate', json=body)
+    validate()
+    per_call('validate sem tracing', validate, n)
+    tracer.sample_rate = 1.0
+    per_call('validate com 100% amostrado', validate, n)
+    tracer.sample_rate = 0.0
+    tracer.flush()
+    stats = tracer.stats()
+    print(f'  {"spans exportados / descartados":<40}{stats["exported"]:>10} / {stats["dropped"]}')
+
+
+if __name__ == '__main__':
+    main()
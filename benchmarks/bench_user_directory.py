@@ -0,0 +1,68 @@
+"""Diretório de usuários com uma tabela grande: listagem completa (.all()) vs página por chave e busca por prefixo.
+
+Uso: python benchmarks/bench_user_directory.py [usuarios]
+"""
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import insert
+from _app import make_app
+from src.models.user import db, User, Subscription, Plan
+
+
+def seed(n):
+    now = datetime.utcnow()
+    db.session.execute(insert(Plan), [{'name': 'Plano', 'price': 49.9, 'matte_quantity': 1, 'biscoito_quantity': 1}])
+    batch = 50000
+    for start in range(0, n, batch):
+        db.session.execute(insert(User), [{
+            'username': f'cliente{i:07d}', 'email': f'cliente{i:07d}@exemplo.com', 'password': 'x' * 100,
+            'role': 'vendedor' if i % 200 == 0 else 'cliente', 'created_at': now, 'updated_at': now
+        } for i in range(start, min(start + batch, n))])
+        db.session.execute(insert(Subscription), [{
+            'user_id': i + 1, 'plan_id': 1, 'status': 'ativo' if i % 3 else 'cancelado', 'start_date': now
+        } for i in range(start, min(start + batch, n), 2)])
+    db.session.commit()
+
+
+def timed(client, label, url, rounds=20):
+    client.get(url)
+    t = time.perf_counter()
+    for _ in range(rounds):
+        response = client.get(url)
+    elapsed = (time.perf_counter() - t) / rounds
+    print(f"  {label:<40}{elapsed * 1e3:>10.2f} ms{len(response.get_data()):>12} bytes")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+    app = make_app()
+    with app.app_context():
+        seed(n)
+
+    @app.route('/legacy/users')
+    def legacy_users():
+        # Comportamento antigo: carregar todos os usuários
+        return [{'id': u.id, 'username': u.username, 'email': u.email, 'created_at': u.created_at}
+                for u in User.query.all()]
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+        session['user_role'] = 'admin'
+
+    print(f"{n:,} usuários")
+    timed(client, 'legado: todos os usuários', '/legacy/users', rounds=2)
+    timed(client, 'primeira página (50)', '/api/admin/users')
+    timed(client, 'página profunda (after_id)', f'/api/admin/users?after_id={n - 1000}')
+    timed(client, 'busca por prefixo', '/api/admin/users?q=cliente01234')
+    timed(client, 'vendedores', '/api/admin/users?role=vendedor')
+    timed(client, 'assinatura ativa', '/api/admin/users?subscription_status=ativo&after_id=1000')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Relatório de todos os vendedores em um período longo: implementação antiga vs agregada vs cache.
+
+A antiga carrega cada retirada do período como objeto ORM, vendedor a
+vendedor; a nova agrupa por (vendedor, dia) no banco; a terceira coluna é a
+mesma requisição servida do cache em disco (período fechado).
+
+Uso: python benchmarks/bench_vendor_reports.py [retiradas] [vendedores]
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import insert
+from _app import make_app
+from src.models.user import db, User, QRCode, Redemption
+from src.reports import build_vendor_reports
+
+DAYS = 365
+
+
+def legacy(start_datetime, end_datetime):
+    """Mesmo trabalho do vendor_reports original"""
+    report_data = []
+    for vendor in User.query.filter_by(role='vendedor').all():
+        redemptions = Redemption.query.filter(
+            Redemption.vendor_id == vendor.id,
+            Redemption.redeemed_at >= start_datetime,
+            Redemption.redeemed_at < end_datetime
+        ).order_by(Redemption.redeemed_at).all()
+        daily = {}
+        for r in redemptions:
+            day = daily.setdefault(r.redeemed_at.date().isoformat(), {'matte': 0, 'biscoito': 0, 'redemptions': 0})
+            day['matte'] += r.matte_quantity
+            day['biscoito'] += r.biscoito_quantity
+            day['redemptions'] += 1
+        report_data.append((vendor.id, len(redemptions), sorted(daily)))
+    return report_data
+
+
+def timed(label, fn, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    print(f'  {label:<24}{best * 1e3:>10.1f} ms')
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    vendors = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    workdir = tempfile.mkdtemp()
+    app = make_app(f'sqlite:///{workdir}/bench.db', REPORT_CACHE_DIR=os.path.join(workdir, 'cache'))
+    rng = random.Random(42)
+    end = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    start = end - timedelta(days=DAYS)
+
+    with app.app_context():
+        db.session.execute(insert(User), [
+            {'id': i + 2, 'username': f'v{i}', 'email': f'v{i}@exemplo.com', 'password': 'x', 'role': 'vendedor'}
+            for i in range(vendors)
+        ])
+        db.session.execute(insert(User), [{'id': 1, 'username': 'admin', 'email': 'a', 'password': 'x', 'role': 'admin'}])
+        db.session.execute(insert(QRCode), [{'id': 1, 'user_id': 1}])
+        db.session.execute(insert(Redemption), [{
+            'qr_code_id': 1,
+            'vendor_id': rng.randint(2, vendors + 1),
+            'matte_quantity': 1,
+            'biscoito_quantity': rng.randint(0, 2),
+            'redeemed_at': start + timedelta(seconds=rng.randrange(DAYS * 86400))
+        } for _ in range(rows)])
+        db.session.commit()
+
+        print(f'{rows} retiradas, {vendors} vendedores, {DAYS} dias')
+        timed('antigo (ORM por vendedor)', lambda: legacy(start, end), repeat=1)
+        timed('agregado no banco', lambda: build_vendor_reports(start, end))
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+        sess['user_role'] = 'admin'
+    url = f'/api/vendor/reports?start_date={start.date()}&end_date={(end - timedelta(days=1)).date()}'
+    timed('primeira requisição', lambda: client.get(url), repeat=1)
+    timed('requisição em cache', lambda: client.get(url, headers={'Accept-Encoding': 'gzip'}))
+
+    shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,362 @@
+"""Teste de carga do pico da manhã: clientes gerando QR code e vendedores validando na mesma hora.
+
+Sobe a aplicação em um servidor HTTP com threads sobre uma massa sintética
+(SQLite temporário por padrão, ou --database-uri para um MySQL local já
+populado com `flask seed`) e dispara chegadas de clientes em malha aberta,
+com a taxa subindo até o pico e caindo de novo ao longo do teste:
+
+  cliente: login (parte dos clientes) → gerar QR code → retirada no vendedor
+           (às vezes parcial: 1 matte agora e o restante depois)
+  vendedor: consulta o dashboard periodicamente
+
+O resultado (vazão e p50/p95/p99 por endpoint) vai para um arquivo JSON;
+com --baseline, compara com o resultado de outra versão.
+
+Uso: python benchmarks/load_morning_rush.py [--duration 60] [--peak-rate 30] [--output morning_rush.json]
+"""
+import argparse
+import gzip
+import heapq
+import http.client
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import select
+from werkzeug.serving import make_server
+from _app import make_app
+from src.models.user import db, User, Subscription
+from src.seed import SEED_PASSWORD, seed_database
+
+# Fração dos clientes que fazem login (os demais já têm sessão no aparelho)
+LOGIN_SHARE = 0.1
+# Chance de a retirada ser parcial quando o plano tem mais de um matte
+PARTIAL_SHARE = 0.3
+# Intervalos em segundos (tempo do teste): do QR code até o balcão, e entre as duas partes da retirada
+COUNTER_DELAY = (2, 15)
+SECOND_PART_DELAY = (5, 20)
+DASHBOARD_INTERVAL = 10
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, math.ceil(q / 100 * len(values)) - 1))
+    return values[index]
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Scheduler:
+    """Eventos com horário marcado executados por um pool de threads (malha aberta: o atraso do servidor não segura as chegadas)"""
+
+    def __init__(self, workers):
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='load')
+        self.events = []
+        self.counter = itertools.count()
+        self.cond = threading.Condition()
+        self.inflight = 0
+        self.start = None
+
+    def at(self, when, action):
+        with self.cond:
+            heapq.heappush(self.events, (when, next(self.counter), action))
+            self.cond.notify()
+
+    def run(self):
+        """Executar até acabarem os eventos e as requisições em andamento"""
+        self.start = time.monotonic()
+        while True:
+            with self.cond:
+                while True:
+                    now = time.monotonic() - self.start
+                    if self.events and self.events[0][0] <= now:
+                        _, _, action = heapq.heappop(self.events)
+                        self.inflight += 1
+                        break
+                    if not self.events and not self.inflight:
+                        self.executor.shutdown()
+                        return
+                    timeout = self.events[0][0] - now if self.events else None
+                    self.cond.wait(timeout)
+            self.executor.submit(self._run, action)
+
+    def _run(self, action):
+        try:
+            action()
+        finally:
+            with self.cond:
+                self.inflight -= 1
+                self.cond.notify()
+
+    def now(self):
+        return time.monotonic() - self.start
+
+
+class LoadClient:
+    """Requisições HTTP com uma conexão por thread, registrando a latência por endpoint"""
+
+    def __init__(self, port):
+        self.port = port
+        self.local = threading.local()
+        self.results = {}
+        self.lock = threading.Lock()
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        return conn
+
+    def request(self, name, method, path, cookie=None, body=None):
+        headers = {'Accept-Encoding': 'gzip'}
+        if cookie:
+            headers['Cookie'] = cookie
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+
+        started = time.perf_counter()
+        try:
+            conn = self.connection()
+            conn.request(method, path, body=payload, headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+            status = response.status
+            set_cookie = response.getheader('Set-Cookie')
+            encoding = response.getheader('Content-Encoding')
+        except (OSError, http.client.HTTPException):
+            self.local.conn = None
+            status, data, set_cookie, encoding = 0, b'', None, None
+        elapsed = time.perf_counter() - started
+
+        with self.lock:
+            self.results.setdefault(name, []).append((status, elapsed))
+        if encoding == 'gzip':
+            data = gzip.decompress(data)
+        return status, data, set_cookie
+
+
+class MorningRush:
+    def __init__(self, app, client, customers, vendors, args):
+        self.app = app
+        self.client = client
+        self.customers = customers
+        self.vendors = vendors
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.rng_lock = threading.Lock()
+        self.serializer = app.session_interface.get_signing_serializer(app)
+        self.scheduler = Scheduler(args.workers)
+
+    def random(self):
+        with self.rng_lock:
+            return self.rng.random()
+
+    def uniform(self, low, high):
+        with self.rng_lock:
+            return self.rng.uniform(low, high)
+
+    def cookie(self, user_id, role):
+        return 'session=' + self.serializer.dumps({'user_id': user_id, 'user_role': role})
+
+    def rate(self, t):
+        """Chegadas por segundo no instante t: base + pico gaussiano a 40% do teste"""
+        duration = self.args.duration
+        peak = math.exp(-((t - 0.4 * duration) / (0.15 * duration)) ** 2)
+        return self.args.peak_rate * (0.15 + 0.85 * peak)
+
+    def arrivals(self):
+        """Processo de Poisson não homogêneo (por afinamento) com a curva do pico"""
+        rng = random.Random(self.args.seed + 1)
+        t = 0.0
+        while True:
+            t += rng.expovariate(self.args.peak_rate)
+            if t > self.args.duration:
+                return
+            if rng.random() < self.rate(t) / self.args.peak_rate:
+                yield t
+
+    def customer(self, user_id, username):
+        if self.random() < LOGIN_SHARE:
+            status, _, set_cookie = self.client.request(
+                'POST /api/auth/login', 'POST', '/api/auth/login',
+                body={'username': username, 'password': SEED_PASSWORD}
+            )
+            if status != 200 or not set_cookie:
+                return
+            cookie = set_cookie.split(';', 1)[0]
+        else:
+            cookie = self.cookie(user_id, 'cliente')
+
+        status, data, _ = self.client.request('GET /api/qrcode/generate', 'GET', '/api/qrcode/generate', cookie)
+        if status not in (200, 201):
+            return
+        qr = json.loads(data)
+        vendor_id = self.vendors[int(self.random() ** 2 * len(self.vendors))]
+        matte = qr.get('matte_remaining', 0)
+        biscoito = qr.get('biscoito_remaining', 0)
+        if matte <= 0 and biscoito <= 0:
+            return
+
+        first = 1 if matte > 1 and self.random() < PARTIAL_SHARE else matte
+        when = self.scheduler.now() + self.uniform(*COUNTER_DELAY)
+        self.scheduler.at(when, lambda: self.redeem(vendor_id, qr['code'], first, biscoito, matte - first))
+
+    def redeem(self, vendor_id, code, matte, biscoito, remaining):
+        status, _, _ = self.client.request(
+            'POST /api/qrcode/validate', 'POST', '/api/qrcode/validate', self.cookie(vendor_id, 'vendedor'),
+            body={'code': code, 'matte_quantity': matte, 'biscoito_quantity': biscoito}
+        )
+        if 200 <= status < 300 and remaining > 0:
+            when = self.scheduler.now() + self.uniform(*SECOND_PART_DELAY)
+            self.scheduler.at(when, lambda: self.redeem(vendor_id, code, remaining, 0, 0))
+
+    def dashboard(self, vendor_id):
+        self.client.request('GET /api/vendor/dashboard', 'GET', '/api/vendor/dashboard',
+                            self.cookie(vendor_id, 'vendedor'))
+        when = self.scheduler.now() + DASHBOARD_INTERVAL
+        if when <= self.args.duration:
+            self.scheduler.at(when, lambda: self.dashboard(vendor_id))
+
+    def run(self):
+        customers = list(self.customers)
+        self.rng.shuffle(customers)
+        arrivals = 0
+        for t, (user_id, username) in zip(self.arrivals(), customers):
+            self.scheduler.at(t, lambda u=user_id, n=username: self.customer(u, n))
+            arrivals += 1
+        for i, vendor_id in enumerate(self.vendors):
+            self.scheduler.at(i * DASHBOARD_INTERVAL / len(self.vendors), lambda v=vendor_id: self.dashboard(v))
+
+        started = time.perf_counter()
+        self.scheduler.run()
+        return arrivals, time.perf_counter() - started
+
+
+def summarize(results, elapsed):
+    endpoints = {}
+    for name, samples in sorted(results.items()):
+        latencies = sorted(elapsed for status, elapsed in samples if 200 <= status < 300)
+        errors = {}
+        for status, _ in samples:
+            if not 200 <= status < 300:
+                errors[str(status)] = errors.get(str(status), 0) + 1
+        endpoints[name] = {
+            'requests': len(samples),
+            'ok': len(latencies),
+            'errors': errors,
+            'throughput': round(len(samples) / elapsed, 2),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+        }
+    return endpoints
+
+
+def print_report(endpoints, baseline=None):
+    print(f'{"endpoint":<30}{"req":>7}{"erros":>7}{"req/s":>8}{"p50":>9}{"p95":>9}{"p99":>9}')
+    for name, r in endpoints.items():
+        errors = sum(r['errors'].values())
+        line = (f'{name:<30}{r["requests"]:>7}{errors:>7}{r["throughput"]:>8.1f}'
+                f'{r["p50_ms"] or 0:>9.1f}{r["p95_ms"] or 0:>9.1f}{r["p99_ms"] or 0:>9.1f}')
+        before = (baseline or {}).get(name)
+        if before and before.get('p99_ms') and r['p99_ms']:
+            line += f'   p99 {(r["p99_ms"] / before["p99_ms"] - 1) * 100:+.0f}% vs base'
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Teste de carga do pico da manhã')
+    parser.add_argument('--database-uri', help='Banco já populado (padrão: SQLite temporário com massa sintética)')
+    parser.add_argument('--customers', type=int, default=3000)
+    parser.add_argument('--vendors', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=60, help='Duração do teste em segundos')
+    parser.add_argument('--peak-rate', type=float, default=30, help='Chegadas de clientes por segundo no pico')
+    parser.add_argument('--workers', type=int, default=32, help='Threads do gerador de carga')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--rate-limit', action='store_true',
+                        help='Manter o limite de taxa (todo o tráfego sai do mesmo IP local)')
+    parser.add_argument('--output', default='morning_rush.json')
+    parser.add_argument('--baseline', help='Resultado anterior para comparar')
+    args = parser.parse_args()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    workdir = None
+    database_uri = args.database_uri
+    if database_uri is None:
+        workdir = tempfile.mkdtemp()
+        database_uri = f'sqlite:///{workdir}/load.db'
+    app = make_app(database_uri, RATE_LIMIT_ENABLED=args.rate_limit,
+                   REPORT_CACHE_DIR=os.path.join(workdir or tempfile.gettempdir(), 'report_cache'))
+
+    with app.app_context():
+        if workdir is not None:
+            # Massa até ontem: hoje começa sem QR codes, como no início do pico
+            print(f'Gerando massa: {args.customers} clientes, {args.vendors} vendedores...')
+            yesterday = datetime.utcnow().date() - timedelta(days=1)
+            seed_database(args.customers, args.vendors, 1, seed=args.seed, end_date=yesterday)
+        # Só quem tem assinatura ativa aparece no balcão
+        customers = db.session.execute(
+            select(User.id, User.username).join(Subscription, Subscription.user_id == User.id)
+            .where(User.role == 'cliente', Subscription.status == 'ativo')
+        ).all()
+        vendors = db.session.execute(select(User.id).where(User.role == 'vendedor').order_by(User.id)).scalars().all()
+        dialect = db.engine.dialect.name
+
+    started_at = datetime.utcnow()
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = LoadClient(server.port)
+
+    print(f'Pico da manhã: {args.duration:.0f}s, até {args.peak_rate:.0f} clientes/s, {len(vendors)} vendedores')
+    arrivals, elapsed = MorningRush(app, client, [tuple(c) for c in customers], vendors, args).run()
+    server.shutdown()
+
+    endpoints = summarize(client.results, elapsed)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['endpoints']
+    print_report(endpoints, baseline)
+
+    result = {
+        'scenario': 'morning_rush',
+        'revision': git_revision(),
+        'started_at': started_at.isoformat(),
+        'database': dialect,
+        'params': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline', 'database_uri')},
+        'customers_arrived': arrivals,
+        'elapsed_s': round(elapsed, 2),
+        'endpoints': endpoints,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f'Resultado em {args.output}')
+
+    if workdir is not None:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
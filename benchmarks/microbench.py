@@ -0,0 +1,218 @@
+"""Microbenchmarks dos caminhos quentes, com baseline guardado e limite de regressão.
+
+Mede cada operação isolada (mediana de várias rodadas) em algumas
+execuções intercaladas entre os casos e usa a mediana das execuções,
+tanto no baseline quanto na comparação: um pico isolado da máquina não
+reprova nem vira baseline. Compara com o baseline em
+microbench_baseline.json: falha (código de saída 1) se alguma ficar mais
+lenta que o baseline + limite. Roda offline, só com SQLite em
+memória e massa sintética.
+
+O baseline vale para a máquina onde foi gravado: gere de novo com --update
+ao trocar de máquina (o arquivo guarda a plataforma para avisar).
+
+Uso: python benchmarks/microbench.py [--threshold 25] [--runs 5] [--only nome ...] [--update] [--output resultado.json]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from werkzeug.security import check_password_hash, generate_password_hash
+from _app import make_app
+from bench_json_serialization import vendor_reports_payload
+from src.models.user import db, Plan, QRCode, Redemption, Subscription
+from src.reports import build_vendor_reports
+from src.routes.qrcode import qr_matrix, render_qr_png
+from src.seed import seed_database
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'microbench_baseline.json')
+DEFAULT_THRESHOLD = 25.0
+ROUNDS = 7
+DEFAULT_RUNS = 5
+
+
+class Suite:
+    """Casos registrados: nome → (função, chamadas por rodada)"""
+
+    def __init__(self):
+        self.cases = {}
+
+    def case(self, name, number):
+        def register(fn):
+            self.cases[name] = (fn, number)
+            return fn
+        return register
+
+    def measure(self, name, rounds=ROUNDS):
+        fn, number = self.cases[name]
+        fn()  # Aquecimento (caches, compilação de consultas)
+        samples = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            for _ in range(number):
+                fn()
+            samples.append((time.perf_counter() - started) / number)
+        return statistics.median(samples)
+
+
+def build_fixture():
+    """Aplicação sobre SQLite em memória com a massa sintética e um QR code de hoje já usado em parte"""
+    app = make_app(RATE_LIMIT_ENABLED=False, LANES_ENABLED=False, PAYMENT_PIPELINE=False)
+    yesterday = datetime.utcnow().date() - timedelta(days=1)
+    with app.app_context():
+        seed_database(2000, 20, 1, seed=7, end_date=yesterday)
+        premium = Plan.query.filter_by(name='Premium').first()
+        subscription = Subscription.query.filter_by(plan_id=premium.id, status='ativo').first()
+        qr = QRCode(user_id=subscription.user_id, code=str(uuid.UUID(int=7)),
+                    valid_until=datetime.combine(datetime.utcnow().date() + timedelta(days=1), datetime.min.time()))
+        db.session.add(qr)
+        db.session.flush()
+        db.session.add_all([Redemption(qr_code_id=qr.id, vendor_id=2, matte_quantity=1, biscoito_quantity=1),
+                            Redemption(qr_code_id=qr.id, vendor_id=2, matte_quantity=1, biscoito_quantity=0)])
+        db.session.commit()
+        fixture = {'customer_id': subscription.user_id, 'code': qr.code}
+
+    customer = app.test_client()
+    vendor = app.test_client()
+    with customer.session_transaction() as sess:
+        sess['user_id'] = fixture['customer_id']
+        sess['user_role'] = 'cliente'
+    with vendor.session_transaction() as sess:
+        sess['user_id'] = 2
+        sess['user_role'] = 'vendedor'
+    return app, customer, vendor, fixture
+
+
+def register_cases(suite, app, customer, vendor, fixture):
+    password_hash = generate_password_hash('senha123')
+    report_end = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    payload = vendor_reports_payload(iso=False)
+    codes = (str(uuid.UUID(int=i)) for i in range(10 ** 9))
+
+    @suite.case('qrcode_render_png', 20)
+    def qrcode_render_png():
+        """Matriz + PNG de um código novo (sem cache)"""
+        render_qr_png(next(codes))
+
+    @suite.case('generate_qrcode', 20)
+    def generate_qrcode():
+        """GET /generate com o QR code de hoje já existente (imagem PNG em base64)"""
+        qr_matrix.cache_clear()
+        response = customer.get('/api/qrcode/generate')
+        assert response.status_code == 200, response.get_json()
+
+    @suite.case('password_check', 2)
+    def password_check():
+        """Verificação de senha do login (scrypt)"""
+        check_password_hash(password_hash, 'senha123')
+
+    @suite.case('validate_summation', 50)
+    def validate_summation():
+        """POST /validate até a soma das retiradas do dia (pedido acima do saldo: nada é gravado)"""
+        response = vendor.post('/api/qrcode/validate',
+                               json={'code': fixture['code'], 'matte_quantity': 99, 'biscoito_quantity': 0})
+        assert response.status_code == 400, response.get_json()
+
+    @suite.case('vendor_dashboard', 10)
+    def vendor_dashboard():
+        """GET /dashboard do vendedor mais movimentado"""
+        response = vendor.get('/api/vendor/dashboard')
+        assert response.status_code == 200
+
+    @suite.case('vendor_reports_bucketing', 3)
+    def vendor_reports_bucketing():
+        """Relatório de todos os vendedores nos últimos 30 dias, agrupado por dia"""
+        with app.app_context():
+            build_vendor_reports(report_end - timedelta(days=30), report_end)
+
+    @suite.case('json_large_payload', 5)
+    def json_large_payload():
+        """Serialização do relatório de 300 vendedores x 90 dias"""
+        app.json.dumps(payload)
+
+
+def machine():
+    return {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbenchmarks com limite de regressão')
+    parser.add_argument('--threshold', type=float, default=None,
+                        help=f'Regressão máxima em %% (padrão: do baseline ou {DEFAULT_THRESHOLD:.0f})')
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS,
+                        help='Execuções de cada caso; vale a mediana (padrão: %(default)s)')
+    parser.add_argument('--only', nargs='+', help='Rodar só estes casos')
+    parser.add_argument('--update', action='store_true', help='Gravar os resultados como novo baseline')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--output', help='Gravar os resultados desta execução em JSON')
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    if baseline and baseline.get('machine', {}).get('platform') != machine()['platform']:
+        print('Aviso: baseline gravado em outra máquina; use --update para gravar um local')
+
+    suite = Suite()
+    print('Preparando a massa de dados...')
+    register_cases(suite, *build_fixture())
+    names = args.only or list(suite.cases)
+
+    # Execuções intercaladas: a interferência de um momento se espalha entre os casos
+    runs = {name: [] for name in names}
+    for run in range(max(args.runs, 1)):
+        print(f'Execução {run + 1}/{max(args.runs, 1)}...')
+        for name in names:
+            runs[name].append(suite.measure(name))
+
+    results = {}
+    failed = []
+    print(f'{"caso":<28}{"baseline":>12}{"atual":>12}{"variação":>10}{"limite":>8}')
+    for name in names:
+        current = statistics.median(runs[name])
+        results[name] = current
+        entry = baseline.get('cases', {}).get(name)
+        if entry is None or args.update:
+            print(f'{name:<28}{"-":>12}{current * 1e6:>10.1f}µs')
+            continue
+        threshold = args.threshold if args.threshold is not None else entry.get('threshold', DEFAULT_THRESHOLD)
+        change = (current / entry['seconds'] - 1) * 100
+        status = ''
+        if change > threshold:
+            failed.append(name)
+            status = '  REGRESSÃO'
+        print(f'{name:<28}{entry["seconds"] * 1e6:>10.1f}µs{current * 1e6:>10.1f}µs{change:>+9.0f}%{threshold:>7.0f}%{status}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'machine': machine(), 'cases': {n: {'seconds': s, 'runs': runs[n]} for n, s in results.items()}},
+                      f, indent=2)
+
+    if args.update:
+        cases = baseline.get('cases', {})
+        for name, seconds in results.items():
+            # Limite por caso editado à mão no arquivo é mantido
+            cases[name] = {**cases.get(name, {}), 'seconds': seconds}
+        with open(args.baseline, 'w') as f:
+            json.dump({'machine': machine(), 'cases': cases}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Baseline gravado em {args.baseline}')
+        return 0
+
+    if failed:
+        print(f'Regressão em: {", ".join(failed)}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,184 @@
+import threading
+import time
+
+from flask import current_app, g, jsonify, request
+
+# Classificação das rotas por endpoint; o que não está aqui não passa por faixa
+# Críticas: atendimento no balcão (gerar/validar QR code, login)
+CRITICAL_ENDPOINTS = frozenset({
+    'auth.login',
+    'qrcode.generate_qrcode',
+    'qrcode.qrcode_image',
+    'qrcode.validate_qrcode',
+})
+# Pesadas: relatórios, exportações, analytics e dashboards
+BULK_ENDPOINTS = frozenset({
+    'vendor.vendor_reports',
+    'vendor.vendor_dashboard',
+    'admin.analytics_mrr',
+    'admin.analytics_churn',
+    'admin.analytics_cohorts',
+    'admin.analytics_redemptions',
+    'admin.demand_forecast',
+    'admin.bulk_import_users',
+    'user.get_users',
+})
+
+
+def classify(endpoint):
+    if endpoint in CRITICAL_ENDPOINTS:
+        return 'critical'
+    if endpoint in BULK_ENDPOINTS:
+        return 'bulk'
+    return None
+
+
+class Lane:
+    """Faixa de execução: no máximo `concurrency` requisições ao mesmo tempo e uma fila de espera limitada.
+
+    Cada requisição ativa segura no máximo uma conexão do banco, então o
+    limite de concorrência é também o orçamento de conexões da faixa.
+    """
+
+    def __init__(self, name, concurrency, queue_size, timeout):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, wait=True, bounded=True):
+        """Ocupar uma vaga; devolve False se a fila estiver cheia ou o tempo de espera acabar.
+
+        Com bounded=False (jobs em segundo plano) espera sem limite de fila nem de tempo.
+        """
+        with self._cond:
+            if self.active < self.concurrency:
+                self.active += 1
+                self.admitted += 1
+                return True
+            if not wait or (bounded and self.waiting >= self.queue_size):
+                self.shed += 1
+                return False
+
+            self.waiting += 1
+            deadline = time.monotonic() + self.timeout if bounded and self.timeout is not None else None
+            try:
+                while self.active >= self.concurrency:
+                    remaining = deadline - time.monotonic() if deadline is not None else None
+                    if remaining is not None and remaining <= 0:
+                        self.shed += 1
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.active += 1
+            self.admitted += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'concurrency': self.concurrency,
+                'active': self.active,
+                'waiting': self.waiting,
+                'admitted': self.admitted,
+                'shed': self.shed
+            }
+
+
+class AdmissionControl:
+    """Faixas de prioridade: rotas críticas nunca disputam vagas com relatórios e exportações.
+
+    Trabalho pesado roda em uma faixa pequena (com fila curta) e é recusado
+    com 503 + Retry-After quando a fila enche ou quando a faixa crítica está
+    sob pressão; rotas críticas só esperam por vagas da própria faixa.
+    """
+
+    def __init__(self, app=None):
+        self.lanes = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('LANES_ENABLED', True)
+        app.config.setdefault('LANE_CRITICAL_CONCURRENCY', 8)
+        app.config.setdefault('LANE_CRITICAL_QUEUE', 256)
+        app.config.setdefault('LANE_CRITICAL_TIMEOUT', 10)
+        app.config.setdefault('LANE_BULK_CONCURRENCY', 2)
+        app.config.setdefault('LANE_BULK_QUEUE', 8)
+        app.config.setdefault('LANE_BULK_TIMEOUT', 5)
+        # Ocupação da faixa crítica a partir da qual trabalho pesado novo é recusado
+        app.config.setdefault('LANE_BULK_SHED_PRESSURE', 0.75)
+        app.config.setdefault('LANE_RETRY_AFTER', 5)
+
+        self.lanes = {
+            name: Lane(
+                name,
+                app.config[f'LANE_{name.upper()}_CONCURRENCY'],
+                app.config[f'LANE_{name.upper()}_QUEUE'],
+                app.config[f'LANE_{name.upper()}_TIMEOUT']
+            )
+            for name in ('critical', 'bulk')
+        }
+        app.extensions['admission'] = self
+        app.before_request(self.before_request)
+        app.teardown_request(self.teardown_request)
+
+    def under_pressure(self):
+        critical = self.lanes['critical']
+        pressure = current_app.config['LANE_BULK_SHED_PRESSURE']
+        return critical.waiting > 0 or critical.active >= critical.concurrency * pressure
+
+    def before_request(self):
+        if not current_app.config['LANES_ENABLED']:
+            return None
+        lane_name = classify(request.endpoint)
+        if lane_name is None:
+            return None
+
+        lane = self.lanes[lane_name]
+        if lane_name == 'bulk' and self.under_pressure():
+            admitted = lane.acquire(wait=False)
+        else:
+            admitted = lane.acquire()
+        if not admitted:
+            response = jsonify({'error': 'Servidor ocupado. Tente novamente em instantes'})
+            response.status_code = 503
+            response.headers['Retry-After'] = str(current_app.config['LANE_RETRY_AFTER'])
+            return response
+
+        g.admission_lane = lane
+        return None
+
+    def teardown_request(self, exc=None):
+        lane = g.pop('admission_lane', None)
+        if lane is not None:
+            lane.release()
+
+    def run_bulk(self, fn, *args, **kwargs):
+        """Executar trabalho pesado fora de uma requisição (jobs em segundo plano) dentro da faixa bulk"""
+        lane = self.lanes.get('bulk')
+        if lane is None:
+            return fn(*args, **kwargs)
+        lane.acquire(bounded=False)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            lane.release()
+
+    def stats(self):
+        return {name: lane.stats() for name, lane in self.lanes.items()}
+
+
+# Controle de admissão da aplicação (configurado em main.py)
+admission = AdmissionControl()
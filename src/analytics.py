@@ -0,0 +1,221 @@
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import select
+
+from src.models.user import db, Payment, Subscription, Redemption
+
+# Métodos de pagamento, na ordem dos códigos usados nas colunas
+PAYMENT_METHODS = ('cartao', 'pix')
+DEFAULT_CHUNK_SIZE = 50000
+# Mês usado para assinaturas que ainda não terminaram
+NEVER = np.iinfo(np.int64).max
+
+
+def to_months(values):
+    """Converter datetimes em índice de mês (meses desde 1970-01); None vira NEVER"""
+    return np.fromiter(
+        ((v.year - 1970) * 12 + v.month - 1 if v is not None else NEVER for v in values),
+        dtype=np.int64, count=len(values)
+    )
+
+
+def month_index(dt):
+    return (dt.year - 1970) * 12 + dt.month - 1
+
+
+def month_label(index):
+    return str(np.datetime64(int(index), 'M'))
+
+
+def month_start(index):
+    return datetime((int(index) // 12) + 1970, int(index) % 12 + 1, 1)
+
+
+def month_range(months, now=None):
+    """Intervalo [início, fim] com os últimos `months` meses, incluindo o atual"""
+    end = month_index(now or datetime.utcnow())
+    return end - months + 1, end
+
+
+def iter_chunks(stmt, id_column, chunk_size=DEFAULT_CHUNK_SIZE, after_id=0):
+    """Percorrer o resultado em blocos, paginando pela chave primária (keyset)"""
+    last_id = after_id
+    while True:
+        rows = db.session.execute(
+            stmt.where(id_column > last_id).order_by(id_column).limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+        yield rows
+        last_id = rows[-1][0]
+
+
+def load_payments(since=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Carregar pagamentos aprovados em colunas NumPy (valor, método, plano, usuário, mês)"""
+    stmt = select(
+        Payment.id, Payment.amount, Payment.payment_method, Payment.created_at,
+        Subscription.plan_id, Subscription.user_id
+    ).join(Subscription, Payment.subscription_id == Subscription.id).where(Payment.status == 'aprovado')
+    if since is not None:
+        stmt = stmt.where(Payment.created_at >= since)
+
+    method_codes = {method: code for code, method in enumerate(PAYMENT_METHODS)}
+    chunks = {'amount': [], 'method': [], 'month': [], 'plan_id': [], 'user_id': []}
+    for rows in iter_chunks(stmt, Payment.id, chunk_size):
+        _ids, amounts, methods, created, plan_ids, user_ids = zip(*rows)
+        chunks['amount'].append(np.array(amounts, dtype=np.float64))
+        chunks['method'].append(np.array([method_codes.get(m, 0) for m in methods], dtype=np.int8))
+        chunks['month'].append(to_months(created))
+        chunks['plan_id'].append(np.array(plan_ids, dtype=np.int64))
+        chunks['user_id'].append(np.array(user_ids, dtype=np.int64))
+
+    return concat_columns(chunks, {
+        'amount': np.float64, 'method': np.int8, 'month': np.int64, 'plan_id': np.int64, 'user_id': np.int64
+    })
+
+
+def load_subscriptions(chunk_size=DEFAULT_CHUNK_SIZE):
+    """Carregar assinaturas em colunas NumPy (mês de início e mês de término)"""
+    # Assinaturas aguardando pagamento ou recusadas nunca chegaram a valer
+    stmt = select(
+        Subscription.id, Subscription.status, Subscription.start_date,
+        Subscription.end_date, Subscription.updated_at
+    ).where(Subscription.status.notin_(['pendente', 'recusado']))
+
+    chunks = {'start_month': [], 'end_month': []}
+    for rows in iter_chunks(stmt, Subscription.id, chunk_size):
+        _ids, statuses, starts, ends, updates = zip(*rows)
+        # Canceladas terminam na data do cancelamento; expiradas no fim do período
+        ended = [
+            updated if status == 'cancelado' else end if status == 'expirado' else None
+            for status, end, updated in zip(statuses, ends, updates)
+        ]
+        chunks['start_month'].append(to_months(starts))
+        chunks['end_month'].append(to_months(ended))
+
+    return concat_columns(chunks, {'start_month': np.int64, 'end_month': np.int64})
+
+
+def load_redemption_months(since, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Carregar o mês de cada retirada a partir de `since`"""
+    stmt = select(Redemption.id, Redemption.redeemed_at).where(Redemption.redeemed_at >= since)
+    chunks = [to_months([row[1] for row in rows]) for rows in iter_chunks(stmt, Redemption.id, chunk_size)]
+    return np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int64)
+
+
+def concat_columns(chunks, dtypes):
+    return {
+        name: np.concatenate(parts) if parts else np.empty(0, dtype=dtypes[name])
+        for name, parts in chunks.items()
+    }
+
+
+def mrr(payments, start, end):
+    """Receita mensal (pagamentos aprovados no mês) total, por plano e por método"""
+    n = end - start + 1
+    mask = (payments['month'] >= start) & (payments['month'] <= end)
+    month = payments['month'][mask] - start
+    amount = payments['amount'][mask]
+
+    total = np.bincount(month, weights=amount, minlength=n)
+
+    # IDs de plano são pequenos: mapeamento direto por tabela em vez de ordenar
+    plan_ids = payments['plan_id'][mask]
+    plans = np.flatnonzero(np.bincount(plan_ids)) if len(plan_ids) else plan_ids
+    lookup = np.zeros(plans[-1] + 1 if len(plans) else 1, dtype=np.int64)
+    lookup[plans] = np.arange(len(plans))
+    plan_idx = lookup[plan_ids]
+    by_plan = np.bincount(
+        month * len(plans) + plan_idx, weights=amount, minlength=n * len(plans)
+    ).reshape(n, len(plans))
+
+    n_methods = len(PAYMENT_METHODS)
+    by_method = np.bincount(
+        month * n_methods + payments['method'][mask], weights=amount, minlength=n * n_methods
+    ).reshape(n, n_methods)
+
+    return [{
+        'month': month_label(start + i),
+        'total': round(float(total[i]), 2),
+        'by_plan': {int(plan_id): round(float(by_plan[i, j]), 2) for j, plan_id in enumerate(plans)},
+        'by_method': {method: round(float(by_method[i, j]), 2) for j, method in enumerate(PAYMENT_METHODS)}
+    } for i in range(n)]
+
+
+def subscriber_counts(subscriptions, start, end):
+    """Ativos no início de cada mês, novos e encerrados (churn) em cada mês"""
+    months = np.arange(start, end + 1)
+    starts = np.sort(subscriptions['start_month'])
+    ends = np.sort(subscriptions['end_month'])
+
+    started_before = np.searchsorted(starts, months, side='left')
+    ended_before = np.searchsorted(ends, months, side='left')
+    active_at_start = started_before - ended_before
+    new = np.searchsorted(starts, months, side='right') - started_before
+    churned = np.searchsorted(ends, months, side='right') - ended_before
+
+    return active_at_start, new, churned
+
+
+def churn(subscriptions, start, end):
+    """Churn mensal: assinaturas encerradas no mês / ativas no início do mês"""
+    active_at_start, new, churned = subscriber_counts(subscriptions, start, end)
+    rate = np.divide(churned, active_at_start, out=np.zeros(len(churned)), where=active_at_start > 0)
+
+    return [{
+        'month': month_label(start + i),
+        'active_at_start': int(active_at_start[i]),
+        'new': int(new[i]),
+        'churned': int(churned[i]),
+        'churn_rate': round(float(rate[i]), 4)
+    } for i in range(len(rate))]
+
+
+def cohort_retention(payments, start, end, max_offset=12):
+    """Retenção por coorte: fração dos usuários de cada mês de entrada que pagou N meses depois"""
+    n = end - start + 1
+    # Pares únicos (usuário, mês) já ordenados por usuário e mês
+    valid = payments['month'] != NEVER
+    keys = np.sort(payments['user_id'][valid] * 10000 + payments['month'][valid])
+    keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+    users = keys // 10000
+    months = keys % 10000
+
+    # Primeiro mês de cada usuário, propagado para todas as linhas dele
+    first = np.empty(len(users), dtype=bool)
+    first[:1] = True
+    first[1:] = users[1:] != users[:-1]
+    cohort = months[first][np.cumsum(first) - 1]
+    offset = months - cohort
+
+    mask = (cohort >= start) & (cohort <= end) & (offset < max_offset)
+    matrix = np.bincount(
+        (cohort[mask] - start) * max_offset + offset[mask], minlength=n * max_offset
+    ).reshape(n, max_offset)
+    sizes = matrix[:, 0]
+    retention = np.divide(matrix, sizes[:, None], out=np.zeros(matrix.shape), where=sizes[:, None] > 0)
+
+    return [{
+        'cohort': month_label(start + i),
+        'size': int(sizes[i]),
+        'retention': [round(float(r), 4) for r in retention[i, :min(max_offset, n - i)]]
+    } for i in range(n)]
+
+
+def redemptions_per_subscriber(redemption_months, subscriptions, start, end):
+    """Média de retiradas por assinante ativo em cada mês"""
+    n = end - start + 1
+    mask = (redemption_months >= start) & (redemption_months <= end)
+    redemptions = np.bincount(redemption_months[mask] - start, minlength=n)
+
+    active_at_start, new, _churned = subscriber_counts(subscriptions, start, end)
+    active = active_at_start + new
+    average = np.divide(redemptions, active, out=np.zeros(n), where=active > 0)
+
+    return [{
+        'month': month_label(start + i),
+        'redemptions': int(redemptions[i]),
+        'active_subscribers': int(active[i]),
+        'average': round(float(average[i]), 2)
+    } for i in range(n)]
@@ -0,0 +1,381 @@
+import csv
+import io
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+
+import click
+from flask import current_app
+from sqlalchemy import insert, or_, select
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
+
+from src.admission import admission
+from src.models.user import db, User
+from src.reports import process_alive
+
+IMPORT_CHUNK_SIZE = 1000
+# Papéis permitidos na importação (administradores nunca são importados)
+IMPORT_ROLES = ('cliente', 'vendedor')
+# Senhas já em hash (exportadas de outro sistema) são gravadas como estão
+HASH_PREFIXES = ('scrypt:', 'pbkdf2:')
+# Campos de texto do registro (no NDJSON podem vir como número, lista...)
+TEXT_FIELDS = ('username', 'email', 'password', 'password_hash', 'role')
+
+
+def read_records(stream, fmt):
+    """Ler registros de um stream de texto CSV (com cabeçalho) ou NDJSON, um a um"""
+    if fmt == 'csv':
+        for row_number, record in enumerate(csv.DictReader(stream), start=1):
+            yield row_number, record
+    elif fmt == 'ndjson':
+        for row_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield row_number, record if isinstance(record, dict) else None
+    else:
+        raise ValueError(f'Formato desconhecido: {fmt}')
+
+
+def chunked(records, size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class UserImporter:
+    """Importação em lote de usuários: um IN por bloco, hashes em paralelo e insert em massa"""
+
+    def __init__(self, default_role='vendedor', chunk_size=IMPORT_CHUNK_SIZE, workers=None):
+        self.default_role = default_role
+        self.chunk_size = chunk_size
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.seen_usernames = set()
+        self.seen_emails = set()
+        self.created = 0
+        self.total = 0
+        self.errors = []
+
+    def run(self, records):
+        executor = ProcessPoolExecutor(self.workers) if self.workers > 1 else None
+        try:
+            for chunk in chunked(records, self.chunk_size):
+                self.import_chunk(chunk, executor)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return self.report()
+
+    def report(self):
+        errors = sorted(self.errors, key=lambda e: e['row'])
+        return {'total': self.total, 'created': self.created, 'failed': len(errors), 'errors': errors}
+
+    def validate(self, row_number, record):
+        """Normalizar o registro; devolve (dados, None) ou (None, mensagem de erro)"""
+        if record is None:
+            return None, 'Registro inválido'
+        for field in TEXT_FIELDS:
+            if record.get(field) is not None and not isinstance(record[field], str):
+                return None, f'Campo {field} deve ser texto'
+
+        username = (record.get('username') or '').strip()
+        email = (record.get('email') or '').strip()
+        password = record.get('password') or ''
+        password_hash = record.get('password_hash') or ''
+        role = (record.get('role') or self.default_role).strip()
+
+        if not username or not email:
+            return None, 'Campos username e email são obrigatórios'
+        if not password and not password_hash.startswith(HASH_PREFIXES):
+            return None, 'Campo password é obrigatório'
+        if role not in IMPORT_ROLES:
+            return None, f'Papel inválido: {role}'
+        if username in self.seen_usernames:
+            return None, 'Nome de usuário repetido no arquivo'
+        if email in self.seen_emails:
+            return None, 'Email repetido no arquivo'
+
+        self.seen_usernames.add(username)
+        self.seen_emails.add(email)
+        return {
+            'row': row_number,
+            'username': username,
+            'email': email,
+            'password': password_hash if password_hash.startswith(HASH_PREFIXES) else None,
+            'plain_password': password,
+            'role': role
+        }, None
+
+    def import_chunk(self, chunk, executor):
+        self.total += len(chunk)
+        candidates = []
+        for row_number, record in chunk:
+            data, error = self.validate(row_number, record)
+            if error:
+                self.errors.append({'row': row_number, 'error': error})
+            else:
+                candidates.append(data)
+        if not candidates:
+            return
+
+        # Uma única consulta de unicidade para o bloco inteiro
+        usernames = [c['username'] for c in candidates]
+        emails = [c['email'] for c in candidates]
+        existing = db.session.execute(
+            select(User.username, User.email).where(or_(User.username.in_(usernames), User.email.in_(emails)))
+        ).all()
+        taken_usernames = {row.username for row in existing}
+        taken_emails = {row.email for row in existing}
+
+        rows = []
+        for c in candidates:
+            if c['username'] in taken_usernames:
+                self.errors.append({'row': c['row'], 'error': 'Nome de usuário já existe'})
+            elif c['email'] in taken_emails:
+                self.errors.append({'row': c['row'], 'error': 'Email já está em uso'})
+            else:
+                rows.append(c)
+
+        # Hash das senhas em paralelo (é o passo mais caro da importação)
+        to_hash = [r for r in rows if r['password'] is None]
+        passwords = [r['plain_password'] for r in to_hash]
+        if executor is not None:
+            chunksize = max(1, len(passwords) // (self.workers * 4))
+            hashes = executor.map(generate_password_hash, passwords, chunksize=chunksize)
+        else:
+            hashes = map(generate_password_hash, passwords)
+        for r, hashed in zip(to_hash, hashes):
+            r['password'] = hashed
+
+        self.insert_rows(rows)
+
+    def insert_rows(self, rows):
+        if not rows:
+            return
+        values = [{'username': r['username'], 'email': r['email'], 'password': r['password'], 'role': r['role']}
+                  for r in rows]
+        try:
+            db.session.execute(insert(User), values)
+            db.session.commit()
+            self.created += len(rows)
+        except IntegrityError:
+            # Conflito com um cadastro concorrente: refazer linha a linha para isolar o erro
+            db.session.rollback()
+            for r, value in zip(rows, values):
+                try:
+                    db.session.execute(insert(User), [value])
+                    db.session.commit()
+                    self.created += 1
+                except IntegrityError:
+                    db.session.rollback()
+                    self.errors.append({'row': r['row'], 'error': 'Nome de usuário ou email já existe'})
+
+
+def import_users(stream, fmt, default_role='vendedor', chunk_size=IMPORT_CHUNK_SIZE, workers=None):
+    """Importar usuários de um stream CSV/NDJSON e devolver o relatório por linha"""
+    importer = UserImporter(default_role=default_role, chunk_size=chunk_size, workers=workers)
+    return importer.run(read_records(stream, fmt))
+
+
+class ImportJobs:
+    """Importações pela API executadas em segundo plano, fora da requisição.
+
+    O corpo enviado é gravado em `IMPORT_JOB_DIR` e importado por uma
+    thread do próprio worker, com o hash das senhas no processo (nada de
+    fork a partir de um servidor com threads). A situação de cada job fica
+    num arquivo JSON na mesma pasta, como os jobs de relatório, e pode ser
+    consultada em qualquer worker; só os `IMPORT_JOB_HISTORY` mais
+    recentes são mantidos.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.directory = None
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('IMPORT_JOB_DIR', os.path.join(app.instance_path, 'import_jobs'))
+        app.config.setdefault('IMPORT_JOB_HISTORY', 200)
+        app.config.setdefault('IMPORT_MAX_BYTES', 64 * 1024 * 1024)
+        self.app = app
+        self.directory = app.config['IMPORT_JOB_DIR']
+        app.extensions['import_jobs'] = self
+
+    def executor(self):
+        """Uma importação por vez em cada worker (criado sob demanda e de novo após um fork)"""
+        pid = os.getpid()
+        with self._lock:
+            if self._pid != pid:
+                self._executor = ThreadPoolExecutor(1, thread_name_prefix='import')
+                self._pid = pid
+            return self._executor
+
+    def submit(self, owner_id, stream, fmt, default_role='vendedor'):
+        """Gravar o arquivo enviado e enfileirar a importação; devolve o job pendente"""
+        job = {
+            'id': uuid.uuid4().hex,
+            'owner_id': owner_id,
+            'format': fmt,
+            'role': default_role,
+            'created_at': datetime.utcnow().isoformat(),
+            'status': 'pendente',
+            'report': None,
+            'error': None,
+            'host': socket.gethostname(),
+            'pid': os.getpid()
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        upload_path = self.upload_path(job['id'])
+        try:
+            with open(upload_path, 'wb') as f:
+                copied = 0
+                while True:
+                    block = stream.read(64 * 1024)
+                    if not block:
+                        break
+                    copied += len(block)
+                    if copied > self.app.config['IMPORT_MAX_BYTES']:
+                        raise ValueError('Arquivo maior que o limite de importação (IMPORT_MAX_BYTES)')
+                    f.write(block)
+        except BaseException:
+            os.unlink(upload_path)
+            raise
+
+        self._write(job)
+        self.executor().submit(self.run, job['id'])
+        self._prune()
+        return job
+
+    def run(self, job_id):
+        job = self._read(job_id)
+        if job is None:
+            return
+        upload_path = self.upload_path(job_id)
+        job.update(status='executando')
+        self._write(job)
+        try:
+            with self.app.app_context(), io.open(upload_path, encoding='utf-8', newline='') as stream:
+                # Conta no orçamento da faixa bulk, como os relatórios
+                report = admission.run_bulk(import_users, stream, job['format'],
+                                            default_role=job['role'], workers=1)
+            job.update(status='concluido', report=report)
+        except Exception as error:
+            job.update(status='falhou', error=str(error))
+        finally:
+            os.unlink(upload_path)
+        self._write(job)
+
+    def upload_path(self, job_id):
+        return os.path.join(self.directory, f'{job_id}.upload')
+
+    def path(self, job_id):
+        return os.path.join(self.directory, f'{job_id}.json')
+
+    def _read(self, job_id):
+        try:
+            with open(self.path(job_id)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write(self, job):
+        """Gravar a situação do job de forma atômica (quem lê nunca vê o arquivo pela metade)"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(job, f)
+            os.replace(tmp_path, self.path(job['id']))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _prune(self):
+        """Manter só os IMPORT_JOB_HISTORY jobs mais recentes"""
+        with os.scandir(self.directory) as it:
+            entries = [entry for entry in it if entry.name.endswith('.json')]
+        excess = len(entries) - self.app.config['IMPORT_JOB_HISTORY']
+        if excess <= 0:
+            return
+        oldest = sorted(entries, key=lambda entry: entry.stat().st_mtime)
+        for entry in oldest[:excess]:
+            try:
+                os.unlink(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def get(self, job_id):
+        """Job pelo id, lido do arquivo (qualquer worker responde)"""
+        if len(job_id) != 32 or not all(c in '0123456789abcdef' for c in job_id):
+            return None
+        job = self._read(job_id)
+        if job is None or job['status'] not in ('pendente', 'executando'):
+            return job
+        # O processo que executava a importação saiu (reinício, recarga) antes de concluir
+        if job['host'] == socket.gethostname() and not process_alive(job['pid']):
+            job.update(status='falhou', error='O servidor foi reiniciado antes de concluir a importação. '
+                                               'Linhas já gravadas aparecem como repetidas ao reenviar')
+        return job
+
+    @staticmethod
+    def serialize(job):
+        data = {
+            'job_id': job['id'],
+            'status': job['status'],
+            'format': job['format'],
+            'role': job['role'],
+            'created_at': job['created_at']
+        }
+        if job['status'] == 'concluido':
+            data['report'] = job['report']
+        elif job['status'] == 'falhou':
+            data['error'] = job['error']
+        return data
+
+    def wait(self, job, timeout=None):
+        """Aguardar a conclusão do job (útil em benchmarks e scripts)"""
+        deadline = time.monotonic() + timeout if timeout else None
+        while self.get(job['id'])['status'] in ('pendente', 'executando'):
+            if deadline and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+
+# Importações pela API (configuradas em main.py)
+import_jobs = ImportJobs()
+
+
+@click.command('import-users')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default=None,
+              help='Formato do arquivo (padrão: pela extensão)')
+@click.option('--role', default='vendedor', type=click.Choice(IMPORT_ROLES))
+@click.option('--chunk-size', default=IMPORT_CHUNK_SIZE, show_default=True)
+@click.option('--workers', default=None, type=int, help='Processos para o hash das senhas')
+def import_users_command(path, fmt, role, chunk_size, workers):
+    """Importar usuários/vendedores em lote de um arquivo CSV ou NDJSON"""
+    fmt = fmt or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+    workers = workers or current_app.config.get('IMPORT_HASH_WORKERS')
+    with io.open(path, encoding='utf-8', newline='') as stream:
+        report = import_users(stream, fmt, default_role=role, chunk_size=chunk_size, workers=workers)
+    click.echo(json.dumps(report, ensure_ascii=False, indent=2))
@@ -0,0 +1,77 @@
+import gzip
+import zlib
+
+from flask import current_app, request
+
+# Tipos comprimíveis; imagens PNG, arquivos já comprimidos e streams SSE ficam de fora
+DEFAULT_MIMETYPES = (
+    'application/json', 'text/html', 'text/css', 'text/plain', 'text/csv',
+    'application/javascript', 'application/x-ndjson', 'image/svg+xml'
+)
+
+
+class Compress:
+    """Compressão gzip das respostas da API, inclusive respostas em stream (geradores)"""
+
+    def __init__(self, app=None):
+        self.app = app
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+        app.config.setdefault('COMPRESS_LEVEL', 3)
+        app.config.setdefault('COMPRESS_MIMETYPES', DEFAULT_MIMETYPES)
+        app.after_request(self.after_request)
+
+    def should_compress(self, response, config):
+        if response.status_code < 200 or response.status_code in (204, 206, 304):
+            return False
+        if response.direct_passthrough or 'Content-Encoding' in response.headers:
+            return False
+        if response.mimetype not in config['COMPRESS_MIMETYPES']:
+            return False
+        if request.accept_encodings.quality('gzip') <= 0:
+            return False
+        if not response.is_streamed and (response.content_length or 0) < config['COMPRESS_MIN_SIZE']:
+            return False
+        return True
+
+    def after_request(self, response):
+        config = current_app.config
+        response.vary.add('Accept-Encoding')
+        if not self.should_compress(response, config):
+            return response
+
+        level = config['COMPRESS_LEVEL']
+        if response.is_streamed:
+            # Comprimir bloco a bloco, sem montar o corpo inteiro em memória
+            response.response = self.stream(response.response, level)
+            response.headers.pop('Content-Length', None)
+        else:
+            response.set_data(gzip.compress(response.get_data(), compresslevel=level, mtime=0))
+
+        response.headers['Content-Encoding'] = 'gzip'
+
+        # A versão comprimida tem outros bytes: o ETag forte deixa de valer
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+
+        return response
+
+    @staticmethod
+    def stream(chunks, level):
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                data = compressor.compress(chunk)
+                if data:
+                    yield data
+            yield compressor.flush()
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
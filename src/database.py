@@ -0,0 +1,131 @@
+import os
+import threading
+
+from sqlalchemy import event
+
+# Pragmas aplicados a cada conexão SQLite nova (nome → chave de configuração)
+SQLITE_PRAGMAS = (
+    ('journal_mode', 'SQLITE_JOURNAL_MODE'),
+    ('synchronous', 'SQLITE_SYNCHRONOUS'),
+    ('busy_timeout', 'SQLITE_BUSY_TIMEOUT'),
+    ('mmap_size', 'SQLITE_MMAP_SIZE'),
+    ('cache_size', 'SQLITE_CACHE_SIZE'),
+    ('temp_store', 'SQLITE_TEMP_STORE'),
+    ('foreign_keys', 'SQLITE_FOREIGN_KEYS'),
+)
+
+# Trava de escrita por engine SQLite em arquivo (ver begin_write)
+_write_locks = {}
+
+
+def database_uri_from_env(instance_path):
+    """URI do banco pelas variáveis de ambiente: DATABASE_URL, ou DB_BACKEND=sqlite|mysql (padrão mysql)"""
+    if os.getenv('DATABASE_URL'):
+        return os.getenv('DATABASE_URL')
+    if os.getenv('DB_BACKEND', 'mysql') == 'sqlite':
+        path = os.getenv('SQLITE_PATH', os.path.join(instance_path, 'clube_do_matte.db'))
+        return f'sqlite:///{path}'
+    return f"mysql+pymysql://{os.getenv('DB_USERNAME', 'root')}:{os.getenv('DB_PASSWORD', 'password')}@{os.getenv('DB_HOST', 'localhost')}:{os.getenv('DB_PORT', '3306')}/{os.getenv('DB_NAME', 'mydb')}"
+
+
+def is_sqlite_file(engine):
+    """SQLite em arquivo (em memória não tem WAL nem concorrência entre conexões)"""
+    return engine.dialect.name == 'sqlite' and engine.url.database not in (None, '', ':memory:')
+
+
+def begin_write(session):
+    """Abrir a transação de escrita do SQLite agora (BEGIN IMMEDIATE), antes das leituras que decidem a gravação.
+
+    Para ler e depois gravar com base no que leu (ex.: saldo do dia no
+    validate): sem a trava, duas requisições leem o mesmo saldo e as duas
+    gravam. A trava vai até o commit/rollback da sessão. Em outros bancos não
+    faz nada: quem chama precisa fazer as leituras que decidem a gravação
+    com `.with_for_update()` (leitura com trava, que no MySQL também vê o
+    último dado gravado em vez do snapshot da transação).
+    """
+    connection = session.connection()
+    write_lock = _write_locks.get(connection.engine)
+    if write_lock is None or connection.connection.driver_connection.in_transaction:
+        return
+    lock, timeout = write_lock
+    if lock.acquire(timeout=timeout):
+        connection.info['sqlite_write_lock'] = lock
+    try:
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+    except Exception:
+        _release_write_lock(connection)
+        raise
+
+
+def _release_write_lock(connection):
+    lock = connection.info.pop('sqlite_write_lock', None)
+    if lock is not None:
+        lock.release()
+
+
+class Database:
+    """Backend do banco configurável (MySQL ou SQLite) e ajuste do SQLite para um servidor só.
+
+    No SQLite em arquivo cada conexão nova recebe os pragmas (WAL, synchronous,
+    busy_timeout, mmap, cache). O driver sqlite3 continua abrindo a transação
+    só antes do primeiro INSERT/UPDATE/DELETE (leituras antes disso não prendem
+    um snapshot que impediria a gravação); `begin_write` emite BEGIN IMMEDIATE
+    para quem precisa ler e gravar sob a mesma trava. Com WAL, leitores não
+    esperam o escritor e as gravações (uma por vez) esperam até
+    `SQLITE_BUSY_TIMEOUT` ms pela trava; dentro do processo, as transações de
+    `begin_write` fazem fila numa trava do Python.
+    """
+
+    def __init__(self, app=None, db=None):
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        app.config.setdefault('SQLALCHEMY_DATABASE_URI', database_uri_from_env(app.instance_path))
+        app.config.setdefault('SQLITE_JOURNAL_MODE', 'WAL')
+        # NORMAL com WAL: não corrompe; uma queda de energia pode perder só as últimas transações
+        app.config.setdefault('SQLITE_SYNCHRONOUS', 'NORMAL')
+        app.config.setdefault('SQLITE_BUSY_TIMEOUT', 5000)
+        app.config.setdefault('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)
+        app.config.setdefault('SQLITE_CACHE_SIZE', -64000)
+        app.config.setdefault('SQLITE_TEMP_STORE', 'MEMORY')
+        app.config.setdefault('SQLITE_FOREIGN_KEYS', 'ON')
+
+        uri = app.config['SQLALCHEMY_DATABASE_URI']
+        if uri.startswith('sqlite:///') and uri != 'sqlite:///:memory:':
+            path = uri[len('sqlite:///'):].split('?', 1)[0]
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+            connect_args = options.setdefault('connect_args', {})
+            connect_args.setdefault('timeout', app.config['SQLITE_BUSY_TIMEOUT'] / 1000)
+            # Conexões do pool passam de uma thread para outra entre requisições
+            connect_args.setdefault('check_same_thread', False)
+
+        db.init_app(app)
+        app.extensions['database'] = self
+        with app.app_context():
+            for engine in db.engines.values():
+                if is_sqlite_file(engine):
+                    self.tune_sqlite(engine, app.config)
+
+    @staticmethod
+    def tune_sqlite(engine, config):
+        pragmas = [(name, config[key]) for name, key in SQLITE_PRAGMAS if config.get(key) is not None]
+
+        @event.listens_for(engine, 'connect')
+        def set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas:
+                cursor.execute(f'PRAGMA {name}={value}')
+            cursor.close()
+
+        # Escritores de begin_write no mesmo processo fazem fila nesta trava (acordam na
+        # hora) em vez de disputar a do SQLite, cujo busy handler espera com sleeps crescentes
+        _write_locks[engine] = (threading.Lock(), config['SQLITE_BUSY_TIMEOUT'] / 1000)
+        event.listen(engine, 'commit', _release_write_lock)
+        event.listen(engine, 'rollback', _release_write_lock)
+
+
+# Banco da aplicação (configurado em main.py)
+database = Database()
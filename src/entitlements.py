@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from src.models.user import db, Subscription, Plan
+
+# Direitos do assinante: assinatura ativa e quantidades diárias do plano
+Entitlement = namedtuple('Entitlement', 'subscription_id plan_id plan_name matte_quantity biscoito_quantity')
+
+
+class EntitlementCache:
+    """Cache por usuário da assinatura ativa + plano (uma consulta com join em caso de falta).
+
+    Entradas expiram após `ttl` segundos, o que limita a defasagem entre
+    processos; dentro do processo, assinar/cancelar/alterar plano invalida
+    explicitamente. Ausência de assinatura nunca é guardada.
+
+    A invalidação não chega aos outros workers: o cache só serve leituras
+    que toleram até `ttl` segundos de defasagem (exibir o QR code). O que
+    decide uma retirada usa load(), direto no banco.
+    """
+
+    def __init__(self, ttl=30, maxsize=100000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """Direitos do usuário, ou None se não houver assinatura ativa.
+
+        Se a assinatura existir mas o plano não, plan_name e as quantidades vêm como None.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                return entry[1]
+
+        entitlement = self.load(user_id)
+        if entitlement is None:
+            self.invalidate_user(user_id)
+        elif entitlement.plan_name is not None:
+            with self._lock:
+                self._entries[user_id] = (now + self.ttl, entitlement)
+                self._entries.move_to_end(user_id)
+                if len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return entitlement
+
+    @staticmethod
+    def load(user_id):
+        """Direitos atuais do usuário lidos do banco, sem passar pelo cache"""
+        row = db.session.query(
+            Subscription.id, Subscription.plan_id, Plan.name, Plan.matte_quantity, Plan.biscoito_quantity
+        ).outerjoin(Plan, Plan.id == Subscription.plan_id).filter(
+            Subscription.user_id == user_id,
+            Subscription.status == 'ativo'
+        ).first()
+        return Entitlement(*row) if row is not None else None
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def invalidate_users(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def invalidate_plan(self, plan_id):
+        """Descartar todos os usuários cujo direito em cache vem do plano informado"""
+        with self._lock:
+            stale = [user_id for user_id, (_, e) in self._entries.items() if e.plan_id == plan_id]
+            for user_id in stale:
+                del self._entries[user_id]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Cache do processo (usado no generate do QR code; o validate lê do banco)
+entitlements = EntitlementCache()
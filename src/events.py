@@ -0,0 +1,210 @@
+import logging
+import os
+import threading
+from collections import deque
+
+from sqlalchemy import func, select
+
+from src.models.user import db, Redemption
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """Fila limitada de um assinante; se encher, os eventos mais antigos são descartados"""
+
+    def __init__(self, broker, channel, maxsize):
+        self.broker = broker
+        self.channel = channel
+        self.events = deque(maxlen=maxsize)
+        self.lagged = False
+        self.closed = False
+        self._cond = threading.Condition()
+
+    def put(self, event):
+        with self._cond:
+            if len(self.events) == self.events.maxlen:
+                # Cliente lento: descarta o mais antigo e avisa para ressincronizar
+                self.lagged = True
+            self.events.append(event)
+            self._cond.notify()
+
+    def get(self, timeout):
+        """Próximo evento, ou None se nada chegar dentro do timeout"""
+        with self._cond:
+            if not self.events and not self.closed:
+                self._cond.wait(timeout)
+            if self.events:
+                return self.events.popleft()
+            return None
+
+    def take_lagged(self):
+        with self._cond:
+            lagged = self.lagged
+            self.lagged = False
+            return lagged
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+        self.broker.unsubscribe(self)
+
+
+class EventBroker:
+    """Pub/sub em memória do processo, por canal (ex: 'vendor:42'); não atravessa workers"""
+
+    def __init__(self, queue_size=100, max_subscribers=16):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        """Criar assinatura no canal; None se o canal já tem assinantes demais"""
+        with self._lock:
+            subscribers = self._channels.setdefault(channel, [])
+            if len(subscribers) >= self.max_subscribers:
+                return None
+            subscription = Subscription(self, channel, self.queue_size)
+            # Lista nova a cada alteração: publish() itera sem precisar do lock
+            self._channels[channel] = subscribers + [subscription]
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel, [])
+            remaining = [s for s in subscribers if s is not subscription]
+            if remaining:
+                self._channels[subscription.channel] = remaining
+            else:
+                self._channels.pop(subscription.channel, None)
+
+    def publish(self, channel, event):
+        """Entregar o evento aos assinantes do canal; retorna quantos receberam"""
+        subscribers = self._channels.get(channel)
+        if not subscribers:
+            return 0
+        for subscription in subscribers:
+            subscription.put(event)
+        return len(subscribers)
+
+    def subscriber_count(self, channel):
+        return len(self._channels.get(channel, ()))
+
+    def has_subscribers(self):
+        return bool(self._channels)
+
+
+class StreamSlots:
+    """Contador de streams abertos no processo (cada um prende uma thread do worker)"""
+
+    def __init__(self):
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, limit):
+        """Reservar uma vaga; False se o processo já tem `limit` streams abertos"""
+        with self._lock:
+            if self._count >= limit:
+                return False
+            self._count += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._count -= 1
+
+
+class RedemptionFeed:
+    """Publica no broker do processo as retiradas gravadas por qualquer worker, em ordem de id.
+
+    Uma thread por processo, só enquanto houver streams abertos: a cada
+    `VENDOR_STREAM_POLL` segundos (ou na hora, quando uma retirada deste
+    processo chama notify()) compara o maior id de retirada com o último
+    publicado e, se mudou, lê só as novas. O custo no banco é uma consulta
+    pela chave primária por worker e por intervalo, independente do número
+    de dashboards abertos.
+    """
+
+    def __init__(self, broker, batch_size=1000):
+        self.broker = broker
+        self.batch_size = batch_size
+        self.app = None
+        self.last_id = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pid = None
+
+    def watch(self, app):
+        """Garantir a thread e o ponto de partida; chamar depois de assinar e antes de ler os totais"""
+        self.app = app
+        pid = os.getpid()
+        with self._lock:
+            if self._pid != pid:
+                self.last_id = None
+                threading.Thread(target=self.run, name='redemption-feed', daemon=True).start()
+                self._pid = pid
+            if self.last_id is None:
+                # Retiradas até aqui já entram no snapshot do stream; as seguintes vêm pelo broker
+                self.last_id = self.max_id()
+
+    def notify(self):
+        """Retirada gravada neste processo: publicar sem esperar o próximo intervalo"""
+        if self._pid == os.getpid():
+            self._wakeup.set()
+
+    @staticmethod
+    def max_id():
+        return db.session.execute(select(func.max(Redemption.id))).scalar() or 0
+
+    def run(self):
+        while True:
+            self._wakeup.wait(self.app.config.get('VENDOR_STREAM_POLL', 1))
+            self._wakeup.clear()
+            try:
+                with self.app.app_context():
+                    self.poll()
+            except Exception:
+                logger.exception('Falha ao ler as retiradas para os dashboards')
+
+    def poll(self):
+        with self._lock:
+            if not self.broker.has_subscribers():
+                # Ninguém ouvindo: o próximo stream recomeça do maior id atual
+                self.last_id = None
+                return
+            if self.last_id is None or self.max_id() <= self.last_id:
+                return
+            while True:
+                rows = db.session.execute(
+                    select(Redemption.id, Redemption.vendor_id, Redemption.redeemed_at,
+                           Redemption.matte_quantity, Redemption.biscoito_quantity)
+                    .where(Redemption.id > self.last_id).order_by(Redemption.id).limit(self.batch_size)
+                ).all()
+                for row in rows:
+                    self.broker.publish(vendor_channel(row.vendor_id), {
+                        'redemption_id': row.id,
+                        'date': row.redeemed_at.date(),
+                        'redeemed_at': row.redeemed_at,
+                        'matte': row.matte_quantity,
+                        'biscoito': row.biscoito_quantity
+                    })
+                if rows:
+                    self.last_id = rows[-1].id
+                if len(rows) < self.batch_size:
+                    return
+
+
+# Eventos do dashboard dos vendedores no processo
+dashboard_events = EventBroker()
+
+# Retiradas de todos os workers entregues ao broker (acordado pelo validate_qrcode)
+redemption_feed = RedemptionFeed(dashboard_events)
+
+# Streams SSE abertos neste processo
+stream_slots = StreamSlots()
+
+
+def vendor_channel(vendor_id):
+    return f'vendor:{vendor_id}'
@@ -0,0 +1,171 @@
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from sqlalchemy import select
+
+from src.analytics import iter_chunks, DEFAULT_CHUNK_SIZE
+from src.models.user import Redemption
+
+HOURS_PER_WEEK = 7 * 24
+# Métricas acumuladas em cada faixa de hora
+METRICS = ('redemptions', 'matte', 'biscoito')
+WEEKDAYS = ('segunda', 'terca', 'quarta', 'quinta', 'sexta', 'sabado', 'domingo')
+
+
+def week_number(day):
+    """Semanas (começando na segunda-feira) desde 0001-01-01"""
+    return (day.toordinal() - 1) // 7
+
+
+class DemandForecaster:
+    """Histogramas vendedor x semana x (dia da semana, hora) mantidos incrementalmente.
+
+    Guarda as últimas `weeks` semanas completas mais a semana corrente; a
+    previsão da próxima semana é a média exponencial de cada faixa de hora
+    nas semanas anteriores (suavização sazonal simples).
+    """
+
+    def __init__(self, weeks=8, alpha=0.4, refresh_interval=60):
+        self.weeks = weeks
+        self.alpha = alpha
+        self.refresh_interval = refresh_interval
+        self.vendor_ids = np.empty(0, dtype=np.int64)
+        self.counts = np.zeros((0, weeks + 1, HOURS_PER_WEEK, len(METRICS)))
+        self.current_week = None
+        self.last_redemption_id = 0
+        self.refreshed_at = 0.0
+        self._lock = threading.Lock()
+
+    def window_start(self):
+        """Primeira semana guardada no histograma"""
+        return self.current_week - self.weeks
+
+    def advance_to(self, week):
+        """Deslizar a janela até a semana informada, descartando semanas antigas"""
+        if self.current_week is None:
+            self.current_week = week
+            return
+        shift = week - self.current_week
+        if shift <= 0:
+            return
+        if shift > self.weeks:
+            self.counts[:] = 0
+        else:
+            self.counts = np.roll(self.counts, -shift, axis=1)
+            self.counts[:, -shift:] = 0
+        self.current_week = week
+
+    def vendor_index(self, vendor_ids):
+        """Índice de cada vendedor no histograma, incluindo vendedores novos"""
+        new_ids = np.setdiff1d(vendor_ids, self.vendor_ids)
+        if len(new_ids):
+            merged = np.union1d(self.vendor_ids, new_ids)
+            counts = np.zeros((len(merged),) + self.counts.shape[1:])
+            counts[np.searchsorted(merged, self.vendor_ids)] = self.counts
+            self.vendor_ids, self.counts = merged, counts
+        return np.searchsorted(self.vendor_ids, vendor_ids)
+
+    def add(self, vendor_ids, ordinals, hours, matte, biscoito):
+        """Somar um bloco de retiradas (colunas NumPy) ao histograma"""
+        weeks = (ordinals - 1) // 7
+        keep = (weeks >= self.window_start()) & (weeks <= self.current_week)
+        if not keep.all():
+            vendor_ids, ordinals, hours, matte, biscoito, weeks = (
+                column[keep] for column in (vendor_ids, ordinals, hours, matte, biscoito, weeks)
+            )
+        if not len(vendor_ids):
+            return
+
+        vendor_idx = self.vendor_index(vendor_ids)
+        week_idx = weeks - self.window_start()
+        slot = ((ordinals - 1) % 7) * 24 + hours
+        flat = (vendor_idx * (self.weeks + 1) + week_idx) * HOURS_PER_WEEK + slot
+
+        size = self.counts.shape[0] * (self.weeks + 1) * HOURS_PER_WEEK
+        view = self.counts.reshape(size, len(METRICS))
+        view[:, 0] += np.bincount(flat, minlength=size)
+        view[:, 1] += np.bincount(flat, weights=matte, minlength=size)
+        view[:, 2] += np.bincount(flat, weights=biscoito, minlength=size)
+
+    def refresh(self, now=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Carregar apenas as retiradas novas (id maior que o último visto)"""
+        now = now or datetime.utcnow()
+        with self._lock:
+            self.advance_to(week_number(now.date()))
+            since = datetime.combine(date.fromordinal(self.window_start() * 7 + 1), datetime.min.time())
+
+            stmt = select(
+                Redemption.id, Redemption.vendor_id, Redemption.redeemed_at,
+                Redemption.matte_quantity, Redemption.biscoito_quantity
+            ).where(Redemption.redeemed_at >= since)
+
+            for rows in iter_chunks(stmt, Redemption.id, chunk_size, after_id=self.last_redemption_id):
+                ids, vendor_ids, redeemed, matte, biscoito = zip(*rows)
+                self.add(
+                    np.array(vendor_ids, dtype=np.int64),
+                    np.fromiter((d.toordinal() for d in redeemed), dtype=np.int64, count=len(redeemed)),
+                    np.fromiter((d.hour for d in redeemed), dtype=np.int64, count=len(redeemed)),
+                    np.array(matte, dtype=np.float64),
+                    np.array(biscoito, dtype=np.float64)
+                )
+                self.last_redemption_id = max(self.last_redemption_id, ids[-1])
+
+            self.refreshed_at = time.monotonic()
+
+    def refresh_if_stale(self):
+        if time.monotonic() - self.refreshed_at >= self.refresh_interval:
+            self.refresh()
+
+    def forecast(self):
+        """Demanda esperada na próxima semana: array vendedor x hora da semana x métrica"""
+        with self._lock:
+            history = self.counts[:, :self.weeks]
+            # Peso maior para as semanas mais recentes
+            weights = self.alpha * (1 - self.alpha) ** np.arange(self.weeks)[::-1]
+            weights /= weights.sum()
+            return self.vendor_ids.copy(), np.tensordot(history, weights, axes=([1], [0]))
+
+    def report(self, vendor_id=None, hourly=False):
+        """Previsão da próxima semana por vendedor, por dia e (opcionalmente) por hora"""
+        vendor_ids, expected = self.forecast()
+        next_monday = date.fromordinal((self.current_week + 1) * 7 + 1)
+
+        if vendor_id is not None:
+            selected = np.flatnonzero(vendor_ids == vendor_id)
+        else:
+            selected = range(len(vendor_ids))
+
+        result = []
+        for i in selected:
+            by_day = expected[i].reshape(7, 24, len(METRICS))
+            days = []
+            for d in range(7):
+                day_totals = by_day[d].sum(axis=0)
+                day = {
+                    'date': next_monday + timedelta(days=d),
+                    'weekday': WEEKDAYS[d],
+                    'peak_hour': int(by_day[d, :, 0].argmax()),
+                    **{metric: round(float(day_totals[m]), 1) for m, metric in enumerate(METRICS)}
+                }
+                if hourly:
+                    day['hours'] = [
+                        {metric: round(float(by_day[d, h, m]), 2) for m, metric in enumerate(METRICS)}
+                        for h in range(24)
+                    ]
+                days.append(day)
+
+            totals = expected[i].sum(axis=0)
+            result.append({
+                'vendor_id': int(vendor_ids[i]),
+                'week_start': next_monday,
+                'total': {metric: round(float(totals[m]), 1) for m, metric in enumerate(METRICS)},
+                'by_day': days
+            })
+
+        return result
+
+
+# Previsão compartilhada pelo processo, atualizada de forma incremental
+demand_forecaster = DemandForecaster()
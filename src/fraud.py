@@ -0,0 +1,97 @@
+import json
+import threading
+from collections import OrderedDict, deque
+
+from src.models.user import db, FraudAlert
+
+
+class RedemptionAnomalyDetector:
+    """Detector em stream de QR codes compartilhados e rajadas de leituras por vendedor.
+
+    O estado é compacto e limitado: por código, as últimas `code_history`
+    retiradas (em um LRU de até `max_codes` códigos); por vendedor, os
+    horários das leituras dentro da janela de rajada.
+    """
+
+    def __init__(self, multi_vendor_window=600, burst_window=60, burst_threshold=20,
+                 burst_cooldown=300, code_history=8, max_codes=100000, max_vendors=10000):
+        self.multi_vendor_window = multi_vendor_window
+        self.burst_window = burst_window
+        self.burst_threshold = burst_threshold
+        self.burst_cooldown = burst_cooldown
+        self.code_history = code_history
+        self.max_codes = max_codes
+        self.max_vendors = max_vendors
+        self._codes = OrderedDict()
+        self._vendors = OrderedDict()
+        self._burst_alerted_at = {}
+        self._lock = threading.Lock()
+
+    def _touch(self, table, key, maxlen, limit):
+        history = table.get(key)
+        if history is None:
+            history = table[key] = deque(maxlen=maxlen)
+            if len(table) > limit:
+                evicted, _ = table.popitem(last=False)
+                # Só a tabela de vendedores tem cooldown de alerta (ids de QR code e de vendedor se cruzam)
+                if table is self._vendors:
+                    self._burst_alerted_at.pop(evicted, None)
+        else:
+            table.move_to_end(key)
+        return history
+
+    def observe(self, qr_code_id, vendor_id, redeemed_at):
+        """Registrar uma retirada confirmada e devolver os alertas gerados (lista de dicts)"""
+        ts = redeemed_at.timestamp()
+        alerts = []
+
+        with self._lock:
+            # Mesmo código em outro vendedor dentro da janela
+            history = self._touch(self._codes, qr_code_id, self.code_history, self.max_codes)
+            other_vendors = sorted({
+                v for t, v in history if v != vendor_id and ts - t <= self.multi_vendor_window
+            })
+            if other_vendors:
+                alerts.append({
+                    'kind': 'multi_vendor',
+                    'qr_code_id': qr_code_id,
+                    'vendor_id': vendor_id,
+                    'details': {'other_vendors': other_vendors, 'window_seconds': self.multi_vendor_window}
+                })
+            history.append((ts, vendor_id))
+
+            # Rajada de leituras no mesmo vendedor
+            scans = self._touch(self._vendors, vendor_id, self.burst_threshold + 1, self.max_vendors)
+            scans.append(ts)
+            if len(scans) > self.burst_threshold and ts - scans[0] <= self.burst_window:
+                last_alert = self._burst_alerted_at.get(vendor_id)
+                if last_alert is None or ts - last_alert >= self.burst_cooldown:
+                    self._burst_alerted_at[vendor_id] = ts
+                    alerts.append({
+                        'kind': 'vendor_burst',
+                        'qr_code_id': qr_code_id,
+                        'vendor_id': vendor_id,
+                        'details': {'scans': len(scans), 'window_seconds': self.burst_window}
+                    })
+
+        return alerts
+
+    def record(self, redemption):
+        """Analisar uma retirada já gravada e adicionar os alertas (fraud_alerts) à sessão; o commit fica com quem chamou"""
+        alerts = self.observe(redemption.qr_code_id, redemption.vendor_id, redemption.redeemed_at)
+        if not alerts:
+            return []
+
+        rows = [FraudAlert(
+            kind=alert['kind'],
+            qr_code_id=alert['qr_code_id'],
+            vendor_id=alert['vendor_id'],
+            redemption_id=redemption.id,
+            details=json.dumps(alert['details'])
+        ) for alert in alerts]
+        db.session.add_all(rows)
+        return rows
+
+
+# Detector compartilhado pelo processo (alimentado pelo validate_qrcode)
+redemption_detector = RedemptionAnomalyDetector()
@@ -0,0 +1,66 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask.json.provider import DefaultJSONProvider
+
+from src.tracing import span
+
+# Backend rápido opcional: usa orjson quando instalado, senão o json da biblioteca padrão
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende do ambiente
+    orjson = None
+
+
+def _default(obj):
+    """Converter tipos não nativos do JSON (datas em ISO 8601, como o resto da API)"""
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f'Objeto do tipo {type(obj).__name__} não é serializável em JSON')
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Provider JSON da aplicação: datas nativas e orjson quando disponível"""
+
+    default = staticmethod(_default)
+    ensure_ascii = False
+
+    def __init__(self, app, backend=None):
+        super().__init__(app)
+        if backend is None:
+            backend = 'orjson' if orjson is not None else 'json'
+        if backend == 'orjson' and orjson is None:
+            backend = 'json'
+        self.backend = backend
+
+    def _orjson_options(self, indent=False):
+        options = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        if self.backend == 'orjson' and not kwargs:
+            return orjson.dumps(obj, default=self.default, option=self._orjson_options()).decode()
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if self.backend == 'orjson' and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        with span('json.encode', backend=self.backend):
+            if self.backend != 'orjson':
+                return super().response(*args, **kwargs)
+
+            obj = self._prepare_response_obj(args, kwargs)
+            indent = (self.compact is None and self._app.debug) or self.compact is False
+            body = orjson.dumps(obj, default=self.default, option=self._orjson_options(indent)) + b'\n'
+            return self._app.response_class(body, mimetype=self.mimetype)
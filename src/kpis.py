@@ -0,0 +1,217 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from sqlalchemy import bindparam, func, select, text, update
+
+from src.database import begin_write
+from src.models.user import db, KPICounter, Payment, Plan, Redemption, Subscription
+
+logger = logging.getLogger(__name__)
+
+# Contador com o instante (epoch) da última conciliação
+RECONCILED_AT = 'conciliacao'
+
+
+def active_key(plan_id):
+    return f'ativos:{plan_id}'
+
+
+def day_keys(day):
+    """Contadores do dia (UTC, como redeemed_at): retiradas, mattes e biscoitos servidos"""
+    label = day.isoformat()
+    return f'retiradas:{label}', f'matte:{label}', f'biscoito:{label}'
+
+
+def revenue_key(moment):
+    return f'receita:{moment:%Y-%m}'
+
+
+def month_bounds(moment):
+    start = datetime(moment.year, moment.month, 1)
+    return start, (start + timedelta(days=32)).replace(day=1)
+
+
+def redemption_deltas(redemption):
+    """Deltas de uma retirada nova nos contadores do dia em que foi feita"""
+    redemptions, matte, biscoito = day_keys((redemption.redeemed_at or datetime.utcnow()).date())
+    return {redemptions: 1, matte: redemption.matte_quantity or 0, biscoito: redemption.biscoito_quantity or 0}
+
+
+@lru_cache(maxsize=None)
+def upsert_statement(dialect, increment):
+    """INSERT que soma (ou grava) no contador existente; texto fixo por banco.
+
+    O insert().on_conflict_do_update() do SQLAlchemy não entra no cache de
+    compilação e seria recompilado a cada retirada.
+    """
+    insert = 'INSERT INTO kpi_counters (name, value, updated_at) VALUES (:name, :value, :updated_at)'
+    if dialect == 'sqlite':
+        value = 'kpi_counters.value + excluded.value' if increment else 'excluded.value'
+        sql = f'{insert} ON CONFLICT (name) DO UPDATE SET value = {value}, updated_at = excluded.updated_at'
+    elif dialect in ('mysql', 'mariadb'):
+        value = 'value + VALUES(value)' if increment else 'VALUES(value)'
+        sql = f'{insert} ON DUPLICATE KEY UPDATE value = {value}, updated_at = VALUES(updated_at)'
+    else:
+        return None
+    return text(sql).bindparams(bindparam('updated_at', type_=db.DateTime))
+
+
+def upsert(values, increment=True):
+    """Somar (ou gravar, increment=False) valores nos contadores, criando os que não existem.
+
+    Na transação da sessão (quem chama faz o commit): o contador muda junto
+    com a gravação que o motivou. As chaves vão em ordem para que transações
+    concorrentes travem as linhas na mesma ordem.
+    """
+    now = datetime.utcnow()
+    rows = [{'name': name, 'value': value, 'updated_at': now} for name, value in sorted(values.items())]
+    if not rows:
+        return
+    stmt = upsert_statement(db.session.get_bind().dialect.name, increment)
+    if stmt is not None:
+        db.session.execute(stmt, rows)
+        return
+
+    table = KPICounter.__table__
+    for row in rows:
+        value = table.c.value + row['value'] if increment else row['value']
+        result = db.session.execute(
+            update(table).where(table.c.name == row['name']).values(value=value, updated_at=now)
+        )
+        if result.rowcount == 0:
+            db.session.execute(table.insert().values(row))
+
+
+class KPIStore:
+    """Indicadores globais do painel do admin, mantidos por delta nas gravações.
+
+    Assinaturas ativas por plano, retiradas e produtos servidos no dia e
+    receita do mês ficam numa tabela de contadores que todas as instâncias do
+    servidor compartilham; cada gravação (retirada, cancelamento, aprovação
+    de pagamento, migração de plano) soma seu delta na mesma transação e o
+    painel lê só algumas linhas pela chave. Uma thread recalcula os contadores
+    a partir das tabelas de origem a cada `KPI_RECONCILE_INTERVAL` segundos,
+    corrigindo o que escapou dos deltas (gravações fora da aplicação, massa
+    sintética, corridas no MySQL).
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('KPI_RECONCILE_INTERVAL', 300)
+        self.app = app
+        app.extensions['kpis'] = self
+
+    def add(self, deltas):
+        """Somar deltas ({contador: valor}) na transação atual"""
+        upsert({name: value for name, value in deltas.items() if value})
+        self.ensure_thread()
+
+    def ensure_thread(self):
+        """Thread de conciliação criada sob demanda (e de novo após um fork do servidor)"""
+        pid = os.getpid()
+        if self._pid == pid or self.app is None or not self.app.config['KPI_RECONCILE_INTERVAL']:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._thread = threading.Thread(target=self.run, name='kpi-reconciler', daemon=True)
+            self._thread.start()
+            self._pid = pid
+
+    def run(self):
+        interval = self.app.config['KPI_RECONCILE_INTERVAL']
+        while True:
+            time.sleep(interval)
+            try:
+                with self.app.app_context():
+                    # Com vários workers, só quem encontrar a última conciliação vencida refaz
+                    if time.time() - (self.reconciled_at() or 0) >= interval * 0.9:
+                        self.reconcile()
+            except Exception:
+                logger.exception('Falha ao conciliar os indicadores')
+
+    @staticmethod
+    def reconciled_at():
+        return db.session.execute(
+            select(KPICounter.value).where(KPICounter.name == RECONCILED_AT)
+        ).scalar()
+
+    def reconcile(self, now=None):
+        """Recalcular os contadores atuais a partir das tabelas de origem; devolve os que estavam errados"""
+        now = now or datetime.utcnow()
+        today = datetime.combine(now.date(), datetime.min.time())
+        month_start, month_end = month_bounds(now)
+
+        # No SQLite a trava de escrita vem antes das leituras: nenhum delta se perde no meio
+        begin_write(db.session)
+        actual = {active_key(plan_id): 0 for plan_id in db.session.execute(select(Plan.id)).scalars()}
+        actual.update({active_key(plan_id): count for plan_id, count in db.session.execute(
+            select(Subscription.plan_id, func.count(Subscription.id))
+            .where(Subscription.status == 'ativo').group_by(Subscription.plan_id)
+        )})
+        redemptions, matte, biscoito = db.session.execute(
+            select(func.count(Redemption.id), func.coalesce(func.sum(Redemption.matte_quantity), 0),
+                   func.coalesce(func.sum(Redemption.biscoito_quantity), 0))
+            .where(Redemption.redeemed_at >= today, Redemption.redeemed_at < today + timedelta(days=1))
+        ).one()
+        actual.update(zip(day_keys(now.date()), (redemptions, matte, biscoito)))
+        actual[revenue_key(now)] = db.session.execute(
+            select(func.coalesce(func.sum(Payment.amount), 0))
+            .where(Payment.status == 'aprovado', Payment.created_at >= month_start, Payment.created_at < month_end)
+        ).scalar()
+
+        stored = dict(db.session.execute(
+            select(KPICounter.name, KPICounter.value).where(KPICounter.name.in_(list(actual)))
+        ).all())
+        drift = {name: {'counter': stored.get(name, 0), 'actual': value}
+                 for name, value in actual.items() if abs(stored.get(name, 0) - value) > 1e-6}
+        upsert({**actual, RECONCILED_AT: time.time()}, increment=False)
+        db.session.commit()
+        if drift:
+            logger.info('Indicadores corrigidos na conciliação: %s', drift)
+        return drift
+
+    def overview(self, now=None):
+        """Painel do admin: lê só os contadores do dia, do mês e de cada plano (não varre as tabelas)"""
+        self.ensure_thread()
+        now = now or datetime.utcnow()
+        plans = db.session.execute(select(Plan.id, Plan.name).order_by(Plan.id)).all()
+        redemptions, matte, biscoito = day_keys(now.date())
+        revenue = revenue_key(now)
+        names = [active_key(plan.id) for plan in plans] + [redemptions, matte, biscoito, revenue, RECONCILED_AT]
+        query = select(KPICounter.name, KPICounter.value).where(KPICounter.name.in_(names))
+        values = dict(db.session.execute(query).all())
+        if RECONCILED_AT not in values:
+            # Banco que nunca foi conciliado (ex.: recém-populado): contadores ainda vazios
+            self.reconcile(now)
+            values = dict(db.session.execute(query).all())
+
+        by_plan = [{'plan_id': plan.id, 'plan_name': plan.name, 'active': int(values.get(active_key(plan.id), 0))}
+                   for plan in plans]
+        reconciled_at = values.get(RECONCILED_AT)
+        return {
+            'active_subscriptions': {'total': sum(p['active'] for p in by_plan), 'by_plan': by_plan},
+            'today': {
+                'date': now.date(),
+                'redemptions': int(values.get(redemptions, 0)),
+                'matte_served': int(values.get(matte, 0)),
+                'biscoito_served': int(values.get(biscoito, 0))
+            },
+            'month': {'month': f'{now:%Y-%m}', 'revenue': round(values.get(revenue, 0), 2)},
+            'reconciled_at': datetime.utcfromtimestamp(reconciled_at) if reconciled_at else None
+        }
+
+
+# Indicadores da aplicação (configurado em main.py)
+kpis = KPIStore()
@@ -4,32 +4,96 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from flask import Flask, send_from_directory, session
+from werkzeug.middleware.proxy_fix import ProxyFix
 from src.models.user import db
+from src.database import database
 from src.routes.auth import auth_bp
 from src.routes.subscription import subscription_bp
 from src.routes.qrcode import qrcode_bp
 from src.routes.vendor import vendor_bp
 from src.routes.admin import admin_bp
+from src.routes.user import user_bp
+from src.static_assets import StaticManifest
+from src.json_provider import JSONProvider
+from src.compression import Compress
+from src.admission import admission
+from src.rate_limit import rate_limiter
+from src.tracing import tracer
+from src.profiler import profiler
+from src.bulk_import import import_jobs, import_users_command
+from src.seed import seed_command
+from src.payments import payment_queue
+from src.reports import report_jobs
+from src.kpis import kpis
 import datetime
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
 app.config['PERMANENT_SESSION_LIFETIME'] = datetime.timedelta(days=7)
 
+# Proxies reversos confiáveis à frente do servidor (0: clientes conectam direto). Com N,
+# remote_addr e o esquema vêm do X-Forwarded-For/-Proto do N-ésimo proxy, e o limite
+# de taxa por IP enxerga o cliente, não o proxy
+app.config['PROXY_TRUSTED_HOPS'] = int(os.getenv('PROXY_TRUSTED_HOPS', '0'))
+if app.config['PROXY_TRUSTED_HOPS']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_TRUSTED_HOPS'],
+                            x_proto=app.config['PROXY_TRUSTED_HOPS'])
+
+# Serialização JSON (orjson quando instalado; JSON_BACKEND=json força a biblioteca padrão)
+app.json = JSONProvider(app, backend=os.getenv('JSON_BACKEND'))
+
+# Compressão gzip das respostas grandes (relatórios, históricos)
+Compress(app)
+
+# Spans por fase de uma amostra das requisições (TRACING_SAMPLE_RATE; 0 desliga)
+app.config['TRACING_SAMPLE_RATE'] = float(os.getenv('TRACING_SAMPLE_RATE', '0'))
+tracer.init_app(app)
+
+# Limite de taxa por IP/usuário/vendedor (logo após o tracer: recusas não custam hash nem banco).
+# Baldes em memória: os limites valem por worker do servidor
+rate_limiter.init_app(app)
+
+# Faixas de prioridade: atendimento no balcão nunca espera por relatórios
+admission.init_app(app)
+
+# Profiler por amostragem sob demanda (ligado por endpoint em /api/admin/profiler)
+profiler.init_app(app)
+
 # Registrar blueprints
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(subscription_bp, url_prefix='/api/subscription')
 app.register_blueprint(qrcode_bp, url_prefix='/api/qrcode')
 app.register_blueprint(vendor_bp, url_prefix='/api/vendor')
 app.register_blueprint(admin_bp, url_prefix='/api/admin')
+app.register_blueprint(user_bp, url_prefix='/api/admin')
+
+# Comandos de linha de comando (flask --app src.main <comando>)
+app.cli.add_command(import_users_command)
+app.cli.add_command(seed_command)
 
-# Habilitar banco de dados
-app.config['SQLALCHEMY_DATABASE_URI'] = f"mysql+pymysql://{os.getenv('DB_USERNAME', 'root')}:{os.getenv('DB_PASSWORD', 'password')}@{os.getenv('DB_HOST', 'localhost')}:{os.getenv('DB_PORT', '3306')}/{os.getenv('DB_NAME', 'mydb')}"
+# Habilitar banco de dados (MySQL por padrão; DATABASE_URL ou DB_BACKEND=sqlite para um servidor só)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
+database.init_app(app, db)
+
+# Fila de pagamentos; o gateway precisa ser configurado (PAYMENT_GATEWAY=fake só em desenvolvimento)
+app.config['PAYMENT_GATEWAY'] = os.getenv('PAYMENT_GATEWAY')
+payment_queue.init_app(app)
+
+# Jobs de relatório em segundo plano, com resultados em cache no disco
+report_jobs.init_app(app)
+
+# Importações de usuários pela API, em segundo plano
+import_jobs.init_app(app)
+
+# Indicadores do painel do admin mantidos por delta, conciliados periodicamente
+kpis.init_app(app)
+
 with app.app_context():
     db.create_all()
 
+# Manifesto dos arquivos estáticos (lido uma vez, com hashes e versões gzip em memória)
+static_manifest = StaticManifest(app.static_folder)
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
@@ -37,15 +101,13 @@ def serve(path):
     if static_folder_path is None:
             return "Static folder not configured", 404
 
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
-        else:
-            return "index.html not found", 404
+    asset = static_manifest.lookup(path)
+    if asset is None:
+        return "index.html not found", 404
+
+    return static_manifest.response(asset)
 
 
+# Servidor de desenvolvimento; em produção: python -m src.server (gunicorn com preload e aquecimento)
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
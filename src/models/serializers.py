@@ -0,0 +1,81 @@
+import json
+
+# Funções de serialização dos modelos para as respostas da API.
+# Datas são devolvidas como datetime/date: o provider JSON da aplicação
+# (src/json_provider.py) as converte para ISO 8601.
+
+
+def serialize_user(user):
+    """Dados públicos de um usuário"""
+    return {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'role': user.role,
+        'created_at': user.created_at
+    }
+
+
+def serialize_plan(plan):
+    """Dados de um plano"""
+    return {
+        'id': plan.id,
+        'name': plan.name,
+        'description': plan.description,
+        'price': plan.price,
+        'matte_quantity': plan.matte_quantity,
+        'biscoito_quantity': plan.biscoito_quantity
+    }
+
+
+def serialize_subscription(subscription, plan):
+    """Dados da assinatura junto com as quantidades do plano"""
+    return {
+        'id': subscription.id,
+        'plan_name': plan.name,
+        'plan_description': plan.description,
+        'matte_quantity': plan.matte_quantity,
+        'biscoito_quantity': plan.biscoito_quantity,
+        'start_date': subscription.start_date,
+        'end_date': subscription.end_date,
+        'auto_renew': subscription.auto_renew,
+        'status': subscription.status
+    }
+
+
+def serialize_payment(payment, plan_name, subscription_status):
+    """Dados de um pagamento no histórico do usuário"""
+    return {
+        'id': payment.id,
+        'amount': payment.amount,
+        'payment_method': payment.payment_method,
+        'status': payment.status,
+        'transaction_id': payment.transaction_id,
+        'created_at': payment.created_at,
+        'plan_name': plan_name,
+        'subscription_status': subscription_status
+    }
+
+
+def serialize_redemption(redemption, username):
+    """Dados de uma retirada no histórico do vendedor"""
+    return {
+        'id': redemption.id,
+        'user': username,
+        'matte_quantity': redemption.matte_quantity,
+        'biscoito_quantity': redemption.biscoito_quantity,
+        'redeemed_at': redemption.redeemed_at
+    }
+
+
+def serialize_fraud_alert(alert):
+    """Dados de um alerta de uso suspeito de QR code"""
+    return {
+        'id': alert.id,
+        'kind': alert.kind,
+        'qr_code_id': alert.qr_code_id,
+        'vendor_id': alert.vendor_id,
+        'redemption_id': alert.redemption_id,
+        'details': json.loads(alert.details) if alert.details else None,
+        'created_at': alert.created_at
+    }
@@ -6,6 +6,9 @@ db = SQLAlchemy()
 
 class User(db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        db.Index('ix_users_role_id', 'role', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -24,11 +27,15 @@ class User(db.Model):
 
 class Subscription(db.Model):
     __tablename__ = 'subscriptions'
+    __table_args__ = (
+        db.Index('ix_subscriptions_user_status', 'user_id', 'status'),
+        db.Index('ix_subscriptions_plan_id', 'plan_id', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     plan_id = db.Column(db.Integer, db.ForeignKey('plans.id'), nullable=False)
-    status = db.Column(db.String(20), nullable=False, default='ativo')  # 'ativo', 'cancelado', 'expirado'
+    status = db.Column(db.String(20), nullable=False, default='ativo')  # 'pendente', 'ativo', 'cancelado', 'expirado', 'recusado'
     start_date = db.Column(db.DateTime, default=datetime.utcnow)
     end_date = db.Column(db.DateTime)
     auto_renew = db.Column(db.Boolean, default=True)
@@ -50,6 +57,7 @@ class Plan(db.Model):
     price = db.Column(db.Float, nullable=False)
     matte_quantity = db.Column(db.Integer, nullable=False)  # Quantidade de mattes por dia
     biscoito_quantity = db.Column(db.Integer, nullable=False)  # Quantidade de biscoitos Globo por dia
+    archived_at = db.Column(db.DateTime, nullable=True)  # Plano excluído que ainda aparece no histórico
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -71,6 +79,10 @@ class QRCode(db.Model):
 
 class Redemption(db.Model):
     __tablename__ = 'redemptions'
+    __table_args__ = (
+        db.Index('ix_redemptions_vendor_redeemed_at', 'vendor_id', 'redeemed_at'),
+        db.Index('ix_redemptions_redeemed_at', 'redeemed_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     qr_code_id = db.Column(db.Integer, db.ForeignKey('qr_codes.id'), nullable=False)
@@ -103,3 +115,45 @@ class Payment(db.Model):
     
     def __repr__(self):
         return f'<Payment {self.id}>'
+
+class FraudAlert(db.Model):
+    __tablename__ = 'fraud_alerts'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(30), nullable=False)  # 'multi_vendor' ou 'vendor_burst'
+    qr_code_id = db.Column(db.Integer, db.ForeignKey('qr_codes.id'))
+    vendor_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    redemption_id = db.Column(db.Integer, db.ForeignKey('redemptions.id'))
+    details = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<FraudAlert {self.kind} {self.id}>'
+
+class PlanMigration(db.Model):
+    __tablename__ = 'plan_migrations'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    from_plan_id = db.Column(db.Integer, db.ForeignKey('plans.id'), nullable=False)
+    to_plan_id = db.Column(db.Integer, db.ForeignKey('plans.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pendente')  # 'pendente', 'executando', 'concluida', 'falhou'
+    batch_size = db.Column(db.Integer, nullable=False, default=500)
+    last_subscription_id = db.Column(db.Integer, nullable=False, default=0)  # Cursor para retomar
+    total = db.Column(db.Integer, nullable=False, default=0)
+    migrated = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<PlanMigration {self.from_plan_id}->{self.to_plan_id}>'
+
+class KPICounter(db.Model):
+    __tablename__ = 'kpi_counters'
+    
+    name = db.Column(db.String(64), primary_key=True)  # ex.: 'ativos:3', 'retiradas:2026-10-18', 'receita:2026-10'
+    value = db.Column(db.Float, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<KPICounter {self.name}={self.value}>'
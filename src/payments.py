@@ -0,0 +1,261 @@
+import abc
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+from src.database import begin_write
+from src.entitlements import entitlements
+from src.kpis import kpis, active_key, revenue_key
+from src.models.user import db, Payment, Subscription
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_CHUNK_SIZE = 500
+
+
+class GatewayNotConfigured(RuntimeError):
+    """Nenhum gateway de pagamento configurado (PAYMENT_GATEWAY)"""
+
+
+class PaymentGateway(abc.ABC):
+    """Interface do gateway de pagamento (cartão/PIX).
+
+    charge() deve ser idempotente pelo transaction_id: repetir a cobrança
+    de uma transação já processada devolve o mesmo resultado.
+    """
+
+    @abc.abstractmethod
+    def charge(self, transaction_id, amount, payment_method):
+        """Cobrar e devolver 'aprovado' ou 'recusado'"""
+
+    @abc.abstractmethod
+    def fetch_statuses(self, transaction_ids):
+        """Status conhecidos pelo gateway para várias transações ({transaction_id: status})"""
+
+
+class FakeGateway(PaymentGateway):
+    """Gateway local para desenvolvimento e benchmarks; só usado com PAYMENT_GATEWAY='fake'.
+
+    Por padrão aprova tudo na hora; latência e taxa de recusa simuladas só
+    quando configuradas. Guarda os últimos `max_results` resultados (o
+    suficiente para a idempotência e a conciliação de um teste de carga).
+    """
+
+    def __init__(self, latency=0, failure_rate=0, seed=None, max_results=100000):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.max_results = max_results
+        self._random = random.Random(seed)
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def charge(self, transaction_id, amount, payment_method):
+        with self._lock:
+            if transaction_id in self._results:
+                return self._results[transaction_id]
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            status = 'recusado' if self._random.random() < self.failure_rate else 'aprovado'
+            status = self._results.setdefault(transaction_id, status)
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+            return status
+
+    def fetch_statuses(self, transaction_ids):
+        with self._lock:
+            return {tid: self._results[tid] for tid in transaction_ids if tid in self._results}
+
+
+def apply_results(results):
+    """Gravar em lote o resultado de pagamentos ({payment_id: status}) e ativar as assinaturas aprovadas"""
+    if not results:
+        return
+    approved = [pid for pid, status in results.items() if status == 'aprovado']
+    declined = [pid for pid, status in results.items() if status == 'recusado']
+    now = datetime.utcnow()
+
+    # Pagamentos travados até o commit: o mesmo resultado aplicado duas vezes (fila e
+    # conciliação ao mesmo tempo) não ativa nem soma a receita em dobro
+    begin_write(db.session)
+    rows = db.session.execute(
+        select(Payment.id, Payment.subscription_id, Payment.amount, Payment.created_at,
+               Subscription.user_id, Subscription.plan_id)
+        .join(Subscription, Subscription.id == Payment.subscription_id)
+        .where(Payment.id.in_(list(results)), Payment.status == 'pendente')
+        .with_for_update()
+    ).all()
+    subscription_of = {row.id: row.subscription_id for row in rows}
+    user_ids = [row.user_id for row in rows]
+
+    # Pagamento aprovado ativa a assinatura; recusado a marca como recusada
+    outcomes = (('aprovado', approved, 'ativo'), ('recusado', declined, 'recusado'))
+    for status, payment_ids, subscription_status in outcomes:
+        payment_ids = [pid for pid in payment_ids if pid in subscription_of]
+        if not payment_ids:
+            continue
+        db.session.execute(
+            update(Payment).where(Payment.id.in_(payment_ids), Payment.status == 'pendente')
+            .values(status=status, updated_at=now).execution_options(synchronize_session=False)
+        )
+        # A assinatura só passa a valer (30 dias) a partir da aprovação
+        values = {'status': subscription_status, 'updated_at': now}
+        if subscription_status == 'ativo':
+            values.update(start_date=now, end_date=now + timedelta(days=30))
+        db.session.execute(
+            update(Subscription)
+            .where(Subscription.id.in_([subscription_of[pid] for pid in payment_ids]),
+                   Subscription.status == 'pendente')
+            .values(**values).execution_options(synchronize_session=False)
+        )
+
+    # Indicadores do painel: assinaturas ativas por plano e receita do mês do pagamento
+    deltas = Counter()
+    for row in rows:
+        if results[row.id] == 'aprovado':
+            deltas[active_key(row.plan_id)] += 1
+            deltas[revenue_key(row.created_at)] += row.amount
+    kpis.add(deltas)
+    db.session.commit()
+    entitlements.invalidate_users(user_ids)
+
+
+class PaymentQueue:
+    """Fila de cobranças processada por threads de trabalho contra um PaymentGateway.
+
+    O gateway vem de init_app(app, gateway) ou da configuração
+    PAYMENT_GATEWAY; sem nenhum dos dois as cobranças são recusadas com
+    GatewayNotConfigured (o gateway de testes nunca entra sozinho).
+    """
+
+    def __init__(self, app=None, gateway=None):
+        self.gateway = gateway
+        self.app = None
+        self._queue = queue.Queue()
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, gateway)
+
+    def init_app(self, app, gateway=None):
+        app.config.setdefault('PAYMENT_PIPELINE', True)
+        app.config.setdefault('PAYMENT_WORKERS', 4)
+        app.config.setdefault('PAYMENT_GATEWAY', None)
+        app.config.setdefault('FAKE_GATEWAY_LATENCY', 0)
+        app.config.setdefault('FAKE_GATEWAY_FAILURE_RATE', 0)
+        self.app = app
+        self.gateway = gateway or self.gateway
+        if self.gateway is None and app.config['PAYMENT_GATEWAY'] == 'fake':
+            self.gateway = FakeGateway(
+                latency=app.config['FAKE_GATEWAY_LATENCY'],
+                failure_rate=app.config['FAKE_GATEWAY_FAILURE_RATE']
+            )
+        elif self.gateway is None:
+            logger.warning('Nenhum gateway de pagamento configurado: assinaturas novas serão recusadas')
+        app.extensions['payment_queue'] = self
+
+    @property
+    def configured(self):
+        return self.gateway is not None
+
+    def require_gateway(self):
+        if self.gateway is None:
+            raise GatewayNotConfigured('Gateway de pagamento não configurado')
+        return self.gateway
+
+    def ensure_workers(self):
+        """Iniciar as threads sob demanda (e de novo após um fork do servidor)"""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._queue = queue.Queue()
+            self._threads = []
+            for i in range(self.app.config['PAYMENT_WORKERS']):
+                thread = threading.Thread(target=self.worker, name=f'payment-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            self._pid = pid
+
+    def enqueue(self, payment_id):
+        self.ensure_workers()
+        self._queue.put(payment_id)
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def worker(self):
+        while True:
+            payment_id = self._queue.get()
+            try:
+                with self.app.app_context():
+                    self.process(payment_id)
+            except Exception:
+                logger.exception('Falha ao processar pagamento %s', payment_id)
+            finally:
+                self._queue.task_done()
+
+    def process(self, payment_id):
+        """Cobrar um pagamento pendente e gravar o resultado"""
+        row = db.session.execute(
+            select(Payment.transaction_id, Payment.amount, Payment.payment_method)
+            .where(Payment.id == payment_id, Payment.status == 'pendente')
+        ).first()
+        # Banco ainda livre durante a chamada ao gateway
+        db.session.rollback()
+        if row is None:
+            return None
+        status = self.require_gateway().charge(row.transaction_id, row.amount, row.payment_method)
+        apply_results({payment_id: status})
+        return status
+
+    def join(self, timeout=None):
+        """Aguardar a fila esvaziar (útil em benchmarks e scripts)"""
+        deadline = time.monotonic() + timeout if timeout else None
+        while self._queue.unfinished_tasks:
+            if deadline and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def reconcile(self, older_than=60):
+        """Conciliar pagamentos pendentes antigos: consulta em lote ao gateway e reenfileira os desconhecidos"""
+        gateway = self.require_gateway()
+        cutoff = datetime.utcnow() - timedelta(seconds=older_than)
+        summary = {'approved': 0, 'declined': 0, 'requeued': 0}
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                select(Payment.id, Payment.transaction_id)
+                .where(Payment.status == 'pendente', Payment.created_at < cutoff, Payment.id > last_id)
+                .order_by(Payment.id).limit(RECONCILE_CHUNK_SIZE)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            known = gateway.fetch_statuses([row.transaction_id for row in rows])
+            results = {row.id: known[row.transaction_id] for row in rows if row.transaction_id in known}
+            apply_results(results)
+            summary['approved'] += sum(1 for s in results.values() if s == 'aprovado')
+            summary['declined'] += sum(1 for s in results.values() if s == 'recusado')
+
+            for row in rows:
+                if row.id not in results:
+                    self.enqueue(row.id)
+                    summary['requeued'] += 1
+        return summary
+
+
+# Fila de pagamentos da aplicação (configurada em main.py)
+payment_queue = PaymentQueue()
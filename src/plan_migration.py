@@ -0,0 +1,138 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+from src.entitlements import entitlements
+from src.kpis import kpis, active_key
+from src.models.user import db, Plan, PlanMigration, Subscription
+
+# Só assinaturas em vigor mudam de plano; canceladas/expiradas guardam o plano que tinham
+MIGRATED_STATUSES = ('ativo', 'pendente')
+DEFAULT_BATCH_SIZE = 500
+MAX_BATCH_SIZE = 5000
+# Pausa entre lotes para não disputar a tabela com o tráfego normal
+BATCH_PAUSE = 0.05
+
+# Migração 'executando' sem lote gravado há mais tempo que isso: o processo que a executava morreu
+STALE_AFTER = timedelta(minutes=5)
+
+
+def start_migration(from_plan_id, to_plan_id, batch_size=DEFAULT_BATCH_SIZE):
+    """Registrar a migração dos assinantes (ativos e pendentes) do plano A para o plano B"""
+    total = db.session.query(Subscription.id).filter(
+        Subscription.plan_id == from_plan_id,
+        Subscription.status.in_(MIGRATED_STATUSES)
+    ).count()
+    migration = PlanMigration(
+        from_plan_id=from_plan_id,
+        to_plan_id=to_plan_id,
+        batch_size=batch_size,
+        total=total
+    )
+    db.session.add(migration)
+    db.session.commit()
+    return migration
+
+
+def migrate_batch(migration):
+    """Migrar o próximo lote (pela chave primária, a partir do cursor); retorna quantos foram movidos"""
+    rows = db.session.execute(
+        select(Subscription.id, Subscription.user_id, Subscription.status).where(
+            Subscription.plan_id == migration.from_plan_id,
+            Subscription.status.in_(MIGRATED_STATUSES),
+            Subscription.id > migration.last_subscription_id
+        ).order_by(Subscription.id).limit(migration.batch_size)
+    ).all()
+    if not rows:
+        return 0
+
+    ids = [row.id for row in rows]
+    # Transação curta por lote: só as linhas do lote ficam bloqueadas. Um UPDATE por
+    # status: os deltas vêm do que foi de fato alterado, não da leitura anterior
+    moved = {}
+    for status in MIGRATED_STATUSES:
+        moved[status] = db.session.execute(
+            update(Subscription)
+            .where(Subscription.id.in_(ids), Subscription.plan_id == migration.from_plan_id,
+                   Subscription.status == status)
+            .values(plan_id=migration.to_plan_id)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+    migration.last_subscription_id = ids[-1]
+    migration.migrated += sum(moved.values())
+    active = moved['ativo']
+    kpis.add({active_key(migration.from_plan_id): -active, active_key(migration.to_plan_id): active})
+    db.session.commit()
+
+    entitlements.invalidate_users(row.user_id for row in rows)
+    return len(rows)
+
+
+def claim(migration_id):
+    """Marcar a migração como 'executando' no banco; False se outro worker já a executa (ou já terminou).
+
+    UPDATE condicional: entre requisições simultâneas (em qualquer processo)
+    só uma altera a linha. Uma execução parada há mais de STALE_AFTER (worker
+    encerrado no meio) pode ser retomada.
+    """
+    now = datetime.utcnow()
+    claimable = PlanMigration.status.in_(('pendente', 'falhou')) | (
+        (PlanMigration.status == 'executando') & (PlanMigration.updated_at < now - STALE_AFTER)
+    )
+    result = db.session.execute(
+        update(PlanMigration)
+        .where(PlanMigration.id == migration_id, claimable)
+        .values(status='executando', error=None, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def run_migration(migration_id, pause=BATCH_PAUSE):
+    """Executar (ou retomar) até o fim, lote a lote, uma migração já reservada com claim()"""
+    try:
+        migration = PlanMigration.query.get(migration_id)
+        if migration is None or migration.status != 'executando':
+            return
+
+        to_plan = Plan.query.get(migration.to_plan_id)
+        if to_plan is None or to_plan.archived_at:
+            migration.status = 'falhou'
+            migration.error = 'Plano de destino não existe mais'
+            db.session.commit()
+            return
+
+        while migrate_batch(migration):
+            if pause:
+                time.sleep(pause)
+
+        migration.status = 'concluida'
+        db.session.commit()
+        entitlements.invalidate_plan(migration.from_plan_id)
+    except Exception as exc:
+        db.session.rollback()
+        migration = PlanMigration.query.get(migration_id)
+        if migration is not None:
+            migration.status = 'falhou'
+            migration.error = str(exc)
+            db.session.commit()
+        raise
+
+
+def run_in_background(app, migration_id):
+    """Executar a migração em uma thread, com contexto próprio da aplicação"""
+    def target():
+        with app.app_context():
+            run_migration(migration_id)
+
+    thread = threading.Thread(target=target, name=f'plan-migration-{migration_id}', daemon=True)
+    thread.start()
+    return thread
+
+
+def is_running(migration):
+    """Em execução em algum worker: 'executando' com lote gravado há menos de STALE_AFTER"""
+    return migration.status == 'executando' and migration.updated_at > datetime.utcnow() - STALE_AFTER
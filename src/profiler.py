@@ -0,0 +1,374 @@
+import faulthandler
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter, deque
+
+from flask import current_app, request, session
+
+# Pilhas além deste limite (por janela) são somadas em uma entrada só
+OTHER_STACKS = '[outras pilhas]'
+
+
+class SamplingProfiler:
+    """Profiler por amostragem das requisições escolhidas, com saída em pilhas colapsadas (flame graph).
+
+    Uma thread lê periodicamente a pilha (via faulthandler) só das threads
+    que estão atendendo requisições marcadas; nada é instrumentado no caminho
+    da requisição além de marcar/desmarcar a thread. As amostras são somadas
+    em janelas de `PROFILER_WINDOW` segundos e o arquivo de cada endpoint
+    reflete as últimas `PROFILER_WINDOWS` janelas.
+
+    O pedido do administrador vai para um arquivo de controle em
+    `PROFILER_DIR`, que cada worker do servidor relê a cada
+    `PROFILER_CONTROL_INTERVAL` segundos: ligar ou desligar em qualquer
+    worker vale para todos, e cada um grava os próprios arquivos
+    (`<endpoint>.<pid>.collapsed`).
+
+    Limites: no máximo `PROFILER_MAX_CONCURRENT` requisições perfiladas ao
+    mesmo tempo, intervalo de amostragem aumentado automaticamente se o custo
+    da amostragem passar de `PROFILER_MAX_OVERHEAD` do tempo, e arquivo
+    truncado (pilhas mais frequentes primeiro) em `PROFILER_MAX_FILE_BYTES`.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.routes = frozenset()
+        self.sample_rate = 0.0
+        self.until = 0.0
+        self.header_key = None
+        self._control = None
+        self._next_sync = 0.0
+        self._active = {}
+        self._windows = {}
+        self._current = {}
+        self._window_started = time.monotonic()
+        self._labels = {}
+        self._lock = threading.Lock()
+        self._data_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.interval = None
+        self.samples = 0
+        self.sampling_time = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PROFILER_ENABLED', True)
+        app.config.setdefault('PROFILER_DIR', os.path.join(app.instance_path, 'profiles'))
+        app.config.setdefault('PROFILER_INTERVAL', 0.005)
+        app.config.setdefault('PROFILER_MAX_OVERHEAD', 0.02)
+        app.config.setdefault('PROFILER_MAX_CONCURRENT', 4)
+        app.config.setdefault('PROFILER_MAX_FILE_BYTES', 1024 * 1024)
+        app.config.setdefault('PROFILER_MAX_STACKS', 10000)
+        app.config.setdefault('PROFILER_MAX_DEPTH', 64)
+        app.config.setdefault('PROFILER_WINDOW', 60)
+        app.config.setdefault('PROFILER_WINDOWS', 5)
+        app.config.setdefault('PROFILER_CONTROL_INTERVAL', 1.0)
+        # Cabeçalho que liga o profiler na própria requisição (só em sessão de administrador)
+        app.config.setdefault('PROFILER_HEADER', 'X-Profile')
+        self.app = app
+        self.interval = app.config['PROFILER_INTERVAL']
+        self.header_key = 'HTTP_' + app.config['PROFILER_HEADER'].upper().replace('-', '_')
+        app.extensions['profiler'] = self
+        app.before_request(self.before_request)
+        app.teardown_request(self.teardown_request)
+
+    # Controle (endpoints de administração)
+
+    def enable(self, routes, sample_rate, duration):
+        """Perfilar `sample_rate` das requisições das rotas (endpoints, ou '*' para todas) por `duration` segundos"""
+        self.write_control({'routes': sorted(routes), 'sample_rate': sample_rate, 'until': time.time() + duration})
+
+    def disable(self):
+        self.write_control({'routes': [], 'sample_rate': 0.0, 'until': 0.0})
+        self.flush()
+
+    def control_path(self):
+        return os.path.join(self.app.config['PROFILER_DIR'], 'control.json')
+
+    def write_control(self, control):
+        """Gravar o pedido para todos os workers (de forma atômica) e aplicar neste"""
+        directory = self.app.config['PROFILER_DIR']
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(control, f)
+        os.replace(tmp_path, self.control_path())
+        self.apply(control)
+
+    def sync(self):
+        """Reler o arquivo de controle (o pedido pode ter chegado a outro worker)"""
+        self._next_sync = time.monotonic() + self.app.config['PROFILER_CONTROL_INTERVAL']
+        try:
+            with open(self.control_path()) as f:
+                control = json.load(f)
+        except (FileNotFoundError, ValueError):
+            control = None
+        if control != self._control and self.apply(control):
+            # Desligado por outro worker: as amostras deste vão para o disco
+            self.flush()
+
+    def apply(self, control):
+        """Aplicar o pedido neste processo; devolve True se o profiler acabou de parar"""
+        with self._lock:
+            self._control = control
+            stopping = bool(self.routes)
+            if control and control['routes'] and control['until'] > time.time():
+                self.routes = frozenset(control['routes'])
+                self.sample_rate = control['sample_rate']
+                self.until = control['until']
+                stopping = False
+            else:
+                self.routes = frozenset()
+                self.sample_rate = 0.0
+                self.until = 0.0
+        return stopping
+
+    def set_targets(self, routes, sample_rate, duration):
+        """Validar e aplicar o pedido do administrador; devolve a mensagem de erro ou None"""
+        if not isinstance(routes, list) or not routes or not all(isinstance(r, str) for r in routes):
+            return 'routes deve ser uma lista de endpoints (ou ["*"])'
+        unknown = [r for r in routes if r != '*' and r not in self.app.view_functions]
+        if unknown:
+            return f'Endpoints desconhecidos: {", ".join(unknown)}'
+        if not isinstance(sample_rate, (int, float)) or not 0 < sample_rate <= 1:
+            return 'sample_rate deve estar entre 0 e 1'
+        if not isinstance(duration, int) or not 0 < duration <= 3600:
+            return 'duration deve estar entre 1 e 3600 segundos'
+        self.enable(routes, float(sample_rate), duration)
+        return None
+
+    def status(self):
+        """Pedido em vigor (igual em todos os workers) e contadores deste processo (`pid`)"""
+        self.sync()
+        remaining = max(0.0, self.until - time.time())
+        with self._lock:
+            active = len(self._active)
+        return {
+            'pid': os.getpid(),
+            'routes': sorted(self.routes) if remaining else [],
+            'sample_rate': self.sample_rate if remaining else 0.0,
+            'remaining_seconds': round(remaining),
+            'active_requests': active,
+            'interval_ms': round(self.interval * 1000, 2),
+            'samples': self.samples,
+            'sampling_seconds': round(self.sampling_time, 3),
+            'files': self.files()
+        }
+
+    # Hooks da requisição
+
+    def should_profile(self, req, endpoint):
+        if not current_app.config['PROFILER_ENABLED']:
+            return False
+        if req.environ.get(self.header_key) and session.get('user_role') == 'admin':
+            return True
+        if not self.routes:
+            return False
+        if time.time() > self.until:
+            # Prazo do administrador acabou: volta ao caminho rápido
+            self.routes = frozenset()
+            return False
+        if endpoint not in self.routes and '*' not in self.routes:
+            return False
+        return random.random() < self.sample_rate
+
+    def before_request(self):
+        if time.monotonic() >= self._next_sync:
+            self.sync()
+        req = request._get_current_object()
+        # Caminho de toda requisição com o profiler parado: o relógio e duas consultas a dicionário
+        if not self.routes and self.header_key not in req.environ:
+            return None
+        endpoint = req.endpoint
+        if endpoint is None or not self.should_profile(req, endpoint):
+            return None
+        self.ensure_thread()
+        with self._lock:
+            if len(self._active) >= current_app.config['PROFILER_MAX_CONCURRENT']:
+                return None
+            self._active[threading.get_ident()] = endpoint
+        self._wakeup.set()
+        return None
+
+    def teardown_request(self, exc=None):
+        if not self._active:
+            return
+        with self._lock:
+            self._active.pop(threading.get_ident(), None)
+
+    # Amostragem
+
+    def ensure_thread(self):
+        """Thread de amostragem criada sob demanda (e de novo após um fork do servidor)"""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._active = {}
+            self._current = {}
+            self._windows = {}
+            self._thread = threading.Thread(target=self.run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+            self._pid = pid
+
+    def label(self, line):
+        """'  File "src/routes/vendor.py", line 95 in vendor_dashboard' → 'vendor:vendor_dashboard'"""
+        location, _, function = line.rpartition(' in ')
+        filename = location[location.find('"') + 1:location.rfind('"')]
+        key = (filename, function)
+        label = self._labels.get(key)
+        if label is None:
+            module = os.path.splitext(os.path.basename(filename))[0]
+            label = self._labels[key] = f'{module}:{function}'.replace(';', ':').replace(' ', '_')
+        return label
+
+    def read_stacks(self, fd, thread_ids):
+        """Pilhas (da raiz para a folha) das threads pedidas, lidas pelo faulthandler.
+
+        O faulthandler percorre as pilhas em C sem criar objetos frame; segurar
+        os frames de sys._current_frames() enquanto a outra thread continua
+        rodando derruba o CPython 3.11 (segmentation fault).
+        """
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.ftruncate(fd, 0)
+        faulthandler.dump_traceback(fd, all_threads=True)
+        size = os.lseek(fd, 0, os.SEEK_CUR)
+        os.lseek(fd, 0, os.SEEK_SET)
+        text = os.read(fd, size).decode('utf-8', 'replace')
+
+        stacks = {}
+        current = None
+        for line in text.splitlines():
+            if line.startswith('  File '):
+                if current is not None:
+                    current.append(self.label(line))
+            elif 'hread 0x' in line:
+                thread_id = int(line.split('0x', 1)[1].split(' ', 1)[0], 16)
+                current = None
+                if thread_id in thread_ids:
+                    current = stacks[thread_id] = []
+        for stack in stacks.values():
+            stack.reverse()
+        return stacks
+
+    def sample(self, fd, max_depth, max_stacks):
+        with self._lock:
+            active = dict(self._active)
+        if not active:
+            return False
+        stacks = self.read_stacks(fd, active)
+        with self._data_lock:
+            for thread_id, endpoint in active.items():
+                stack = stacks.get(thread_id)
+                if not stack:
+                    continue
+                key = ';'.join(stack[-max_depth:])
+                counts = self._current.setdefault(endpoint, Counter())
+                if key not in counts and len(counts) >= max_stacks:
+                    key = OTHER_STACKS
+                counts[key] += 1
+                self.samples += 1
+        return True
+
+    def run(self):
+        config = self.app.config
+        base_interval = config['PROFILER_INTERVAL']
+        # Arquivo de rascunho onde o faulthandler escreve as pilhas a cada amostra
+        scratch = tempfile.TemporaryFile()
+        while True:
+            if not self._active:
+                self.rotate_if_due()
+                self._wakeup.clear()
+                self._wakeup.wait(config['PROFILER_WINDOW'])
+                continue
+
+            started = time.perf_counter()
+            self.sample(scratch.fileno(), config['PROFILER_MAX_DEPTH'], config['PROFILER_MAX_STACKS'])
+            spent = time.perf_counter() - started
+            self.sampling_time += spent
+
+            # Manter o custo da amostragem abaixo do limite: espaçar as amostras se preciso
+            if spent > self.interval * config['PROFILER_MAX_OVERHEAD']:
+                self.interval = min(self.interval * 2, 0.5)
+            elif self.interval > base_interval:
+                self.interval = max(self.interval * 0.9, base_interval)
+
+            self.rotate_if_due()
+            time.sleep(self.interval)
+
+    def rotate_if_due(self):
+        window = self.app.config['PROFILER_WINDOW']
+        if time.monotonic() - self._window_started < window:
+            return
+        self._window_started = time.monotonic()
+        keep = self.app.config['PROFILER_WINDOWS']
+        with self._data_lock:
+            current, self._current = self._current, {}
+            # Janela vazia também entra: pilhas antigas saem do arquivo mesmo sem tráfego
+            for endpoint in set(self._windows) | set(current):
+                self._windows.setdefault(endpoint, deque(maxlen=keep)).append(current.get(endpoint, Counter()))
+        self.flush()
+
+    # Saída em disco
+
+    def path(self, endpoint):
+        return os.path.join(self.app.config['PROFILER_DIR'], f'{endpoint}.{os.getpid()}.collapsed')
+
+    def flush(self):
+        """Gravar, por endpoint, as pilhas das últimas janelas (e da atual), limitadas em bytes"""
+        if self.app is None:
+            return
+        directory = self.app.config['PROFILER_DIR']
+        max_bytes = self.app.config['PROFILER_MAX_FILE_BYTES']
+        with self._data_lock:
+            totals_by_endpoint = {}
+            for endpoint in set(self._windows) | set(self._current):
+                totals = Counter()
+                for counts in self._windows.get(endpoint, ()):
+                    totals.update(counts)
+                totals.update(self._current.get(endpoint, {}))
+                totals_by_endpoint[endpoint] = totals
+
+        for endpoint, totals in totals_by_endpoint.items():
+            if not totals:
+                # Nada nas últimas janelas: o arquivo do endpoint sai junto
+                with self._data_lock:
+                    if not self._current.get(endpoint):
+                        self._windows.pop(endpoint, None)
+                if os.path.exists(self.path(endpoint)):
+                    os.remove(self.path(endpoint))
+                continue
+
+            os.makedirs(directory, exist_ok=True)
+            lines = []
+            size = 0
+            for stack, count in totals.most_common():
+                line = f'{stack} {count}\n'.encode()
+                if size + len(line) > max_bytes:
+                    break
+                lines.append(line)
+                size += len(line)
+
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.writelines(lines)
+            os.replace(tmp_path, self.path(endpoint))
+
+    def files(self):
+        directory = self.app.config['PROFILER_DIR']
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name for name in os.listdir(directory) if name.endswith('.collapsed'))
+
+
+# Profiler da aplicação (configurado em main.py, controlado em /api/admin/profiler)
+profiler = SamplingProfiler()
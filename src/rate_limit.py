@@ -0,0 +1,154 @@
+import abc
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import current_app, request, session
+
+# Política de um balde: `limit` fichas a cada `period` segundos, acumulando até `burst`
+# key: 'ip', 'user' (usuário logado), 'vendor' (vendedor logado) ou 'username' (do corpo do login)
+RateLimitPolicy = namedtuple('RateLimitPolicy', 'key limit period burst')
+
+# Políticas padrão por endpoint (RATE_LIMITS na configuração substitui por endpoint)
+DEFAULT_POLICIES = {
+    'auth.login': (
+        RateLimitPolicy('ip', 20, 60, 20),
+        RateLimitPolicy('username', 5, 60, 10),
+    ),
+    'auth.register': (
+        RateLimitPolicy('ip', 20, 3600, 20),
+    ),
+    'qrcode.validate_qrcode': (
+        RateLimitPolicy('vendor', 5, 1, 20),
+        RateLimitPolicy('ip', 10, 1, 40),
+    ),
+}
+
+# Corpo fixo da recusa: montado uma vez, sem passar pelo jsonify
+REJECTED_BODY = '{"error": "Muitas requisições. Tente novamente em instantes"}\n'.encode()
+
+
+class BucketStore(abc.ABC):
+    """Armazenamento dos baldes de fichas.
+
+    A implementação em memória vale por processo; com vários workers, um
+    armazenamento compartilhado (ex.: Redis com um script atômico) implementa
+    take() com a mesma semântica e é passado ao RateLimiter.
+    """
+
+    @abc.abstractmethod
+    def take(self, key, rate, burst, now):
+        """Consumir uma ficha; devolve 0 se permitido ou os segundos até a próxima ficha"""
+
+
+class MemoryBucketStore(BucketStore):
+    """Baldes em um LRU limitado: memória constante mesmo sob ataque com muitas chaves"""
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, now):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                # Balde novo começa cheio (menos a ficha desta requisição)
+                self._buckets[key] = [burst - 1.0, now]
+                if len(self._buckets) > self.maxsize:
+                    self._buckets.popitem(last=False)
+                return 0
+
+            self._buckets.move_to_end(key)
+            tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if tokens >= 1.0:
+                bucket[0] = tokens - 1.0
+                return 0
+            bucket[0] = tokens
+            return (1.0 - tokens) / rate
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class RateLimiter:
+    """Limite de taxa por chave (IP, usuário, vendedor) com baldes de fichas, por endpoint.
+
+    Deve ser registrado antes dos demais hooks, só depois do tracer (que
+    apenas abre o span e assim também mede as recusas): uma requisição
+    recusada não chega às faixas de prioridade, ao hash de senha nem ao
+    banco e responde 429 com Retry-After.
+
+    Com o MemoryBucketStore padrão os limites valem por worker: com N
+    workers um cliente consegue até N vezes o limite configurado, até um
+    BucketStore compartilhado ser passado em init_app. A chave 'ip' usa
+    request.remote_addr; atrás de proxy reverso ele só é o IP do cliente com
+    o ProxyFix configurado (PROXY_TRUSTED_HOPS em main.py), senão todos os
+    clientes dividem o balde do proxy.
+    """
+
+    def __init__(self, app=None, store=None):
+        self.store = store
+        self.policies = {}
+        if app is not None:
+            self.init_app(app, store)
+
+    def init_app(self, app, store=None):
+        app.config.setdefault('RATE_LIMIT_ENABLED', True)
+        app.config.setdefault('RATE_LIMIT_MAX_KEYS', 100000)
+        app.config.setdefault('RATE_LIMITS', {})
+        self.store = store or self.store or MemoryBucketStore(app.config['RATE_LIMIT_MAX_KEYS'])
+        self.policies = {**DEFAULT_POLICIES, **app.config['RATE_LIMITS']}
+        app.extensions['rate_limiter'] = self
+        app.before_request(self.before_request)
+
+    @staticmethod
+    def key_value(key, req, sess):
+        """Valor da chave para a requisição atual (None: a política não se aplica)"""
+        if key == 'ip':
+            return req.remote_addr
+        if key == 'user':
+            return sess.get('user_id')
+        if key == 'vendor':
+            return sess.get('user_id') if sess.get('user_role') == 'vendedor' else None
+        if key == 'username':
+            data = req.get_json(silent=True)
+            username = data.get('username') if isinstance(data, dict) else None
+            return username if isinstance(username, str) else None
+        raise ValueError(f'Chave de limite desconhecida: {key}')
+
+    def check(self, req):
+        """Segundos até poder tentar de novo se alguma política recusar, senão 0"""
+        endpoint = req.endpoint
+        policies = self.policies.get(endpoint)
+        if not policies:
+            return 0
+        # Proxies resolvidos uma vez só: este caminho roda em toda requisição limitada
+        sess = session._get_current_object()
+        now = time.monotonic()
+        for policy in policies:
+            value = self.key_value(policy.key, req, sess)
+            if value is None:
+                continue
+            retry_after = self.store.take(
+                (endpoint, policy.key, value), policy.limit / policy.period, policy.burst, now
+            )
+            if retry_after:
+                return retry_after
+        return 0
+
+    def before_request(self):
+        if not current_app.config['RATE_LIMIT_ENABLED']:
+            return None
+        retry_after = self.check(request._get_current_object())
+        if not retry_after:
+            return None
+        return current_app.response_class(
+            REJECTED_BODY, status=429, mimetype='application/json',
+            headers={'Retry-After': str(int(retry_after) + 1)}
+        )
+
+
+# Limitador da aplicação (configurado em main.py)
+rate_limiter = RateLimiter()
@@ -0,0 +1,392 @@
+import gzip
+import hashlib
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from src.admission import admission
+from src.models.user import db, User, Redemption
+
+# Versão do formato em cache: mudar ao alterar o conteúdo do relatório
+REPORT_VERSION = 1
+
+
+def build_vendor_reports(start_datetime, end_datetime, vendor_id=None):
+    """Relatórios por vendedor no período [início, fim), com uma única consulta agregada por (vendedor, dia).
+
+    Sem vendor_id, inclui todos os vendedores; com um único vendedor, devolve o relatório direto.
+    """
+    if vendor_id is not None:
+        vendors = db.session.execute(select(User.id, User.username).where(User.id == vendor_id)).all()
+    else:
+        vendors = db.session.execute(
+            select(User.id, User.username).where(User.role == 'vendedor').order_by(User.id)
+        ).all()
+
+    day = func.date(Redemption.redeemed_at)
+    stmt = select(
+        Redemption.vendor_id, day,
+        func.count(Redemption.id),
+        func.coalesce(func.sum(Redemption.matte_quantity), 0),
+        func.coalesce(func.sum(Redemption.biscoito_quantity), 0)
+    ).where(
+        Redemption.redeemed_at >= start_datetime,
+        Redemption.redeemed_at < end_datetime
+    ).group_by(Redemption.vendor_id, day).order_by(Redemption.vendor_id, day)
+    if vendor_id is not None:
+        stmt = stmt.where(Redemption.vendor_id == vendor_id)
+
+    daily = {}
+    for row_vendor_id, row_day, count, matte, biscoito in db.session.execute(stmt):
+        daily.setdefault(row_vendor_id, []).append({
+            'date': str(row_day),
+            'matte': int(matte),
+            'biscoito': int(biscoito),
+            'redemptions': count
+        })
+
+    period = {
+        'start_date': start_datetime.date(),
+        'end_date': (end_datetime - timedelta(days=1)).date()
+    }
+    report_data = []
+    for vendor in vendors:
+        daily_list = daily.get(vendor.id, [])
+        report_data.append({
+            'vendor_id': vendor.id,
+            'vendor_name': vendor.username,
+            'period': period,
+            'summary': {
+                'total_redemptions': sum(d['redemptions'] for d in daily_list),
+                'total_matte': sum(d['matte'] for d in daily_list),
+                'total_biscoito': sum(d['biscoito'] for d in daily_list)
+            },
+            'daily_breakdown': daily_list
+        })
+
+    # Relatório de um único vendedor é retornado diretamente
+    if len(report_data) == 1:
+        return report_data[0]
+    return report_data
+
+
+def is_closed(end_datetime):
+    """Período que termina antes de hoje: não recebe mais retiradas"""
+    return end_datetime <= datetime.combine(datetime.utcnow().date(), datetime.min.time())
+
+
+def data_watermark(end_datetime, vendor_id=None):
+    """Marca dos dados que alimentam o relatório: muda sempre que o resultado puder mudar.
+
+    Períodos já fechados (antes de hoje) não recebem novas retiradas, então
+    só a lista de vendedores entra na marca; períodos abertos usam também o
+    último id de retirada.
+    """
+    if vendor_id is not None:
+        vendors = db.session.execute(select(User.username).where(User.id == vendor_id)).scalar()
+    else:
+        count, last_id = db.session.execute(
+            select(func.count(User.id), func.max(User.id)).where(User.role == 'vendedor')
+        ).one()
+        vendors = [count, last_id]
+
+    if is_closed(end_datetime):
+        return ['fechado', vendors]
+    return [db.session.execute(select(func.max(Redemption.id))).scalar() or 0, vendors]
+
+
+def report_key(start_datetime, end_datetime, vendor_id=None):
+    """Chave do cache: parâmetros do relatório + marca dos dados"""
+    params = {
+        'version': REPORT_VERSION,
+        'report': 'vendor_reports',
+        'start': start_datetime.isoformat(),
+        'end': end_datetime.isoformat(),
+        'vendor_id': vendor_id,
+        'watermark': data_watermark(end_datetime, vendor_id)
+    }
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+class ReportCache:
+    """Resultados de relatórios em disco (JSON com gzip), limitados em bytes com descarte do menos usado"""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def path(self, key):
+        return os.path.join(self.directory, f'{key}.json.gz')
+
+    def get(self, key):
+        """Conteúdo comprimido do resultado, ou None (o acesso renova o arquivo para o descarte)"""
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def put(self, key, body):
+        """Gravar o JSON (bytes) comprimido, de forma atômica, e aplicar o limite de tamanho"""
+        os.makedirs(self.directory, exist_ok=True)
+        data = gzip.compress(body, compresslevel=6, mtime=0)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.evict()
+        return data
+
+    def evict(self):
+        """Remover os resultados acessados há mais tempo até caber no limite"""
+        with self._lock:
+            entries = []
+            total = 0
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if not entry.name.endswith('.json.gz'):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class ReportJobs:
+    """Jobs de relatório executados em segundo plano, com resultado no ReportCache.
+
+    A situação de cada job fica num arquivo JSON em `REPORT_JOB_DIR` (ao
+    lado do cache), visível para todos os workers do servidor: o job é
+    consultado em qualquer um deles, não só no que o executa. Jobs com a
+    mesma chave no mesmo processo compartilham a execução; só os
+    `REPORT_JOB_HISTORY` mais recentes são mantidos.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.cache = None
+        self.directory = None
+        self._executor = None
+        self._pid = None
+        self._inflight = {}
+        # Reentrante: um future já concluído chama o callback na hora, ainda com a trava
+        self._lock = threading.RLock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('REPORT_CACHE_DIR', os.path.join(app.instance_path, 'report_cache'))
+        app.config.setdefault('REPORT_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+        app.config.setdefault('REPORT_JOB_DIR', os.path.join(app.instance_path, 'report_jobs'))
+        app.config.setdefault('REPORT_WORKERS', 2)
+        app.config.setdefault('REPORT_JOB_HISTORY', 1000)
+        self.app = app
+        self.cache = ReportCache(app.config['REPORT_CACHE_DIR'], app.config['REPORT_CACHE_MAX_BYTES'])
+        self.directory = app.config['REPORT_JOB_DIR']
+        app.extensions['report_jobs'] = self
+
+    def executor(self):
+        """Executor criado sob demanda (e de novo após um fork do servidor)"""
+        pid = os.getpid()
+        if self._pid != pid:
+            self._executor = ThreadPoolExecutor(self.app.config['REPORT_WORKERS'], thread_name_prefix='report')
+            self._inflight = {}
+            self._pid = pid
+        return self._executor
+
+    def render(self, start_datetime, end_datetime, vendor_id=None):
+        """Calcular o relatório e devolver o JSON em bytes"""
+        report = build_vendor_reports(start_datetime, end_datetime, vendor_id)
+        return self.app.json.dumps(report).encode()
+
+    def compute(self, key, start_datetime, end_datetime, vendor_id):
+        self._update(key, status='executando')
+        with self.app.app_context():
+            # Conta no orçamento da faixa bulk, como os relatórios síncronos
+            body = admission.run_bulk(self.render, start_datetime, end_datetime, vendor_id)
+            self.cache.put(key, body)
+
+    def store(self, key, body):
+        """Gravar no cache um relatório já calculado, fora da requisição (compressão e descarte na thread)"""
+        with self._lock:
+            if key not in self._inflight:
+                future = self.executor().submit(self.cache.put, key, body)
+                self._inflight[key] = (future, [])
+                future.add_done_callback(lambda f: self._finish(key, f))
+
+    def submit(self, owner_id, start_datetime, end_datetime, vendor_id=None):
+        """Registrar um job; se o resultado já estiver em cache, o job nasce concluído"""
+        key = report_key(start_datetime, end_datetime, vendor_id)
+        cached = os.path.exists(self.cache.path(key))
+        job = {
+            'id': uuid.uuid4().hex,
+            'owner_id': owner_id,
+            'key': key,
+            'params': {
+                'start_date': start_datetime.date().isoformat(),
+                'end_date': (end_datetime - timedelta(days=1)).date().isoformat(),
+                'vendor_id': vendor_id
+            },
+            'created_at': datetime.utcnow().isoformat(),
+            'cached': cached,
+            'status': 'concluido' if cached else 'pendente',
+            'error': None,
+            'host': socket.gethostname(),
+            'pid': os.getpid()
+        }
+
+        with self._lock:
+            future = None
+            if not cached:
+                inflight = self._inflight.get(key)
+                if inflight is None:
+                    future = self.executor().submit(self.compute, key, start_datetime, end_datetime, vendor_id)
+                    inflight = self._inflight[key] = (future, [])
+                elif inflight[0].running():
+                    job['status'] = 'executando'
+                inflight[1].append(job['id'])
+            self._write(job)
+            if future is not None:
+                future.add_done_callback(lambda f: self._finish(key, f))
+        self._prune()
+        return job
+
+    def _finish(self, key, future):
+        with self._lock:
+            inflight = self._inflight.get(key)
+            if inflight is None or inflight[0] is not future:
+                return
+            del self._inflight[key]
+            error = future.exception()
+            for job_id in inflight[1]:
+                self._edit(job_id, status='falhou' if error is not None else 'concluido',
+                           error=str(error) if error is not None else None)
+
+    def _update(self, key, **changes):
+        with self._lock:
+            inflight = self._inflight.get(key)
+            for job_id in inflight[1] if inflight else ():
+                self._edit(job_id, **changes)
+
+    def _edit(self, job_id, **changes):
+        job = self._read(job_id)
+        if job is not None:
+            job.update(changes)
+            self._write(job)
+
+    def path(self, job_id):
+        return os.path.join(self.directory, f'{job_id}.json')
+
+    def _read(self, job_id):
+        try:
+            with open(self.path(job_id)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write(self, job):
+        """Gravar a situação do job de forma atômica (quem lê nunca vê o arquivo pela metade)"""
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(job, f)
+            os.replace(tmp_path, self.path(job['id']))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _prune(self):
+        """Manter só os REPORT_JOB_HISTORY jobs mais recentes"""
+        with os.scandir(self.directory) as it:
+            entries = [entry for entry in it if entry.name.endswith('.json')]
+        excess = len(entries) - self.app.config['REPORT_JOB_HISTORY']
+        if excess <= 0:
+            return
+        oldest = sorted(entries, key=lambda entry: entry.stat().st_mtime)
+        for entry in oldest[:excess]:
+            try:
+                os.unlink(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def get(self, job_id):
+        """Job pelo id, lido do arquivo (qualquer worker responde)"""
+        if len(job_id) != 32 or not all(c in '0123456789abcdef' for c in job_id):
+            return None
+        job = self._read(job_id)
+        if job is None or job['status'] not in ('pendente', 'executando'):
+            return job
+        # O processo que executava o job saiu (reinício, recarga) antes de concluir
+        if job['host'] == socket.gethostname() and not process_alive(job['pid']):
+            if os.path.exists(self.cache.path(job['key'])):
+                job.update(status='concluido')
+            else:
+                job.update(status='falhou', error='O servidor foi reiniciado antes de concluir o relatório')
+        return job
+
+    @staticmethod
+    def status(job):
+        return job['status']
+
+    def serialize(self, job):
+        data = {
+            'job_id': job['id'],
+            'status': job['status'],
+            'cached': job['cached'],
+            'params': job['params'],
+            'created_at': job['created_at']
+        }
+        if job['status'] == 'falhou':
+            data['error'] = job['error']
+        return data
+
+    def wait(self, job, timeout=None):
+        """Aguardar a conclusão do job (útil em benchmarks e scripts)"""
+        deadline = time.monotonic() + timeout if timeout else None
+        while self.status(self.get(job['id'])) in ('pendente', 'executando'):
+            if deadline and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+
+# Jobs de relatório da aplicação (configurados em main.py)
+report_jobs = ReportJobs()
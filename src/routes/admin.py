@@ -1,5 +1,18 @@
-from flask import Blueprint, request, jsonify, session
-from src.models.user import db, User, Plan
+from flask import Blueprint, request, jsonify, session, current_app, send_from_directory, url_for
+from src.models.user import db, User, Plan, FraudAlert, Subscription, PlanMigration
+from src.models.serializers import serialize_plan, serialize_fraud_alert
+from src.routes.auth import admin_required
+from src import analytics
+from src.forecast import demand_forecaster
+from src.bulk_import import import_jobs, IMPORT_ROLES
+from src.entitlements import entitlements
+from src import plan_migration
+from src.payments import payment_queue
+from src.admission import admission
+from src.profiler import profiler
+from src.tracing import tracer
+from src.kpis import kpis
+from datetime import datetime
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -43,7 +56,7 @@ def update_plan(plan_id):
         return jsonify({'error': 'Acesso restrito a administradores'}), 403
     
     plan = Plan.query.get(plan_id)
-    if not plan:
+    if not plan or plan.archived_at:
         return jsonify({'error': 'Plano não encontrado'}), 404
     
     data = request.get_json()
@@ -65,17 +78,11 @@ def update_plan(plan_id):
         plan.biscoito_quantity = int(data['biscoito_quantity'])
     
     db.session.commit()
+    entitlements.invalidate_plan(plan.id)
     
     return jsonify({
         'message': 'Plano atualizado com sucesso',
-        'plan': {
-            'id': plan.id,
-            'name': plan.name,
-            'description': plan.description,
-            'price': plan.price,
-            'matte_quantity': plan.matte_quantity,
-            'biscoito_quantity': plan.biscoito_quantity
-        }
+        'plan': serialize_plan(plan)
     }), 200
 
 @admin_bp.route('/delete_plan/<int:plan_id>', methods=['DELETE'])
@@ -86,11 +93,34 @@ def delete_plan(plan_id):
         return jsonify({'error': 'Acesso restrito a administradores'}), 403
     
     plan = Plan.query.get(plan_id)
-    if not plan:
+    if not plan or plan.archived_at:
         return jsonify({'error': 'Plano não encontrado'}), 404
     
+    # Assinaturas em vigor (as mesmas que a migração move) impedem a exclusão
+    if Subscription.query.filter(
+        Subscription.plan_id == plan.id,
+        Subscription.status.in_(plan_migration.MIGRATED_STATUSES)
+    ).first():
+        return jsonify({
+            'error': 'Plano possui assinaturas ativas ou pendentes. Migre os assinantes para outro plano antes de excluir'
+        }), 409
+    
+    # Assinaturas antigas e migrações ainda apontam para o plano: ele sai da lista
+    # de planos (arquivado) mas continua no histórico
+    referenced = Subscription.query.filter_by(plan_id=plan.id).first() or PlanMigration.query.filter(
+        (PlanMigration.from_plan_id == plan.id) | (PlanMigration.to_plan_id == plan.id)
+    ).first()
+    if referenced:
+        plan.archived_at = datetime.utcnow()
+        db.session.commit()
+        entitlements.invalidate_plan(plan_id)
+        return jsonify({
+            'message': 'Plano arquivado: não aparece mais para assinatura, mas continua no histórico'
+        }), 200
+    
     db.session.delete(plan)
     db.session.commit()
+    entitlements.invalidate_plan(plan_id)
     
     return jsonify({
         'message': 'Plano excluído com sucesso'
@@ -158,3 +188,297 @@ def create_first_admin():
         'message': 'Primeiro administrador criado com sucesso',
         'admin_id': new_admin.id
     }), 201
+
+def parse_months_arg(default=12, maximum=60):
+    """Ler o parâmetro months (quantidade de meses analisados)"""
+    try:
+        months = int(request.args.get('months', default))
+    except ValueError:
+        return None
+    if months < 1 or months > maximum:
+        return None
+    return months
+
+@admin_bp.route('/analytics/mrr', methods=['GET'])
+@admin_required
+def analytics_mrr():
+    """Receita mensal recorrente por plano e método de pagamento"""
+    months = parse_months_arg()
+    if months is None:
+        return jsonify({'error': 'Parâmetro months inválido (1 a 60)'}), 400
+    
+    start, end = analytics.month_range(months)
+    payments = analytics.load_payments(since=analytics.month_start(start))
+    
+    return jsonify(analytics.mrr(payments, start, end)), 200
+
+@admin_bp.route('/analytics/churn', methods=['GET'])
+@admin_required
+def analytics_churn():
+    """Churn mensal de assinaturas"""
+    months = parse_months_arg()
+    if months is None:
+        return jsonify({'error': 'Parâmetro months inválido (1 a 60)'}), 400
+    
+    start, end = analytics.month_range(months)
+    subscriptions = analytics.load_subscriptions()
+    
+    return jsonify(analytics.churn(subscriptions, start, end)), 200
+
+@admin_bp.route('/analytics/cohorts', methods=['GET'])
+@admin_required
+def analytics_cohorts():
+    """Retenção por coorte (mês do primeiro pagamento)"""
+    months = parse_months_arg()
+    if months is None:
+        return jsonify({'error': 'Parâmetro months inválido (1 a 60)'}), 400
+    
+    # Todos os pagamentos: a coorte é o mês do primeiro pagamento, mesmo antes do período
+    start, end = analytics.month_range(months)
+    payments = analytics.load_payments()
+    
+    return jsonify(analytics.cohort_retention(payments, start, end, max_offset=months)), 200
+
+@admin_bp.route('/analytics/redemptions', methods=['GET'])
+@admin_required
+def analytics_redemptions():
+    """Média de retiradas por assinante ativo em cada mês"""
+    months = parse_months_arg()
+    if months is None:
+        return jsonify({'error': 'Parâmetro months inválido (1 a 60)'}), 400
+    
+    start, end = analytics.month_range(months)
+    redemption_months = analytics.load_redemption_months(since=analytics.month_start(start))
+    subscriptions = analytics.load_subscriptions()
+    
+    return jsonify(analytics.redemptions_per_subscriber(redemption_months, subscriptions, start, end)), 200
+
+@admin_bp.route('/forecast', methods=['GET'])
+@admin_required
+def demand_forecast():
+    """Previsão de demanda da próxima semana por vendedor, dia e hora"""
+    vendor_id = request.args.get('vendor_id')
+    if vendor_id is not None:
+        try:
+            vendor_id = int(vendor_id)
+        except ValueError:
+            return jsonify({'error': 'ID de vendedor inválido'}), 400
+    
+    # Detalhe por hora só quando pedido (ou para um único vendedor)
+    hourly = request.args.get('hourly', '1' if vendor_id is not None else '0') == '1'
+    
+    demand_forecaster.refresh_if_stale()
+    
+    return jsonify(demand_forecaster.report(vendor_id=vendor_id, hourly=hourly)), 200
+
+@admin_bp.route('/fraud_alerts', methods=['GET'])
+@admin_required
+def list_fraud_alerts():
+    """Listar os alertas de uso suspeito mais recentes"""
+    try:
+        limit = min(int(request.args.get('limit', 100)), 1000)
+    except ValueError:
+        return jsonify({'error': 'Parâmetro limit inválido'}), 400
+    if limit < 1:
+        return jsonify({'error': 'Parâmetro limit inválido'}), 400
+    
+    query = FraudAlert.query
+    if request.args.get('kind'):
+        query = query.filter_by(kind=request.args['kind'])
+    
+    alerts = query.order_by(FraudAlert.id.desc()).limit(limit).all()
+    
+    return jsonify([serialize_fraud_alert(alert) for alert in alerts]), 200
+
+@admin_bp.route('/import/users', methods=['POST'])
+@admin_required
+def bulk_import_users():
+    """Importar usuários/vendedores em lote (corpo CSV ou NDJSON), em segundo plano"""
+    fmt = request.args.get('format')
+    if fmt is None:
+        fmt = 'csv' if 'csv' in (request.content_type or '') else 'ndjson'
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'Formato inválido. Use csv ou ndjson'}), 400
+    
+    role = request.args.get('role', 'vendedor')
+    if role not in IMPORT_ROLES:
+        return jsonify({'error': 'Papel inválido. Use cliente ou vendedor'}), 400
+    
+    if (request.content_length or 0) > current_app.config['IMPORT_MAX_BYTES']:
+        return jsonify({'error': 'Arquivo grande demais. Use o comando flask import-users'}), 413
+    
+    # O hash das senhas leva minutos em arquivos grandes: o arquivo é gravado e
+    # importado em segundo plano; o relatório por linha sai no job
+    try:
+        job = import_jobs.submit(session['user_id'], request.stream, fmt, default_role=role)
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 413
+    
+    data = import_jobs.serialize(job)
+    data['status_url'] = url_for('admin.bulk_import_status', job_id=job['id'])
+    return jsonify(data), 202
+
+@admin_bp.route('/import/users/<job_id>', methods=['GET'])
+@admin_required
+def bulk_import_status(job_id):
+    """Situação de uma importação e, quando concluída, o relatório por linha"""
+    job = import_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Importação não encontrada'}), 404
+    
+    return jsonify(import_jobs.serialize(job)), 200
+
+def serialize_plan_migration(migration):
+    return {
+        'id': migration.id,
+        'from_plan_id': migration.from_plan_id,
+        'to_plan_id': migration.to_plan_id,
+        'status': migration.status,
+        'running': plan_migration.is_running(migration),
+        'total': migration.total,
+        'migrated': migration.migrated,
+        'progress': round(migration.migrated / migration.total, 4) if migration.total else 1.0,
+        'last_subscription_id': migration.last_subscription_id,
+        'error': migration.error,
+        'created_at': migration.created_at,
+        'updated_at': migration.updated_at
+    }
+
+@admin_bp.route('/plan_migrations', methods=['POST'])
+@admin_required
+def create_plan_migration():
+    """Migrar todos os assinantes de um plano para outro, em lotes e em segundo plano"""
+    data = request.get_json()
+    
+    required_fields = ['from_plan_id', 'to_plan_id']
+    for field in required_fields:
+        if field not in data:
+            return jsonify({'error': f'Campo {field} é obrigatório'}), 400
+    
+    from_plan = Plan.query.get(data['from_plan_id'])
+    to_plan = Plan.query.get(data['to_plan_id'])
+    if not from_plan or not to_plan or to_plan.archived_at:
+        return jsonify({'error': 'Plano não encontrado'}), 404
+    if from_plan.id == to_plan.id:
+        return jsonify({'error': 'Planos de origem e destino devem ser diferentes'}), 400
+    
+    try:
+        batch_size = int(data.get('batch_size', plan_migration.DEFAULT_BATCH_SIZE))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'batch_size inválido'}), 400
+    if batch_size < 1 or batch_size > plan_migration.MAX_BATCH_SIZE:
+        return jsonify({'error': f'batch_size deve estar entre 1 e {plan_migration.MAX_BATCH_SIZE}'}), 400
+    
+    migration = plan_migration.start_migration(from_plan.id, to_plan.id, batch_size)
+    plan_migration.claim(migration.id)
+    plan_migration.run_in_background(current_app._get_current_object(), migration.id)
+    
+    return jsonify(serialize_plan_migration(migration)), 202
+
+@admin_bp.route('/plan_migrations/<int:migration_id>', methods=['GET'])
+@admin_required
+def get_plan_migration(migration_id):
+    """Progresso de uma migração de plano"""
+    migration = PlanMigration.query.get(migration_id)
+    if not migration:
+        return jsonify({'error': 'Migração não encontrada'}), 404
+    
+    return jsonify(serialize_plan_migration(migration)), 200
+
+@admin_bp.route('/plan_migrations/<int:migration_id>/resume', methods=['POST'])
+@admin_required
+def resume_plan_migration(migration_id):
+    """Retomar uma migração interrompida a partir do último lote concluído"""
+    migration = PlanMigration.query.get(migration_id)
+    if not migration:
+        return jsonify({'error': 'Migração não encontrada'}), 404
+    if migration.status == 'concluida':
+        return jsonify({'error': 'Migração já concluída'}), 400
+    # Reserva no banco: só um worker retoma, mesmo com pedidos simultâneos
+    if not plan_migration.claim(migration.id):
+        return jsonify({'error': 'Migração já está em execução'}), 409
+    
+    plan_migration.run_in_background(current_app._get_current_object(), migration.id)
+    
+    return jsonify(serialize_plan_migration(migration)), 202
+
+@admin_bp.route('/payments/reconcile', methods=['POST'])
+@admin_required
+def reconcile_payments():
+    """Conciliar pagamentos pendentes há mais de `older_than` segundos com o gateway"""
+    data = request.get_json(silent=True) or {}
+    
+    try:
+        older_than = int(data.get('older_than', 60))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'older_than inválido'}), 400
+    if older_than < 0:
+        return jsonify({'error': 'older_than deve ser positivo'}), 400
+    
+    if not payment_queue.configured:
+        return jsonify({'error': 'Gateway de pagamento não configurado'}), 503
+    
+    summary = payment_queue.reconcile(older_than)
+    summary['queued'] = payment_queue.pending()
+    
+    return jsonify(summary), 200
+
+@admin_bp.route('/lanes', methods=['GET'])
+@admin_required
+def lane_stats():
+    """Ocupação das faixas de prioridade (críticas x pesadas) neste processo"""
+    return jsonify(admission.stats()), 200
+
+@admin_bp.route('/profiler', methods=['GET'])
+@admin_required
+def profiler_status():
+    """Pedido em vigor (o mesmo em todos os workers), contadores deste worker (pid) e arquivos de pilhas de todos"""
+    return jsonify(profiler.status()), 200
+
+@admin_bp.route('/profiler', methods=['POST'])
+@admin_required
+def start_profiler():
+    """Perfilar uma fração das requisições de alguns endpoints por um tempo limitado, em todos os workers"""
+    data = request.get_json(silent=True) or {}
+    
+    error = profiler.set_targets(data.get('routes'), data.get('sample_rate', 0.1), data.get('duration', 300))
+    if error:
+        return jsonify({'error': error}), 400
+    
+    return jsonify(profiler.status()), 200
+
+@admin_bp.route('/profiler', methods=['DELETE'])
+@admin_required
+def stop_profiler():
+    """Desligar o profiler em todos os workers; cada um grava as amostras que coletou"""
+    profiler.disable()
+    return jsonify(profiler.status()), 200
+
+@admin_bp.route('/profiler/files/<name>', methods=['GET'])
+@admin_required
+def download_profile(name):
+    """Pilhas colapsadas de um endpoint em um worker (<endpoint>.<pid>.collapsed; entrada do flamegraph.pl / speedscope)"""
+    profiler.flush()
+    if name not in profiler.files():
+        return jsonify({'error': 'Arquivo de perfil não encontrado'}), 404
+    
+    return send_from_directory(current_app.config['PROFILER_DIR'], name, mimetype='text/plain', max_age=0)
+
+@admin_bp.route('/tracing', methods=['GET'])
+@admin_required
+def tracing_stats():
+    """Amostragem e exportação dos spans de tracing neste processo"""
+    return jsonify(tracer.stats()), 200
+
+@admin_bp.route('/overview', methods=['GET'])
+@admin_required
+def overview():
+    """Painel do admin: assinaturas ativas por plano, retiradas e produtos de hoje e receita do mês"""
+    return jsonify(kpis.overview()), 200
+
+@admin_bp.route('/overview/reconcile', methods=['POST'])
+@admin_required
+def reconcile_overview():
+    """Recalcular os indicadores do painel a partir das tabelas de origem agora"""
+    drift = kpis.reconcile()
+    return jsonify({'corrected': len(drift), 'drift': drift}), 200
@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify, session
 from werkzeug.security import generate_password_hash, check_password_hash
 from src.models.user import db, User, Subscription, Plan, QRCode
+from src.models.serializers import serialize_subscription
+from src.tracing import span
 import datetime
 import uuid
 
@@ -101,32 +103,23 @@ def get_profile():
         'username': user.username,
         'email': user.email,
         'role': user.role,
-        'created_at': user.created_at.isoformat(),
+        'created_at': user.created_at,
         'subscription': None
     }
     
     # Adicionar dados da assinatura se existir
     if subscription:
         plan = Plan.query.get(subscription.plan_id)
-        profile_data['subscription'] = {
-            'id': subscription.id,
-            'plan_name': plan.name,
-            'plan_description': plan.description,
-            'matte_quantity': plan.matte_quantity,
-            'biscoito_quantity': plan.biscoito_quantity,
-            'start_date': subscription.start_date.isoformat(),
-            'end_date': subscription.end_date.isoformat() if subscription.end_date else None,
-            'auto_renew': subscription.auto_renew,
-            'status': subscription.status
-        }
+        profile_data['subscription'] = serialize_subscription(subscription, plan)
     
     return jsonify(profile_data), 200
 
 # Middleware para verificar autenticação
 def auth_required(f):
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
-            return jsonify({'error': 'Não autorizado'}), 401
+        with span('auth.check'):
+            if 'user_id' not in session:
+                return jsonify({'error': 'Não autorizado'}), 401
         return f(*args, **kwargs)
     decorated_function.__name__ = f.__name__
     return decorated_function
@@ -134,10 +127,21 @@ def auth_required(f):
 # Middleware para verificar se o usuário é vendedor
 def vendor_required(f):
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
-            return jsonify({'error': 'Não autorizado'}), 401
-        if session.get('user_role') != 'vendedor':
-            return jsonify({'error': 'Acesso restrito a vendedores'}), 403
+        with span('auth.check'):
+            if 'user_id' not in session:
+                return jsonify({'error': 'Não autorizado'}), 401
+            if session.get('user_role') != 'vendedor':
+                return jsonify({'error': 'Acesso restrito a vendedores'}), 403
+        return f(*args, **kwargs)
+    decorated_function.__name__ = f.__name__
+    return decorated_function
+
+# Middleware para verificar se o usuário é administrador
+def admin_required(f):
+    def decorated_function(*args, **kwargs):
+        with span('auth.check'):
+            if session.get('user_role') != 'admin':
+                return jsonify({'error': 'Acesso restrito a administradores'}), 403
         return f(*args, **kwargs)
     decorated_function.__name__ = f.__name__
     return decorated_function
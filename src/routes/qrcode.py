@@ -1,7 +1,15 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, session, make_response, url_for
 from src.models.user import db, User, QRCode, Redemption, Subscription, Plan
+from src.models.serializers import serialize_redemption
 from src.routes.auth import auth_required, vendor_required
+from src.events import redemption_feed
+from src.fraud import redemption_detector
+from src.entitlements import entitlements
+from src.tracing import span
+from src.database import begin_write
+from src.kpis import kpis, redemption_deltas
 from datetime import datetime, timedelta
+from functools import lru_cache
 import uuid
 import qrcode
 import io
@@ -10,20 +18,131 @@ import os
 
 qrcode_bp = Blueprint('qrcode', __name__)
 
+# Formatos de imagem suportados ('none' omite a imagem da resposta JSON)
+QR_IMAGE_FORMATS = ('png', 'svg', 'matrix')
+QR_DEFAULT_BOX_SIZE = 10
+QR_MAX_BOX_SIZE = 40
+QR_BORDER = 4
+
+@lru_cache(maxsize=4096)
+def qr_matrix(code):
+    """Calcular a matriz de módulos do QR code (com borda), em cache por código"""
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=1,
+        border=QR_BORDER,
+    )
+    qr.add_data(code)
+    qr.make(fit=True)
+    return tuple(tuple(row) for row in qr.get_matrix())
+
+def render_qr_png(code, box_size=QR_DEFAULT_BOX_SIZE):
+    """Renderizar o QR code como PNG de 1 bit"""
+    from PIL import Image
+
+    matrix = qr_matrix(code)
+    n = len(matrix)
+    img = Image.new('1', (n, n))
+    img.putdata([0 if module else 255 for row in matrix for module in row])
+    if box_size > 1:
+        img = img.resize((n * box_size, n * box_size), Image.NEAREST)
+
+    buffered = io.BytesIO()
+    img.save(buffered, format='PNG', optimize=True)
+    return buffered.getvalue()
+
+def render_qr_svg(code, box_size=QR_DEFAULT_BOX_SIZE):
+    """Renderizar o QR code como SVG compacto (um único path com as sequências de módulos)"""
+    matrix = qr_matrix(code)
+    n = len(matrix)
+    parts = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < n:
+            if row[x]:
+                start = x
+                while x < n and row[x]:
+                    x += 1
+                parts.append(f'M{start} {y}h{x - start}v1h-{x - start}z')
+            else:
+                x += 1
+
+    side = n * box_size
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{side}" height="{side}" '
+        f'viewBox="0 0 {n} {n}" shape-rendering="crispEdges">'
+        f'<rect width="{n}" height="{n}" fill="#fff"/>'
+        f'<path d="{"".join(parts)}"/></svg>'
+    )
+
+def pack_qr_matrix(code):
+    """Empacotar a matriz em bits (linha a linha, 1 = módulo escuro) para desenho no cliente"""
+    matrix = qr_matrix(code)
+    n = len(matrix)
+    packed = bytearray((n * n + 7) // 8)
+    i = 0
+    for row in matrix:
+        for module in row:
+            if module:
+                packed[i >> 3] |= 0x80 >> (i & 7)
+            i += 1
+
+    return {
+        'size': n,
+        'border': QR_BORDER,
+        'modules': base64.b64encode(bytes(packed)).decode()
+    }
+
+def parse_qr_image_args(default_format):
+    """Ler e validar os parâmetros format/size da requisição"""
+    image_format = request.args.get('format', default_format)
+    if image_format not in QR_IMAGE_FORMATS and image_format != 'none':
+        return None, None, (jsonify({'error': 'Formato inválido. Use png, svg, matrix ou none'}), 400)
+
+    try:
+        box_size = int(request.args.get('size', QR_DEFAULT_BOX_SIZE))
+    except ValueError:
+        return None, None, (jsonify({'error': 'Tamanho inválido'}), 400)
+
+    if box_size < 1 or box_size > QR_MAX_BOX_SIZE:
+        return None, None, (jsonify({'error': f'Tamanho deve estar entre 1 e {QR_MAX_BOX_SIZE}'}), 400)
+
+    return image_format, box_size, None
+
+def add_qr_image(qr_data, code, image_format, box_size):
+    """Adicionar a imagem do QR code na resposta JSON conforme o formato pedido"""
+    qr_data['qr_image_url'] = url_for('qrcode.qrcode_image', code=code)
+
+    with span('qrcode.render', format=image_format, size=box_size):
+        if image_format == 'png':
+            img_str = base64.b64encode(render_qr_png(code, box_size)).decode()
+            qr_data['qr_image'] = f"data:image/png;base64,{img_str}"
+        elif image_format == 'svg':
+            qr_data['qr_svg'] = render_qr_svg(code, box_size)
+        elif image_format == 'matrix':
+            qr_data['qr_matrix'] = pack_qr_matrix(code)
+
+    return qr_data
+
 @qrcode_bp.route('/generate', methods=['GET'])
 @auth_required
 def generate_qrcode():
     """Gerar QR code para o usuário logado"""
     user_id = session['user_id']
+
+    # Formato da imagem (padrão: PNG em base64, compatível com clientes antigos)
+    image_format, box_size, error = parse_qr_image_args('png')
+    if error:
+        return error
     
     # Verificar se o usuário tem uma assinatura ativa
-    subscription = Subscription.query.filter_by(user_id=user_id, status='ativo').first()
-    if not subscription:
+    plan = entitlements.get(user_id)
+    if not plan:
         return jsonify({'error': 'Você não possui uma assinatura ativa'}), 400
     
     # Verificar se o plano existe
-    plan = Plan.query.get(subscription.plan_id)
-    if not plan:
+    if plan.plan_name is None:
         return jsonify({'error': 'Plano não encontrado'}), 404
     
     # Verificar se já existe um QR code válido para hoje
@@ -59,7 +178,7 @@ def generate_qrcode():
         # Retornar QR code existente com informações de uso
         qr_data = {
             'code': existing_qrcode.code,
-            'valid_until': today_end.isoformat(),
+            'valid_until': today_end,
             'matte_redeemed': total_matte_redeemed,
             'matte_remaining': plan.matte_quantity - total_matte_redeemed,
             'biscoito_redeemed': total_biscoito_redeemed,
@@ -67,23 +186,7 @@ def generate_qrcode():
         }
         
         # Gerar imagem do QR code
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(existing_qrcode.code)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Converter para base64
-        buffered = io.BytesIO()
-        img.save(buffered)
-        img_str = base64.b64encode(buffered.getvalue()).decode()
-        
-        qr_data['qr_image'] = f"data:image/png;base64,{img_str}"
+        add_qr_image(qr_data, existing_qrcode.code, image_format, box_size)
         
         return jsonify(qr_data), 200
     
@@ -100,30 +203,61 @@ def generate_qrcode():
     db.session.add(new_qrcode)
     db.session.commit()
     
+    qr_data = {
+        'code': new_code,
+        'valid_until': valid_until,
+        'matte_remaining': plan.matte_quantity,
+        'biscoito_remaining': plan.biscoito_quantity
+    }
+    
     # Gerar imagem do QR code
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(new_code)
-    qr.make(fit=True)
+    add_qr_image(qr_data, new_code, image_format, box_size)
     
-    img = qr.make_image(fill_color="black", back_color="white")
+    return jsonify(qr_data), 201
+
+@qrcode_bp.route('/image/<code>', methods=['GET'])
+@auth_required
+def qrcode_image(code):
+    """Obter a imagem do QR code do usuário logado (png, svg ou matriz de bits)"""
+    image_format, box_size, error = parse_qr_image_args('png')
+    if error:
+        return error
     
-    # Converter para base64
-    buffered = io.BytesIO()
-    img.save(buffered)
-    img_str = base64.b64encode(buffered.getvalue()).decode()
+    if image_format == 'none':
+        return jsonify({'error': 'Formato inválido. Use png, svg ou matrix'}), 400
     
-    return jsonify({
-        'code': new_code,
-        'valid_until': valid_until.isoformat(),
-        'matte_remaining': plan.matte_quantity,
-        'biscoito_remaining': plan.biscoito_quantity,
-        'qr_image': f"data:image/png;base64,{img_str}"
-    }), 201
+    qrcode_obj = QRCode.query.filter_by(code=code, user_id=session['user_id']).first()
+    if not qrcode_obj:
+        return jsonify({'error': 'QR code não encontrado'}), 404
+    
+    # A imagem de um código nunca muda: pode ficar em cache até o fim da validade
+    now = datetime.utcnow()
+    max_age = 0
+    if qrcode_obj.valid_until:
+        max_age = max(int((qrcode_obj.valid_until - now).total_seconds()), 0)
+    
+    # O ETag sai só dos parâmetros: a revalidação (304) não paga a renderização
+    etag = f'{code}-{image_format}-{box_size}'
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+    else:
+        with span('qrcode.render', format=image_format, size=box_size):
+            if image_format == 'png':
+                response = make_response(render_qr_png(code, box_size))
+                response.mimetype = 'image/png'
+            elif image_format == 'svg':
+                response = make_response(render_qr_svg(code, box_size))
+                response.mimetype = 'image/svg+xml'
+            else:
+                response = jsonify(pack_qr_matrix(code))
+    
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.max_age = max_age
+    if qrcode_obj.valid_until:
+        response.expires = qrcode_obj.valid_until
+    
+    return response.make_conditional(request)
 
 @qrcode_bp.route('/validate', methods=['POST'])
 @vendor_required
@@ -139,35 +273,43 @@ def validate_qrcode():
     if 'matte_quantity' not in data or 'biscoito_quantity' not in data:
         return jsonify({'error': 'Quantidades de matte e biscoito são obrigatórias'}), 400
     
-    # Buscar QR code pelo código
-    qrcode_obj = QRCode.query.filter_by(code=data['code']).first()
-    
-    if not qrcode_obj:
-        return jsonify({'error': 'QR code inválido'}), 404
-    
-    # Verificar se o QR code ainda é válido
-    now = datetime.utcnow()
-    if qrcode_obj.valid_until and now > qrcode_obj.valid_until:
-        return jsonify({'error': 'QR code expirado'}), 400
-    
-    # Buscar usuário e assinatura
-    user = User.query.get(qrcode_obj.user_id)
-    if not user:
-        return jsonify({'error': 'Usuário não encontrado'}), 404
-    
-    subscription = Subscription.query.filter_by(user_id=user.id, status='ativo').first()
-    if not subscription:
-        return jsonify({'error': 'Usuário não possui assinatura ativa'}), 400
+    # Buscar QR code, usuário e plano
+    with span('qrcode.lookup'):
+        qrcode_obj = QRCode.query.filter_by(code=data['code']).with_for_update().first()
+        
+        if not qrcode_obj:
+            return jsonify({'error': 'QR code inválido'}), 404
+        
+        # Verificar se o QR code ainda é válido
+        now = datetime.utcnow()
+        if qrcode_obj.valid_until and now > qrcode_obj.valid_until:
+            return jsonify({'error': 'QR code expirado'}), 400
+        
+        # Buscar usuário e assinatura
+        user = User.query.get(qrcode_obj.user_id)
+        if not user:
+            return jsonify({'error': 'Usuário não encontrado'}), 404
+        
+        # Direto no banco: um cancelamento feito em outro worker vale na hora
+        plan = entitlements.load(user.id)
+        if not plan:
+            return jsonify({'error': 'Usuário não possui assinatura ativa'}), 400
+        
+        if plan.plan_name is None:
+            return jsonify({'error': 'Plano não encontrado'}), 404
     
-    plan = Plan.query.get(subscription.plan_id)
-    if not plan:
-        return jsonify({'error': 'Plano não encontrado'}), 404
+    # Soma do saldo e gravação da retirada sob a mesma trava de escrita: duas validações
+    # simultâneas do mesmo código não podem aprovar juntas além do saldo
+    begin_write(db.session)
     
     # Verificar resgates anteriores para hoje
-    redemptions = Redemption.query.filter_by(qr_code_id=qrcode_obj.id).all()
-    
-    total_matte_redeemed = sum(r.matte_quantity for r in redemptions)
-    total_biscoito_redeemed = sum(r.biscoito_quantity for r in redemptions)
+    with span('redemption.sum'):
+        # Leitura com trava (no MySQL uma leitura simples viria do snapshot da transação,
+        # de antes de esperar pela trava do QR code, e não veria a retirada concorrente)
+        redemptions = Redemption.query.filter_by(qr_code_id=qrcode_obj.id).with_for_update().all()
+        
+        total_matte_redeemed = sum(r.matte_quantity for r in redemptions)
+        total_biscoito_redeemed = sum(r.biscoito_quantity for r in redemptions)
     
     # Verificar se as quantidades solicitadas estão disponíveis
     matte_requested = int(data['matte_quantity'])
@@ -200,8 +342,19 @@ def validate_qrcode():
         biscoito_quantity=biscoito_requested
     )
     
-    db.session.add(new_redemption)
-    db.session.commit()
+    with span('redemption.commit'):
+        db.session.add(new_redemption)
+        db.session.flush()
+        kpis.add(redemption_deltas(new_redemption))
+        db.session.commit()
+    
+    # Detectar uso suspeito (mesmo código em vários vendedores, rajadas de leitura) só com
+    # a retirada gravada: uma validação desfeita não entra no histórico do detector
+    if redemption_detector.record(new_redemption):
+        db.session.commit()
+    
+    # Avisar os dashboards abertos (SSE): o feed publica as retiradas novas na hora
+    redemption_feed.notify()
     
     # Calcular quantidades restantes
     matte_remaining = matte_available - matte_requested
@@ -211,12 +364,12 @@ def validate_qrcode():
         'message': 'Retirada registrada com sucesso',
         'redemption_id': new_redemption.id,
         'user': user.username,
-        'plan': plan.name,
+        'plan': plan.plan_name,
         'matte_redeemed': matte_requested,
         'matte_remaining': matte_remaining,
         'biscoito_redeemed': biscoito_requested,
         'biscoito_remaining': biscoito_remaining,
-        'redeemed_at': new_redemption.redeemed_at.isoformat()
+        'redeemed_at': new_redemption.redeemed_at
     }), 201
 
 @qrcode_bp.route('/redemptions', methods=['GET'])
@@ -252,22 +405,17 @@ def get_redemptions():
         qrcode_obj = QRCode.query.get(redemption.qr_code_id)
         user = User.query.get(qrcode_obj.user_id) if qrcode_obj else None
         
-        redemption_data = {
-            'id': redemption.id,
-            'user': user.username if user else 'Usuário não encontrado',
-            'matte_quantity': redemption.matte_quantity,
-            'biscoito_quantity': redemption.biscoito_quantity,
-            'redeemed_at': redemption.redeemed_at.isoformat()
-        }
-        
-        redemption_list.append(redemption_data)
+        redemption_list.append(serialize_redemption(
+            redemption,
+            username=user.username if user else 'Usuário não encontrado'
+        ))
     
     # Calcular totais
     total_matte = sum(r.matte_quantity for r in redemptions)
     total_biscoito = sum(r.biscoito_quantity for r in redemptions)
     
     return jsonify({
-        'date': target_date.isoformat(),
+        'date': target_date,
         'total_redemptions': len(redemptions),
         'total_matte': total_matte,
         'total_biscoito': total_biscoito,
@@ -1,6 +1,10 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, session, current_app
 from src.models.user import db, Plan, Subscription, Payment, User
+from src.models.serializers import serialize_plan, serialize_payment
 from src.routes.auth import auth_required
+from src.entitlements import entitlements
+from src.payments import payment_queue
+from src.kpis import kpis, active_key
 from datetime import datetime, timedelta
 import uuid
 
@@ -9,18 +13,8 @@ subscription_bp = Blueprint('subscription', __name__)
 @subscription_bp.route('/plans', methods=['GET'])
 def get_plans():
     """Obter todos os planos disponíveis"""
-    plans = Plan.query.all()
-    plans_data = []
-    
-    for plan in plans:
-        plans_data.append({
-            'id': plan.id,
-            'name': plan.name,
-            'description': plan.description,
-            'price': plan.price,
-            'matte_quantity': plan.matte_quantity,
-            'biscoito_quantity': plan.biscoito_quantity
-        })
+    plans = Plan.query.filter(Plan.archived_at.is_(None)).all()
+    plans_data = [serialize_plan(plan) for plan in plans]
     
     return jsonify(plans_data), 200
 
@@ -42,24 +36,33 @@ def subscribe():
     if data['payment_method'] not in ['cartao', 'pix']:
         return jsonify({'error': 'Método de pagamento inválido. Use "cartao" ou "pix"'}), 400
     
+    # Sem gateway configurado não há como cobrar: nada é gravado
+    if not payment_queue.configured:
+        return jsonify({'error': 'Pagamentos indisponíveis no momento'}), 503
+    
     # Buscar o plano pelo ID
     plan = Plan.query.get(data['plan_id'])
-    if not plan:
+    if not plan or plan.archived_at:
         return jsonify({'error': 'Plano não encontrado'}), 404
     
-    # Verificar se o usuário já tem uma assinatura ativa
+    # Verificar se o usuário já tem uma assinatura ativa (ou aguardando pagamento)
     user_id = session['user_id']
-    active_subscription = Subscription.query.filter_by(user_id=user_id, status='ativo').first()
+    active_subscription = Subscription.query.filter(
+        Subscription.user_id == user_id,
+        Subscription.status.in_(['ativo', 'pendente'])
+    ).first()
     
     if active_subscription:
+        if active_subscription.status == 'pendente':
+            return jsonify({'error': 'Você já possui uma assinatura aguardando pagamento'}), 400
         return jsonify({'error': 'Você já possui uma assinatura ativa'}), 400
     
-    # Criar nova assinatura
+    # Criar nova assinatura (ativada quando o pagamento for aprovado)
     end_date = datetime.utcnow() + timedelta(days=30)  # Assinatura válida por 30 dias
     new_subscription = Subscription(
         user_id=user_id,
         plan_id=plan.id,
-        status='ativo',
+        status='pendente',
         start_date=datetime.utcnow(),
         end_date=end_date,
         auto_renew=True
@@ -74,21 +77,41 @@ def subscribe():
         subscription_id=new_subscription.id,
         amount=plan.price,
         payment_method=data['payment_method'],
-        status='aprovado',  # Simulando pagamento aprovado
+        status='pendente',
         transaction_id=transaction_id
     )
     
     db.session.add(new_payment)
     db.session.commit()
     
-    return jsonify({
-        'message': 'Assinatura realizada com sucesso',
+    response = {
         'subscription_id': new_subscription.id,
         'plan_name': plan.name,
         'amount': plan.price,
         'payment_method': data['payment_method'],
         'transaction_id': transaction_id,
-        'valid_until': end_date.isoformat()
+        'valid_until': end_date
+    }
+    
+    # Cobrança em segundo plano: a resposta não espera o gateway
+    if current_app.config.get('PAYMENT_PIPELINE', True):
+        payment_queue.enqueue(new_payment.id)
+        return jsonify({
+            'message': 'Assinatura recebida. Pagamento em processamento',
+            'status': 'pendente',
+            **response
+        }), 202
+    
+    status = payment_queue.process(new_payment.id)
+    if status != 'aprovado':
+        return jsonify({'error': 'Pagamento recusado', **response}), 402
+    
+    db.session.refresh(new_subscription)
+    response['valid_until'] = new_subscription.end_date
+    return jsonify({
+        'message': 'Assinatura realizada com sucesso',
+        'status': 'ativo',
+        **response
     }), 201
 
 @subscription_bp.route('/cancel', methods=['POST'])
@@ -106,7 +129,9 @@ def cancel_subscription():
     # Cancelar assinatura
     subscription.status = 'cancelado'
     subscription.auto_renew = False
+    kpis.add({active_key(subscription.plan_id): -1})
     db.session.commit()
+    entitlements.invalidate_user(user_id)
     
     return jsonify({
         'message': 'Assinatura cancelada com sucesso',
@@ -153,27 +178,21 @@ def payment_history():
         return jsonify([]), 200
     
     # Coletar IDs das assinaturas
-    subscription_ids = [sub.id for sub in subscriptions]
+    subscriptions_by_id = {sub.id: sub for sub in subscriptions}
+    subscription_ids = list(subscriptions_by_id)
     
     # Buscar pagamentos relacionados às assinaturas
     payments = Payment.query.filter(Payment.subscription_id.in_(subscription_ids)).order_by(Payment.created_at.desc()).all()
     
     payment_history = []
     for payment in payments:
-        subscription = next((sub for sub in subscriptions if sub.id == payment.subscription_id), None)
+        subscription = subscriptions_by_id.get(payment.subscription_id)
         plan = Plan.query.get(subscription.plan_id) if subscription else None
         
-        payment_data = {
-            'id': payment.id,
-            'amount': payment.amount,
-            'payment_method': payment.payment_method,
-            'status': payment.status,
-            'transaction_id': payment.transaction_id,
-            'created_at': payment.created_at.isoformat(),
-            'plan_name': plan.name if plan else 'Plano não encontrado',
-            'subscription_status': subscription.status if subscription else 'N/A'
-        }
-        
-        payment_history.append(payment_data)
+        payment_history.append(serialize_payment(
+            payment,
+            plan_name=plan.name if plan else 'Plano não encontrado',
+            subscription_status=subscription.status if subscription else 'N/A'
+        ))
     
     return jsonify(payment_history), 200
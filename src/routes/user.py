@@ -1,39 +1,139 @@
 from flask import Blueprint, jsonify, request
-from src.models.user import User, db
+from sqlalchemy import exists, or_, select, union
+from werkzeug.security import generate_password_hash
+from src.models.user import User, Subscription, QRCode, Redemption, FraudAlert, db
+from src.models.serializers import serialize_user
+from src.routes.auth import admin_required
+from src.bulk_import import IMPORT_ROLES
 
 user_bp = Blueprint('user', __name__)
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
 @user_bp.route('/users', methods=['GET'])
+@admin_required
 def get_users():
-    users = User.query.all()
-    return jsonify([user.to_dict() for user in users])
+    """Diretório de usuários (apenas para administradores), paginado por chave"""
+    try:
+        limit = min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        after_id = int(request.args.get('after_id', 0))
+    except ValueError:
+        return jsonify({'error': 'Parâmetros limit/after_id inválidos'}), 400
+    if limit < 1:
+        return jsonify({'error': 'Parâmetros limit/after_id inválidos'}), 400
+    
+    # Apenas as colunas exibidas (sem o hash da senha)
+    query = db.session.query(User.id, User.username, User.email, User.role, User.created_at)
+    query = query.filter(User.id > after_id)
+    
+    role = request.args.get('role')
+    if role:
+        query = query.filter(User.role == role)
+    
+    # Busca por prefixo de nome de usuário ou email, como intervalo [prefixo, próximo prefixo)
+    # para usar os índices únicos das colunas (LIKE no SQLite não usa índice)
+    prefix = request.args.get('q', '').strip()
+    if prefix:
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        matches = union(
+            select(User.id).where(User.username >= prefix, User.username < upper),
+            select(User.id).where(User.email >= prefix, User.email < upper)
+        )
+        query = query.filter(User.id.in_(matches))
+    
+    subscription_status = request.args.get('subscription_status')
+    if subscription_status == 'sem_assinatura':
+        query = query.filter(~exists().where(Subscription.user_id == User.id))
+    elif subscription_status:
+        query = query.filter(exists().where(
+            Subscription.user_id == User.id,
+            Subscription.status == subscription_status
+        ))
+    
+    rows = query.order_by(User.id).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    return jsonify({
+        'users': [serialize_user(row) for row in rows],
+        'next_after_id': rows[-1].id if has_more else None
+    }), 200
 
 @user_bp.route('/users', methods=['POST'])
+@admin_required
 def create_user():
+    """Criar um usuário (cliente ou vendedor)"""
+    data = request.get_json()
     
-    data = request.json
-    user = User(username=data['username'], email=data['email'])
+    required_fields = ['username', 'email', 'password']
+    for field in required_fields:
+        if field not in data:
+            return jsonify({'error': f'Campo {field} é obrigatório'}), 400
+    
+    # Administradores só por promoção (promote_to_admin)
+    role = data.get('role', 'cliente')
+    if role not in IMPORT_ROLES:
+        return jsonify({'error': f'Papel inválido. Use {" ou ".join(IMPORT_ROLES)}'}), 400
+    
+    if User.query.filter(or_(User.username == data['username'], User.email == data['email'])).first():
+        return jsonify({'error': 'Nome de usuário ou email já existe'}), 400
+    
+    user = User(
+        username=data['username'],
+        email=data['email'],
+        password=generate_password_hash(data['password']),
+        role=role
+    )
     db.session.add(user)
     db.session.commit()
-    return jsonify(user.to_dict()), 201
+    return jsonify(serialize_user(user)), 201
 
 @user_bp.route('/users/<int:user_id>', methods=['GET'])
+@admin_required
 def get_user(user_id):
+    """Obter os dados de um usuário"""
     user = User.query.get_or_404(user_id)
-    return jsonify(user.to_dict())
+    return jsonify(serialize_user(user))
 
 @user_bp.route('/users/<int:user_id>', methods=['PUT'])
+@admin_required
 def update_user(user_id):
+    """Atualizar nome de usuário e email"""
     user = User.query.get_or_404(user_id)
-    data = request.json
-    user.username = data.get('username', user.username)
-    user.email = data.get('email', user.email)
+    data = request.get_json()
+    
+    username = data.get('username', user.username)
+    email = data.get('email', user.email)
+    if User.query.filter(
+        User.id != user.id,
+        or_(User.username == username, User.email == email)
+    ).first():
+        return jsonify({'error': 'Nome de usuário ou email já existe'}), 400
+    
+    user.username = username
+    user.email = email
     db.session.commit()
-    return jsonify(user.to_dict())
+    return jsonify(serialize_user(user))
 
 @user_bp.route('/users/<int:user_id>', methods=['DELETE'])
+@admin_required
 def delete_user(user_id):
+    """Excluir um usuário sem histórico no sistema"""
     user = User.query.get_or_404(user_id)
+    
+    # Assinaturas, QR codes, retiradas e alertas guardam o usuário: não excluir
+    referenced = db.session.query(
+        exists().where(Subscription.user_id == user.id)
+        | exists().where(QRCode.user_id == user.id)
+        | exists().where(Redemption.vendor_id == user.id)
+        | exists().where(FraudAlert.vendor_id == user.id)
+    ).scalar()
+    if referenced:
+        return jsonify({
+            'error': 'Usuário possui assinaturas, QR codes ou retiradas registradas e não pode ser excluído'
+        }), 409
+    
     db.session.delete(user)
     db.session.commit()
     return '', 204
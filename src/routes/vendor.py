@@ -1,7 +1,13 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, session, current_app, Response, url_for
+from sqlalchemy import func
 from src.models.user import db, User, Redemption
+from src.models.serializers import serialize_user
 from src.routes.auth import auth_required, vendor_required
+from src.events import dashboard_events, redemption_feed, stream_slots, vendor_channel
+from src.reports import report_jobs, report_key, is_closed
 from datetime import datetime, timedelta
+import gzip
+import time
 import uuid
 
 vendor_bp = Blueprint('vendor', __name__)
@@ -58,15 +64,7 @@ def list_vendors():
     
     vendors = User.query.filter_by(role='vendedor').all()
     
-    vendor_list = []
-    for vendor in vendors:
-        vendor_data = {
-            'id': vendor.id,
-            'username': vendor.username,
-            'email': vendor.email,
-            'created_at': vendor.created_at.isoformat()
-        }
-        vendor_list.append(vendor_data)
+    vendor_list = [serialize_user(vendor) for vendor in vendors]
     
     return jsonify(vendor_list), 200
 
@@ -130,7 +128,7 @@ def vendor_dashboard():
         day_biscoito = sum(r.biscoito_quantity for r in day_redemptions)
         
         daily_data.append({
-            'date': target_date.isoformat(),
+            'date': target_date,
             'matte': day_matte,
             'biscoito': day_biscoito,
             'total_redemptions': len(day_redemptions)
@@ -138,21 +136,21 @@ def vendor_dashboard():
     
     return jsonify({
         'today': {
-            'date': today.isoformat(),
+            'date': today,
             'total_redemptions': len(today_redemptions),
             'matte': today_matte,
             'biscoito': today_biscoito
         },
         'week': {
-            'start_date': start_of_week.date().isoformat(),
-            'end_date': today.isoformat(),
+            'start_date': start_of_week.date(),
+            'end_date': today,
             'total_redemptions': len(week_redemptions),
             'matte': week_matte,
             'biscoito': week_biscoito
         },
         'month': {
-            'start_date': start_of_month.date().isoformat(),
-            'end_date': today.isoformat(),
+            'start_date': start_of_month.date(),
+            'end_date': today,
             'total_redemptions': len(month_redemptions),
             'matte': month_matte,
             'biscoito': month_biscoito
@@ -160,17 +158,133 @@ def vendor_dashboard():
         'daily_chart': daily_data
     }), 200
 
-@vendor_bp.route('/reports', methods=['GET'])
-@auth_required
-def vendor_reports():
-    """Obter relatórios de vendedores (para administradores) ou do próprio vendedor"""
+def today_totals(vendor_id):
+    """Totais de hoje do vendedor em uma única consulta agregada"""
+    today = datetime.utcnow().date()
+    start_of_today = datetime.combine(today, datetime.min.time())
+    
+    total, matte, biscoito, last_id = db.session.query(
+        func.count(Redemption.id),
+        func.coalesce(func.sum(Redemption.matte_quantity), 0),
+        func.coalesce(func.sum(Redemption.biscoito_quantity), 0),
+        func.max(Redemption.id)
+    ).filter(
+        Redemption.vendor_id == vendor_id,
+        Redemption.redeemed_at >= start_of_today,
+        Redemption.redeemed_at < start_of_today + timedelta(days=1)
+    ).one()
+    
+    return {
+        'date': today,
+        'total_redemptions': total,
+        'matte': int(matte),
+        'biscoito': int(biscoito),
+        'last_redemption_id': last_id or 0
+    }
+
+@vendor_bp.route('/dashboard/stream', methods=['GET'])
+@vendor_required
+def vendor_dashboard_stream():
+    """Stream (Server-Sent Events) com as retiradas de hoje do vendedor, em tempo real.
+
+    As retiradas chegam pelo broker do processo, alimentado pelo
+    redemption_feed com as gravações de qualquer worker; o stream não
+    consulta o banco depois do snapshot. Cada stream ocupa uma thread do
+    worker: no máximo `VENDOR_STREAM_MAX_PER_WORKER` por processo (padrão:
+    metade das threads).
+    """
+    # HEAD nunca lê o corpo: o stream não começaria e a vaga ficaria presa
+    if request.method != 'GET':
+        response = jsonify({'error': 'Use GET para abrir o stream'})
+        response.headers['Allow'] = 'GET'
+        return response, 405
+    
+    vendor_id = session['user_id']
+    config = current_app.config
+    
+    max_streams = config.get('VENDOR_STREAM_MAX_PER_WORKER') or max(config.get('SERVER_THREADS', 8) // 2, 1)
+    if not stream_slots.acquire(max_streams):
+        response = jsonify({'error': 'Servidor sem capacidade para novos streams. Tente novamente'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    
+    # Assinar antes de ler os totais para não perder retiradas entre as duas etapas
+    subscription = dashboard_events.subscribe(vendor_channel(vendor_id))
+    if subscription is None:
+        stream_slots.release()
+        return jsonify({'error': 'Muitas conexões abertas para este vendedor'}), 429
+    
+    def release():
+        subscription.close()
+        stream_slots.release()
+    
+    try:
+        redemption_feed.watch(current_app._get_current_object())
+        totals = today_totals(vendor_id)
+    except Exception:
+        release()
+        raise
+    
+    heartbeat = config.get('VENDOR_STREAM_HEARTBEAT', 15)
+    max_age = config.get('VENDOR_STREAM_MAX_AGE', 600)
+    dumps = current_app.json.dumps
+    
+    def event(name, data):
+        return f'event: {name}\ndata: {dumps(data)}\n\n'
+    
+    def generate():
+        yield 'retry: 3000\n\n'
+        yield event('snapshot', totals)
+        
+        # Conexão encerrada periodicamente; o EventSource reconecta sozinho
+        deadline = time.monotonic() + max_age
+        while time.monotonic() < deadline:
+            update = subscription.get(heartbeat)
+            
+            if subscription.take_lagged():
+                # Eventos descartados: o cliente deve reconectar e receber um novo snapshot
+                yield event('resync', {'reason': 'lagged'})
+                return
+            
+            if update is None:
+                yield ': heartbeat\n\n'
+                continue
+            
+            # Retirada já contada no snapshot
+            if update['redemption_id'] <= totals['last_redemption_id']:
+                continue
+            
+            # Virada do dia: os totais recomeçam do zero
+            if update['date'] != totals['date']:
+                totals.update(date=update['date'], total_redemptions=0, matte=0, biscoito=0)
+            
+            totals['total_redemptions'] += 1
+            totals['matte'] += update['matte']
+            totals['biscoito'] += update['biscoito']
+            totals['last_redemption_id'] = update['redemption_id']
+            
+            yield event('redemption', {'delta': update, 'today': totals})
+    
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Chamado pelo servidor ao fechar a resposta, mesmo se o gerador nunca tiver começado
+    response.call_on_close(release)
+    return response
+
+def parse_report_params(params):
+    """Ler período e vendedor do relatório; devolve (início, fim, vendor_id) ou uma resposta de erro.
+
+    vendor_id None significa todos os vendedores (apenas para administradores).
+    """
     user_id = session['user_id']
     user_role = session.get('user_role')
     
     # Parâmetros de filtro
-    start_date_str = request.args.get('start_date')
-    end_date_str = request.args.get('end_date')
-    vendor_id_str = request.args.get('vendor_id')
+    start_date_str = params.get('start_date')
+    end_date_str = params.get('end_date')
+    vendor_id_str = params.get('vendor_id')
     
     # Converter datas
     try:
@@ -188,83 +302,118 @@ def vendor_reports():
         else:
             # Padrão: data atual
             end_datetime = datetime.combine(datetime.utcnow().date(), datetime.min.time()) + timedelta(days=1)
-    except ValueError:
-        return jsonify({'error': 'Formato de data inválido. Use YYYY-MM-DD'}), 400
+    except (TypeError, ValueError):
+        return None, (jsonify({'error': 'Formato de data inválido. Use YYYY-MM-DD'}), 400)
     
     # Filtrar por vendedor específico ou todos (apenas para admin)
     if user_role == 'admin':
         if vendor_id_str:
             try:
                 vendor_id = int(vendor_id_str)
-                # Verificar se o vendedor existe
-                vendor = User.query.filter_by(id=vendor_id, role='vendedor').first()
-                if not vendor:
-                    return jsonify({'error': 'Vendedor não encontrado'}), 404
-                
-                vendors = [vendor]
-            except ValueError:
-                return jsonify({'error': 'ID de vendedor inválido'}), 400
+            except (TypeError, ValueError):
+                return None, (jsonify({'error': 'ID de vendedor inválido'}), 400)
+            
+            # Verificar se o vendedor existe
+            if not User.query.filter_by(id=vendor_id, role='vendedor').first():
+                return None, (jsonify({'error': 'Vendedor não encontrado'}), 404)
         else:
             # Todos os vendedores
-            vendors = User.query.filter_by(role='vendedor').all()
+            vendor_id = None
     else:
         # Vendedor só pode ver seus próprios relatórios
-        vendors = [User.query.get(user_id)]
-    
-    # Gerar relatório
-    report_data = []
-    
-    for vendor in vendors:
-        # Buscar retiradas do vendedor no período
-        redemptions = Redemption.query.filter(
-            Redemption.vendor_id == vendor.id,
-            Redemption.redeemed_at >= start_datetime,
-            Redemption.redeemed_at < end_datetime
-        ).order_by(Redemption.redeemed_at).all()
-        
-        # Calcular totais
-        total_matte = sum(r.matte_quantity for r in redemptions)
-        total_biscoito = sum(r.biscoito_quantity for r in redemptions)
-        
-        # Agrupar por dia
-        daily_breakdown = {}
-        for redemption in redemptions:
-            day = redemption.redeemed_at.date().isoformat()
-            if day not in daily_breakdown:
-                daily_breakdown[day] = {
-                    'matte': 0,
-                    'biscoito': 0,
-                    'redemptions': 0
-                }
-            
-            daily_breakdown[day]['matte'] += redemption.matte_quantity
-            daily_breakdown[day]['biscoito'] += redemption.biscoito_quantity
-            daily_breakdown[day]['redemptions'] += 1
-        
-        # Converter para lista ordenada por data
-        daily_list = [{'date': day, **data} for day, data in daily_breakdown.items()]
-        daily_list.sort(key=lambda x: x['date'])
-        
-        vendor_report = {
-            'vendor_id': vendor.id,
-            'vendor_name': vendor.username,
-            'period': {
-                'start_date': start_datetime.date().isoformat(),
-                'end_date': (end_datetime - timedelta(days=1)).date().isoformat()
-            },
-            'summary': {
-                'total_redemptions': len(redemptions),
-                'total_matte': total_matte,
-                'total_biscoito': total_biscoito
-            },
-            'daily_breakdown': daily_list
-        }
-        
-        report_data.append(vendor_report)
+        vendor_id = user_id
+    
+    return (start_datetime, end_datetime, vendor_id), None
+
+def cached_report_response(key, data):
+    """Responder com o JSON comprimido do cache (sem descomprimir, se o cliente aceitar gzip)"""
+    # ETag forte é por representação: a versão gzip tem outros bytes e outro ETag
+    if request.accept_encodings.quality('gzip') > 0:
+        response = Response(data, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+        response.set_etag(f'{key}-gz')
+    else:
+        response = Response(gzip.decompress(data), mimetype='application/json')
+        response.set_etag(key)
+    response.vary.add('Accept-Encoding')
+    return response.make_conditional(request)
+
+@vendor_bp.route('/reports', methods=['GET'])
+@auth_required
+def vendor_reports():
+    """Obter relatórios de vendedores (para administradores) ou do próprio vendedor"""
+    params, error = parse_report_params(request.args)
+    if error:
+        return error
+    
+    # Período aberto (inclui hoje) muda a cada retirada: calculado na hora, sem cache
+    if not is_closed(params[1]):
+        return Response(report_jobs.render(*params), mimetype='application/json')
+    
+    # Período fechado: servir direto do cache em disco; numa falta, a gravação
+    # (compressão e descarte) fica com a thread de relatórios
+    key = report_key(*params)
+    data = report_jobs.cache.get(key)
+    if data is None:
+        body = report_jobs.render(*params)
+        report_jobs.store(key, body)
+        response = Response(body, mimetype='application/json')
+        response.set_etag(key)
+        return response
+    
+    return cached_report_response(key, data)
+
+@vendor_bp.route('/reports/jobs', methods=['POST'])
+@auth_required
+def submit_report_job():
+    """Enfileirar o cálculo de um relatório (períodos longos); o resultado é buscado depois pelo job"""
+    params, error = parse_report_params(request.get_json(silent=True) or {})
+    if error:
+        return error
+    
+    job = report_jobs.submit(session['user_id'], *params)
+    data = report_jobs.serialize(job)
+    data['result_url'] = url_for('vendor.report_job_result', job_id=job['id'])
+    
+    return jsonify(data), 200 if data['status'] == 'concluido' else 202
+
+def get_report_job(job_id):
+    """Job do usuário logado (administradores veem todos)"""
+    job = report_jobs.get(job_id)
+    if job is None:
+        return None
+    if job['owner_id'] != session['user_id'] and session.get('user_role') != 'admin':
+        return None
+    return job
+
+@vendor_bp.route('/reports/jobs/<job_id>', methods=['GET'])
+@auth_required
+def report_job_status(job_id):
+    """Situação de um job de relatório"""
+    job = get_report_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job não encontrado'}), 404
+    
+    data = report_jobs.serialize(job)
+    data['result_url'] = url_for('vendor.report_job_result', job_id=job['id'])
+    return jsonify(data), 200
+
+@vendor_bp.route('/reports/jobs/<job_id>/result', methods=['GET'])
+@auth_required
+def report_job_result(job_id):
+    """Resultado de um job de relatório concluído"""
+    job = get_report_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job não encontrado'}), 404
+    
+    status = report_jobs.status(job)
+    if status == 'falhou':
+        return jsonify(report_jobs.serialize(job)), 500
+    if status != 'concluido':
+        return jsonify({'error': 'Relatório ainda em processamento', 'status': status}), 409
     
-    # Se for relatório de um único vendedor, retornar diretamente
-    if len(report_data) == 1:
-        return jsonify(report_data[0]), 200
+    data = report_jobs.cache.get(job['key'])
+    if data is None:
+        return jsonify({'error': 'Resultado expirou do cache. Envie o relatório novamente'}), 410
     
-    # Caso contrário, retornar lista de relatórios
-    return jsonify(report_data), 200
+    return cached_report_response(job['key'], data)
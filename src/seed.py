@@ -0,0 +1,265 @@
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import click
+import numpy as np
+from sqlalchemy import func, select, text
+from werkzeug.security import generate_password_hash
+
+from src.models.user import db, User, Plan, Subscription, QRCode, Redemption, Payment
+
+SEED_BATCH_SIZE = 20000
+# Senha de todas as contas geradas (um único hash: gerar milhões levaria horas)
+SEED_PASSWORD = 'senha123'
+
+# (nome, preço, mattes/dia, biscoitos/dia, fatia dos assinantes)
+SEED_PLANS = (
+    ('Básico', 29.9, 1, 1, 0.5),
+    ('Padrão', 49.9, 2, 1, 0.35),
+    ('Premium', 79.9, 3, 2, 0.15),
+)
+# Chance de o assinante passar no balcão, de segunda a domingo
+VISIT_RATE = (0.55, 0.55, 0.55, 0.55, 0.5, 0.3, 0.15)
+# Peso de cada hora do dia: picos na ida ao trabalho, no almoço e na volta
+HOUR_WEIGHTS = np.array([
+    0, 0, 0, 0, 0, 1, 4, 14, 18, 8, 4, 6,
+    10, 8, 4, 3, 5, 10, 9, 4, 2, 1, 0, 0
+], dtype=float)
+# Fração das retiradas feitas no vendedor habitual do assinante
+HOME_VENDOR_SHARE = 0.85
+# Chance de cancelar a cada mês e de dividir a retirada do dia em duas
+MONTHLY_CHURN = 0.06
+PARTIAL_REDEMPTION_RATE = 0.3
+
+
+class DatasetGenerator:
+    """Massa de dados sintética em escala de produção, determinística pela semente.
+
+    Os dias são gerados em ordem cronológica, em colunas (numpy), e inseridos
+    em lote direto no driver com ids atribuídos aqui (banco vazio), sem ida e
+    volta ao banco por linha.
+    """
+
+    def __init__(self, users, vendors, months, seed=42, end_date=None, batch_size=SEED_BATCH_SIZE):
+        self.users = users
+        self.vendors = vendors
+        self.days = months * 30
+        self.end_date = end_date or datetime.utcnow().date()
+        self.start_date = self.end_date - timedelta(days=self.days - 1)
+        self.epoch = np.datetime64(self.start_date, 's')
+        self.batch_size = batch_size
+        self.rng = np.random.default_rng(seed)
+        self.uuid_rng = np.random.default_rng([seed, 1])
+        self.counts = {}
+
+    def insert(self, table, columns):
+        """Insert em massa (executemany com tuplas direto no driver), em blocos com commit por bloco"""
+        names = list(columns)
+        rows = list(zip(*(columns[name] for name in names)))
+        marker = '?' if db.engine.dialect.paramstyle == 'qmark' else '%s'
+        sql = f'INSERT INTO {table.name} ({", ".join(names)}) VALUES ({", ".join([marker] * len(names))})'
+        for start in range(0, len(rows), self.batch_size):
+            db.session.connection().exec_driver_sql(sql, rows[start:start + self.batch_size])
+            db.session.commit()
+        self.counts[table.name] = self.counts.get(table.name, 0) + len(rows)
+
+    def timestamps(self, seconds):
+        """Segundos desde o início da janela → valores de DateTime para o driver.
+
+        No SQLite, texto no mesmo formato que o SQLAlchemy grava (com microssegundos,
+        para as comparações de texto baterem); nos demais bancos, datetime.
+        """
+        values = self.epoch + np.asarray(seconds, dtype='timedelta64[s]')
+        if db.engine.dialect.name == 'sqlite':
+            return [value.replace('T', ' ') for value in np.datetime_as_string(values, unit='us').tolist()]
+        return values.astype(object).tolist()
+
+    def uuids(self, n):
+        raw = self.uuid_rng.integers(0, 2 ** 63, size=(n, 2), dtype=np.int64)
+        return [str(uuid.UUID(int=(hi << 64) | lo, version=4)) for hi, lo in raw.tolist()]
+
+    def seed_plans(self):
+        n = len(SEED_PLANS)
+        created = self.timestamps(np.zeros(n))
+        self.insert(Plan.__table__, {
+            'id': range(1, n + 1),
+            'name': [plan[0] for plan in SEED_PLANS],
+            'description': [f'Plano {plan[0]}' for plan in SEED_PLANS],
+            'price': [plan[1] for plan in SEED_PLANS],
+            'matte_quantity': [plan[2] for plan in SEED_PLANS],
+            'biscoito_quantity': [plan[3] for plan in SEED_PLANS],
+            'created_at': created,
+            'updated_at': created
+        })
+
+    def seed_users(self):
+        password = generate_password_hash(SEED_PASSWORD)
+        n = 1 + self.vendors + self.users
+        self.first_customer_id = 2 + self.vendors
+        names = ['admin'] + [f'vendedor{i}' for i in range(self.vendors)] + [f'cliente{i}' for i in range(self.users)]
+        created = self.timestamps(np.full(n, -365 * 86400))
+        self.insert(User.__table__, {
+            'id': range(1, n + 1),
+            'username': names,
+            'email': [f'{name}@exemplo.com' for name in names],
+            'password': [password] * n,
+            'role': ['admin'] + ['vendedor'] * self.vendors + ['cliente'] * self.users,
+            'created_at': created,
+            'updated_at': created
+        })
+
+    def seed_subscriptions(self):
+        """Uma assinatura por cliente, com renovações mensais (pagamentos) até cancelar ou até hoje"""
+        rng = self.rng
+        n = self.users
+        shares = np.array([plan[4] for plan in SEED_PLANS])
+        self.plan_index = rng.choice(len(SEED_PLANS), size=n, p=shares / shares.sum())
+        # 60% já assinavam antes da janela; o restante entra ao longo dela
+        self.start_day = np.where(
+            rng.random(n) < 0.6,
+            -rng.integers(0, 365, size=n),
+            rng.integers(0, self.days, size=n)
+        )
+        self.end_day = self.start_day + rng.geometric(MONTHLY_CHURN, size=n) * 30
+        active = self.end_day > self.days
+
+        # Vendedor habitual com distribuição de cauda longa (poucos vendedores muito movimentados)
+        weights = 1.0 / np.arange(1, self.vendors + 1) ** 1.1
+        self.vendor_weights = weights / weights.sum()
+        self.home_vendor = rng.choice(self.vendors, size=n, p=self.vendor_weights)
+
+        # Um pagamento a cada 30 dias de assinatura, até o cancelamento ou o fim da janela
+        renewals = (np.minimum(self.end_day, self.days) - self.start_day + 29) // 30
+        # Fim do período já pago (para as ativas, a próxima renovação)
+        paid_until = self.start_day + renewals * 30
+
+        start = self.timestamps(self.start_day * 86400)
+        self.insert(Subscription.__table__, {
+            'id': range(1, n + 1),
+            'user_id': range(self.first_customer_id, self.first_customer_id + n),
+            'plan_id': (self.plan_index + 1).tolist(),
+            'status': np.where(active, 'ativo', 'cancelado').tolist(),
+            'start_date': start,
+            'end_date': self.timestamps(paid_until * 86400),
+            'auto_renew': active.tolist(),
+            'created_at': start,
+            'updated_at': self.timestamps(np.minimum(self.end_day, self.days) * 86400)
+        })
+
+        subscription = np.repeat(np.arange(n), renewals)
+        offsets = np.arange(len(subscription)) - np.repeat(np.cumsum(renewals) - renewals, renewals)
+        paid_at = self.timestamps((self.start_day[subscription] + offsets * 30) * 86400)
+        prices = np.array([plan[1] for plan in SEED_PLANS])
+        methods = rng.integers(0, 2, size=n)
+        self.insert(Payment.__table__, {
+            'id': range(1, len(subscription) + 1),
+            'subscription_id': (subscription + 1).tolist(),
+            'amount': prices[self.plan_index[subscription]].tolist(),
+            'payment_method': np.where(methods[subscription], 'pix', 'cartao').tolist(),
+            'status': ['aprovado'] * len(subscription),
+            'transaction_id': self.uuids(len(subscription)),
+            'created_at': paid_at,
+            'updated_at': paid_at
+        })
+
+    def seed_days(self, progress=None):
+        """QR codes diários e retiradas (às vezes parciais), dia a dia"""
+        rng = self.rng
+        hour_p = HOUR_WEIGHTS / HOUR_WEIGHTS.sum()
+        plan_matte = np.array([plan[2] for plan in SEED_PLANS])[self.plan_index]
+        plan_biscoito = np.array([plan[3] for plan in SEED_PLANS])[self.plan_index]
+        qr_id = 1
+        redemption_id = 1
+
+        for day in range(self.days):
+            subscribers = np.flatnonzero((self.start_day <= day) & (self.end_day > day))
+            weekday = (self.start_date + timedelta(days=day)).weekday()
+            visitors = subscribers[rng.random(len(subscribers)) < VISIT_RATE[weekday]]
+            n = len(visitors)
+            if not n:
+                continue
+
+            # Horário da primeira retirada (segundos desde a meia-noite) e do QR code, minutos antes
+            first_at = rng.choice(24, size=n, p=hour_p) * 3600 + rng.integers(0, 3600, size=n)
+            created_at = np.maximum(first_at - rng.integers(30, 900, size=n), 0) + day * 86400
+            qr_ids = np.arange(qr_id, qr_id + n)
+            qr_created = self.timestamps(created_at)
+            self.insert(QRCode.__table__, {
+                'id': qr_ids.tolist(),
+                'user_id': (visitors + self.first_customer_id).tolist(),
+                'code': self.uuids(n),
+                'valid_until': self.timestamps(np.full(n, (day + 1) * 86400)),
+                'created_at': qr_created,
+                'updated_at': qr_created
+            })
+
+            # Retirada parcial: 1 matte (com os biscoitos) cedo e o restante horas depois
+            partial = np.flatnonzero((rng.random(n) < PARTIAL_REDEMPTION_RATE) & (plan_matte[visitors] > 1))
+            second_at = np.minimum(first_at[partial] + rng.integers(1800, 6 * 3600, size=len(partial)), 86399)
+            matte = plan_matte[visitors].copy()
+            matte[partial] = 1
+            owner = np.concatenate([np.arange(n), partial])
+            m = len(owner)
+            vendor = np.where(
+                rng.random(m) < HOME_VENDOR_SHARE,
+                self.home_vendor[visitors[owner]],
+                rng.choice(self.vendors, size=m, p=self.vendor_weights)
+            )
+            self.insert(Redemption.__table__, {
+                'id': range(redemption_id, redemption_id + m),
+                'qr_code_id': qr_ids[owner].tolist(),
+                'vendor_id': (vendor + 2).tolist(),
+                'matte_quantity': np.concatenate([matte, plan_matte[visitors[partial]] - 1]).tolist(),
+                'biscoito_quantity': np.concatenate([plan_biscoito[visitors], np.zeros(len(partial), int)]).tolist(),
+                'redeemed_at': self.timestamps(np.concatenate([first_at, second_at]) + day * 86400)
+            })
+            qr_id += n
+            redemption_id += m
+            if progress is not None:
+                progress(day + 1, self.days)
+
+    def run(self, progress=None):
+        # SQLite: sem fsync por commit durante a carga (a massa é descartável)
+        if db.engine.dialect.name == 'sqlite':
+            db.session.execute(text('PRAGMA synchronous=OFF'))
+        self.seed_plans()
+        self.seed_users()
+        self.seed_subscriptions()
+        self.seed_days(progress)
+        return self.counts
+
+
+def seed_database(users, vendors, months, seed=42, end_date=None, batch_size=SEED_BATCH_SIZE, progress=None):
+    """Popular um banco vazio com a massa sintética e devolver as contagens por tabela"""
+    if db.session.execute(select(func.count(User.id))).scalar():
+        raise ValueError('O banco já tem usuários; a massa sintética só é gerada em um banco vazio')
+    generator = DatasetGenerator(users, vendors, months, seed=seed, end_date=end_date, batch_size=batch_size)
+    return generator.run(progress)
+
+
+@click.command('seed')
+@click.option('--users', default=10000, show_default=True, help='Clientes (assinantes)')
+@click.option('--vendors', default=50, show_default=True, help='Vendedores')
+@click.option('--months', default=3, show_default=True, help='Meses de QR codes e retiradas')
+@click.option('--seed', default=42, show_default=True, help='Semente (mesma semente e data final: mesma massa)')
+@click.option('--end-date', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Último dia gerado (padrão: hoje)')
+@click.option('--batch-size', default=SEED_BATCH_SIZE, show_default=True)
+def seed_command(users, vendors, months, seed, end_date, batch_size):
+    """Gerar massa de dados sintética (usuários, planos, assinaturas, QR codes, retiradas e pagamentos)"""
+    started = time.perf_counter()
+
+    def progress(day, days):
+        if day % 10 == 0 or day == days:
+            click.echo(f'  dia {day}/{days} ({time.perf_counter() - started:.0f}s)')
+
+    try:
+        counts = seed_database(users, vendors, months, seed=seed,
+                               end_date=end_date.date() if end_date else None,
+                               batch_size=batch_size, progress=progress)
+    except ValueError as exc:
+        raise click.ClickException(str(exc))
+    for table, count in counts.items():
+        click.echo(f'{table}: {count}')
+    click.echo(f'Concluído em {time.perf_counter() - started:.1f}s')
@@ -0,0 +1,240 @@
+import argparse
+import logging
+import os
+import selectors
+import sys
+import time
+import uuid
+from concurrent import futures
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gunicorn.app.base import BaseApplication
+from gunicorn.workers.gthread import ThreadWorker
+from sqlalchemy.orm import configure_mappers
+
+logger = logging.getLogger('gunicorn.error')
+
+
+def warm_up(app):
+    """Abrir as conexões do pool e preparar os caches antes de o worker aceitar tráfego; devolve ms por etapa"""
+    from src.entitlements import entitlements
+    from src.models.user import db, Plan, QRCode, Redemption
+    from src.routes.qrcode import render_qr_png
+
+    timings = {}
+
+    def step(name, fn):
+        started = time.perf_counter()
+        fn()
+        timings[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    def open_pool():
+        # Uma conexão por thread do worker (até o tamanho do pool), todas abertas de uma vez
+        threads = app.config.get('SERVER_THREADS', 1)
+        for engine in db.engines.values():
+            size = min(threads, engine.pool.size()) if hasattr(engine.pool, 'size') else 1
+            connections = [engine.connect() for _ in range(max(size, 1))]
+            for connection in connections:
+                connection.exec_driver_sql('SELECT 1')
+                connection.close()
+
+    def hot_queries():
+        # Compila e guarda no cache de SQL do SQLAlchemy as consultas do balcão
+        entitlements.get(0)
+        QRCode.query.filter_by(code='').first()
+        Redemption.query.filter_by(qr_code_id=0).all()
+        Plan.query.all()
+        db.session.remove()
+
+    def first_request():
+        # Uma requisição completa pela pilha (hooks, roteamento, JSON, compressão)
+        response = app.test_client().get('/api/subscription/plans')
+        if response.status_code != 200:
+            logger.warning('Aquecimento: /api/subscription/plans respondeu %s', response.status_code)
+
+    with app.app_context():
+        step('mappers', configure_mappers)
+        step('db_pool', open_pool)
+        step('queries', hot_queries)
+        step('qrcode', lambda: render_qr_png(str(uuid.UUID(int=0))))
+        step('request', first_request)
+    return timings
+
+
+def per_worker_state(app):
+    """Componentes cujo estado fica na memória de cada worker (com vários workers, cada um vê só a sua parte)"""
+    from src.rate_limit import MemoryBucketStore, rate_limiter
+
+    state = ['detecção de fraude (histórico de códigos e rajadas por vendedor)']
+    if app.config.get('RATE_LIMIT_ENABLED') and isinstance(rate_limiter.store, MemoryBucketStore):
+        state.append('limites de taxa (cada worker conta os seus: até N vezes o limite)')
+    if app.config.get('PAYMENT_PIPELINE'):
+        state.append('fila de pagamentos (pendentes de um worker encerrado voltam pela conciliação)')
+    return state
+
+
+def post_fork(server, worker):
+    """Conexões herdadas do master não podem ser usadas pelos filhos: o pool do worker começa vazio"""
+    if not server.cfg.preload_app:
+        return
+    from src.models.user import db
+
+    with server.app.wsgi().app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    """Aquecer o worker antes do laço de accept (requisições esperam na fila do socket, nada é recusado)"""
+    app = worker.wsgi
+    if not app.config.get('SERVER_WARM_UP', True):
+        return
+    started = time.perf_counter()
+    timings = warm_up(app)
+    logger.info('Worker %s aquecido em %.0f ms %s', worker.pid, (time.perf_counter() - started) * 1000, timings)
+
+
+class DrainingThreadWorker(ThreadWorker):
+    """Worker gthread que, ao ser encerrado (HUP, TERM, max_requests), atende as conexões que já aceitou.
+
+    O gthread padrão fecha as conexões aceitas que ainda não mandaram a
+    requisição e o cliente recebe um reset; aqui o worker só deixa de aceitar
+    (as conexões novas vão para os outros workers) e sai quando as pendentes
+    terminam ou `graceful_timeout` vence.
+    """
+
+    def run(self):
+        for sock in self.sockets:
+            sock.setblocking(False)
+            self.poller.register(sock, selectors.EVENT_READ, partial(self.accept, sock.getsockname()))
+
+        while self.alive:
+            self.notify()
+            self.poll(1.0)
+            if not self.is_parent_alive():
+                break
+            self.murder_keepalived()
+
+        for sock in self.sockets:
+            self.poller.unregister(sock)
+        deadline = time.monotonic() + self.cfg.graceful_timeout
+        while self.nr_conns > 0 and time.monotonic() < deadline:
+            self.notify()
+            self.poll(0.05)
+            self.murder_keepalived()
+
+        self.tpool.shutdown(False)
+        self.poller.close()
+        for sock in self.sockets:
+            sock.close()
+        futures.wait(self.futures, timeout=max(deadline - time.monotonic(), 0))
+
+    def poll(self, timeout):
+        if self.nr_conns < self.worker_connections:
+            for key, _ in self.poller.select(timeout):
+                key.data(key.fileobj)
+            result = futures.wait(self.futures, timeout=0, return_when=futures.FIRST_COMPLETED)
+        else:
+            result = futures.wait(self.futures, timeout=timeout, return_when=futures.FIRST_COMPLETED)
+        for fut in result.done:
+            self.futures.remove(fut)
+
+
+class ProductionServer(BaseApplication):
+    """Servidor de produção: gunicorn com workers de threads e a aplicação pré-carregada no master.
+
+    Com o preload, modelos, blueprints, manifesto estático e o encoder de QR
+    code são importados uma vez e os workers nascem por fork já com tudo em
+    memória; cada worker ainda abre o pool do banco e aquece os caches
+    (post_worker_init) antes de aceitar conexões.
+
+    Um worker por padrão, escalando por threads: limites de taxa, detecção
+    de fraude e fila de pagamentos guardam estado na memória do processo
+    (per_worker_state). Com `--workers N` o servidor sobe, mas avisa no log
+    o que passa a valer por worker. Dashboards em tempo real, jobs de
+    relatório, profiler e tracing funcionam com vários workers na mesma
+    máquina (banco ou arquivos em instance/). Atrás de proxy reverso,
+    `--trusted-proxies` (PROXY_TRUSTED_HOPS) faz o ProxyFix usar o IP do
+    cliente do X-Forwarded-For.
+
+    Recarga sem derrubar requisições: `kill -HUP <pid do master>` sobe novos
+    workers (que aquecem antes de aceitar) e encerra os antigos depois de
+    terminarem as conexões já aceitas (até `graceful_timeout`). Com o
+    preload o HUP não relê o código; para publicar código novo, `kill -USR2`
+    sobe um novo master ao lado do atual e `kill -QUIT` no antigo o encerra.
+    """
+
+    def __init__(self, options, warm_up=True):
+        self.options = options
+        self.warm_up = warm_up
+        self.application = None
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+        self.cfg.set('post_fork', post_fork)
+        self.cfg.set('post_worker_init', post_worker_init)
+
+    def load(self):
+        if self.application is None:
+            from src.main import app
+            # Importados no master para os workers herdarem (PIL e o plugin PNG carregam sob demanda)
+            from PIL import Image, PngImagePlugin  # noqa: F401
+            import qrcode.main  # noqa: F401
+
+            from src.models.user import db
+
+            app.config['SERVER_THREADS'] = self.options.get('threads', 1)
+            app.config['SERVER_WARM_UP'] = self.warm_up
+            workers = self.options.get('workers', 1)
+            state = per_worker_state(app) if workers > 1 else []
+            if state:
+                logger.warning('%d workers: estado por worker em %s', workers, '; '.join(state))
+            # Fecha as conexões abertas pelo create_all no import (o master não atende requisições)
+            with app.app_context():
+                for engine in db.engines.values():
+                    engine.dispose()
+            self.application = app
+        return self.application
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Servidor de produção (gunicorn) da API')
+    parser.add_argument('--bind', default=os.getenv('SERVER_BIND', f"0.0.0.0:{os.getenv('PORT', '5000')}"))
+    parser.add_argument('--workers', type=int, default=int(os.getenv('SERVER_WORKERS', 1)),
+                        help='Processos (padrão 1: parte do estado fica na memória de cada worker)')
+    parser.add_argument('--threads', type=int, default=int(os.getenv('SERVER_THREADS', 8)))
+    parser.add_argument('--timeout', type=int, default=int(os.getenv('SERVER_TIMEOUT', 30)))
+    parser.add_argument('--graceful-timeout', type=int, default=int(os.getenv('SERVER_GRACEFUL_TIMEOUT', 30)))
+    parser.add_argument('--max-requests', type=int, default=int(os.getenv('SERVER_MAX_REQUESTS', 0)),
+                        help='Reciclar o worker depois de N requisições (0: nunca)')
+    parser.add_argument('--trusted-proxies', type=int, default=int(os.getenv('PROXY_TRUSTED_HOPS', 0)),
+                        help='Proxies reversos confiáveis à frente do servidor (X-Forwarded-For/-Proto)')
+    parser.add_argument('--no-preload', action='store_true', help='Cada worker importa a aplicação sozinho')
+    parser.add_argument('--no-warm-up', action='store_true', help='Aceitar tráfego sem aquecer o worker')
+    args = parser.parse_args(argv)
+    if args.workers < 1 or args.threads < 1 or args.trusted_proxies < 0:
+        parser.error('--workers e --threads devem ser ao menos 1 e --trusted-proxies não pode ser negativo')
+    # Lido por main.py ao importar a aplicação (no master com preload, em cada worker sem)
+    os.environ['PROXY_TRUSTED_HOPS'] = str(args.trusted_proxies)
+
+    options = {
+        'bind': args.bind,
+        'workers': args.workers,
+        'worker_class': DrainingThreadWorker,
+        'threads': args.threads,
+        'timeout': args.timeout,
+        'graceful_timeout': args.graceful_timeout,
+        'max_requests': args.max_requests,
+        'max_requests_jitter': args.max_requests // 10,
+        'preload_app': not args.no_preload,
+        'accesslog': os.getenv('SERVER_ACCESS_LOG'),
+    }
+    ProductionServer(options, warm_up=not args.no_warm_up).run()
+
+
+if __name__ == '__main__':
+    main()
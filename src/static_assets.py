@@ -0,0 +1,103 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+
+from flask import Response, request
+
+# Tipos que valem a pena comprimir
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/javascript', 'application/json', 'application/xml',
+    'image/svg+xml', 'application/manifest+json'
+)
+MIN_GZIP_SIZE = 256
+
+# Arquivos com hash no nome (ex: app.3f2a1b9c.js) nunca mudam de conteúdo
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{8,}\.')
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE = 'no-cache'
+
+
+class StaticAsset:
+    __slots__ = ('path', 'body', 'gzip_body', 'mimetype', 'etag', 'hashed_name')
+
+    def __init__(self, path, body, mimetype):
+        self.path = path
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.hashed_name = bool(HASHED_NAME_RE.search(os.path.basename(path)))
+        self.gzip_body = None
+
+        if len(body) >= MIN_GZIP_SIZE and mimetype.startswith(COMPRESSIBLE_TYPES):
+            compressed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(compressed) < len(body):
+                self.gzip_body = compressed
+
+
+class StaticManifest:
+    """Manifesto em memória dos arquivos estáticos, montado uma única vez na inicialização"""
+
+    def __init__(self, static_folder, index='index.html'):
+        self.static_folder = static_folder
+        self.index = index
+        self.assets = {}
+        self.scan()
+
+    def scan(self):
+        """Ler todos os arquivos da pasta estática e pré-calcular hash e versão gzip"""
+        assets = {}
+        if self.static_folder and os.path.isdir(self.static_folder):
+            for root, _dirs, files in os.walk(self.static_folder):
+                for name in files:
+                    if name.endswith('.gz'):
+                        continue
+                    full_path = os.path.join(root, name)
+                    rel_path = os.path.relpath(full_path, self.static_folder).replace(os.sep, '/')
+                    with open(full_path, 'rb') as f:
+                        body = f.read()
+                    mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+                    assets[rel_path] = StaticAsset(rel_path, body, mimetype)
+        self.assets = assets
+
+    def url_for(self, path):
+        """URL versionada pelo hash do conteúdo (pode ser cacheada indefinidamente)"""
+        asset = self.assets.get(path)
+        if not asset:
+            return f'/{path}'
+        return f'/{path}?v={asset.etag[:12]}'
+
+    def lookup(self, path):
+        """Localizar o arquivo pedido ou, para rotas da SPA, o index.html"""
+        if path:
+            asset = self.assets.get(path)
+            if asset:
+                return asset
+        return self.assets.get(self.index)
+
+    def response(self, asset):
+        """Montar a resposta para o arquivo, respeitando If-None-Match e Accept-Encoding"""
+        versioned = asset.hashed_name or request.args.get('v') == asset.etag[:12]
+        cache_control = IMMUTABLE_CACHE if versioned else REVALIDATE_CACHE
+        use_gzip = asset.gzip_body is not None and request.accept_encodings.quality('gzip') > 0
+        # ETag forte é por representação: a versão gzip tem outros bytes e outro ETag
+        etag = f'{asset.etag}-gz' if use_gzip else asset.etag
+
+        headers = {
+            'ETag': f'"{etag}"',
+            'Cache-Control': cache_control,
+        }
+        if asset.gzip_body is not None:
+            headers['Vary'] = 'Accept-Encoding'
+
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers=headers)
+
+        if use_gzip:
+            headers['Content-Encoding'] = 'gzip'
+            body = asset.gzip_body
+        else:
+            body = asset.body
+
+        return Response(body, mimetype=asset.mimetype, headers=headers)
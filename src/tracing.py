@@ -0,0 +1,328 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Tipos de span do OTLP (SpanKind) e código de status de erro
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_CODE_ERROR = 2
+
+# Span aberto no contexto atual (None: requisição fora da amostra, nada é medido)
+_current_span = ContextVar('current_span', default=None)
+
+
+class Span:
+    """Trecho medido de uma requisição amostrada; exportado ao sair do `with`"""
+
+    __slots__ = ('tracer', 'trace_id', 'span_id', 'parent_id', 'name', 'kind',
+                 'start', 'end', 'attributes', 'error', '_token')
+
+    def __init__(self, tracer, trace_id, parent_id, name, kind=SPAN_KIND_INTERNAL, attributes=None):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.span_id = random.getrandbits(64) or 1
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start = time.time_ns()
+        self.end = None
+        self.attributes = attributes or {}
+        self.error = None
+        self._token = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def activate(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def finish(self, error=None):
+        self.end = time.time_ns()
+        if error is not None:
+            self.error = f'{type(error).__name__}: {error}'
+        if self._token is not None:
+            _current_span.reset(self._token)
+            self._token = None
+        self.tracer.export(self)
+
+    def __enter__(self):
+        return self.activate()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.finish(exc)
+        return False
+
+
+class _NoopSpan:
+    """Span das requisições fora da amostra: não mede nem guarda nada"""
+
+    __slots__ = ()
+
+    def set_attribute(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def span(name, **attributes):
+    """Span filho do span atual; fora de uma requisição amostrada devolve um span vazio (custo ~zero)"""
+    parent = _current_span.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(parent.tracer, parent.trace_id, parent.span_id, name, attributes=attributes)
+
+
+def parse_traceparent(value):
+    """Cabeçalho W3C traceparent → (trace_id, span_id do chamador), ou None se inválido"""
+    parts = value.split('-') if value else ()
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        trace_id, parent_id = int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    return (trace_id, parent_id) if trace_id and parent_id else None
+
+
+def otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def otlp_span(span):
+    """Span no formato JSON do OTLP (ids em hexadecimal, tempos em nanossegundos como texto)"""
+    data = {
+        'traceId': f'{span.trace_id:032x}',
+        'spanId': f'{span.span_id:016x}',
+        'name': span.name,
+        'kind': span.kind,
+        'startTimeUnixNano': str(span.start),
+        'endTimeUnixNano': str(span.end),
+        'attributes': [{'key': key, 'value': otlp_value(value)} for key, value in span.attributes.items()]
+    }
+    if span.parent_id:
+        data['parentSpanId'] = f'{span.parent_id:016x}'
+    if span.error:
+        data['status'] = {'code': STATUS_CODE_ERROR, 'message': span.error}
+    return data
+
+
+class Tracer:
+    """Spans por fase das requisições amostradas, exportados em lote para um arquivo OTLP/JSON.
+
+    Uma fração `TRACING_SAMPLE_RATE` das requisições (0 desliga) ganha um span
+    raiz; `span()` nos handlers, nos comandos SQL e na renderização de QR cria
+    filhos dele. Os spans terminados ficam num buffer em memória (limitado:
+    excedentes são descartados e contados) e uma thread grava lotes, uma linha
+    por lote no formato do exportador de arquivo do OpenTelemetry Collector.
+
+    Cada processo grava e rotaciona o próprio arquivo (`TRACING_FILE` com o
+    pid antes da extensão: spans.<pid>.jsonl), então workers do servidor
+    nunca intercalam linhas nem disputam a rotação.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.sample_rate = 0.0
+        self.exported = 0
+        self.dropped = 0
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('TRACING_SAMPLE_RATE', 0.0)
+        app.config.setdefault('TRACING_FILE', os.path.join(app.instance_path, 'traces', 'spans.jsonl'))
+        app.config.setdefault('TRACING_MAX_FILE_BYTES', 50 * 1024 * 1024)
+        app.config.setdefault('TRACING_BATCH_SIZE', 512)
+        app.config.setdefault('TRACING_FLUSH_INTERVAL', 5)
+        app.config.setdefault('TRACING_MAX_QUEUE', 20000)
+        app.config.setdefault('TRACING_SERVICE_NAME', 'clube_do_matte')
+        app.config.setdefault('TRACING_STATEMENT_MAX_LENGTH', 300)
+        self.app = app
+        self.sample_rate = app.config['TRACING_SAMPLE_RATE']
+        app.extensions['tracer'] = self
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.teardown_request(self.teardown_request)
+        instrument_sqlalchemy()
+
+    # Hooks da requisição
+
+    def before_request(self):
+        if not self.sample_rate or random.random() >= self.sample_rate:
+            return None
+        req = request._get_current_object()
+        parent = parse_traceparent(req.headers.get('traceparent'))
+        trace_id, parent_id = parent or (random.getrandbits(128) or 1, None)
+        rule = req.url_rule.rule if req.url_rule is not None else req.path
+        root = Span(self, trace_id, parent_id, f'{req.method} {rule}', SPAN_KIND_SERVER, {
+            'http.request.method': req.method,
+            'http.route': rule,
+            'flask.endpoint': req.endpoint or ''
+        })
+        root.activate()
+        return None
+
+    def after_request(self, response):
+        root = _current_span.get()
+        if root is not None:
+            root.set_attribute('http.response.status_code', response.status_code)
+        return response
+
+    def teardown_request(self, exc=None):
+        root = _current_span.get()
+        if root is None:
+            return
+        # Spans filhos abertos por engano não podem vazar para a próxima requisição da thread
+        while root.kind != SPAN_KIND_SERVER and root._token is not None:
+            root.finish()
+            root = _current_span.get()
+            if root is None:
+                return
+        root.finish(exc)
+
+    # Exportação
+
+    def export(self, span):
+        buffer = self._buffer
+        if len(buffer) >= self.app.config['TRACING_MAX_QUEUE']:
+            self.dropped += 1
+            return
+        buffer.append(span)
+        self.ensure_thread()
+        if len(buffer) >= self.app.config['TRACING_BATCH_SIZE']:
+            self._wakeup.set()
+
+    def ensure_thread(self):
+        """Thread de exportação criada sob demanda (e de novo após um fork do servidor)"""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._thread = threading.Thread(target=self.run, name='span-exporter', daemon=True)
+            self._thread.start()
+            self._pid = pid
+
+    def run(self):
+        while True:
+            self._wakeup.wait(self.app.config['TRACING_FLUSH_INTERVAL'])
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Gravar os spans do buffer em lotes de até TRACING_BATCH_SIZE"""
+        config = self.app.config
+        with self._lock:
+            while self._buffer:
+                batch = []
+                while self._buffer and len(batch) < config['TRACING_BATCH_SIZE']:
+                    batch.append(self._buffer.popleft())
+                self.write(batch)
+                self.exported += len(batch)
+
+    def write(self, batch):
+        config = self.app.config
+        line = json.dumps({'resourceSpans': [{
+            'resource': {'attributes': [
+                {'key': 'service.name', 'value': otlp_value(config['TRACING_SERVICE_NAME'])},
+                {'key': 'process.pid', 'value': otlp_value(os.getpid())}
+            ]},
+            'scopeSpans': [{'scope': {'name': __name__}, 'spans': [otlp_span(s) for s in batch]}]
+        }]}, separators=(',', ':'), ensure_ascii=False)
+
+        path = self.path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Rotação simples: o arquivo cheio vira .1 (o .1 anterior é descartado)
+        if os.path.exists(path) and os.path.getsize(path) + len(line) > config['TRACING_MAX_FILE_BYTES']:
+            os.replace(path, path + '.1')
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+    def path(self):
+        """Arquivo deste processo: spans.jsonl → spans.<pid>.jsonl"""
+        root, extension = os.path.splitext(self.app.config['TRACING_FILE'])
+        return f'{root}.{os.getpid()}{extension}'
+
+    def stats(self):
+        return {
+            'pid': os.getpid(),
+            'sample_rate': self.sample_rate,
+            'queued': len(self._buffer),
+            'exported': self.exported,
+            'dropped': self.dropped,
+            'file': self.path()
+        }
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    parent = _current_span.get()
+    if parent is None:
+        return
+    max_length = parent.tracer.app.config['TRACING_STATEMENT_MAX_LENGTH']
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'SQL'
+    context._trace_span = Span(parent.tracer, parent.trace_id, parent.span_id, f'db {verb}', SPAN_KIND_CLIENT, {
+        'db.system': conn.dialect.name,
+        'db.statement': statement[:max_length]
+    })
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    db_span = getattr(context, '_trace_span', None)
+    if db_span is not None:
+        context._trace_span = None
+        db_span.finish()
+
+
+def _handle_error(exception_context):
+    context = exception_context.execution_context
+    db_span = getattr(context, '_trace_span', None) if context is not None else None
+    if db_span is not None:
+        context._trace_span = None
+        db_span.finish(exception_context.original_exception)
+
+
+_sqlalchemy_instrumented = False
+
+
+def instrument_sqlalchemy():
+    """Span por comando SQL de requisições amostradas (eventos em todas as engines, registrados uma vez)"""
+    global _sqlalchemy_instrumented
+    if _sqlalchemy_instrumented:
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(Engine, 'handle_error', _handle_error)
+    _sqlalchemy_instrumented = True
+
+
+# Tracer da aplicação (configurado em main.py)
+tracer = Tracer()